@@ -0,0 +1,19 @@
+# -*- coding: utf-8 -*-
+
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('audit_trail', '0003_auto_20160628_1613'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='activity',
+            name='action_object_key',
+            field=models.CharField(max_length=255, blank=True, default=''),
+        ),
+    ]
@@ -73,6 +73,9 @@ class Activity(models.Model):
     action_object = GenericForeignKey(
         'action_object_content_type', 'action_object_object_id')
     action_object_str = models.CharField(max_length=255, blank=True)
+    # Another identifier of the object, e.g the key of a deleted document
+    action_object_key = models.CharField(
+        max_length=255, blank=True, default='')
 
     # The object to which the activity was performed.
     target_content_type = models.ForeignKey(
@@ -46,4 +46,5 @@ def activity_handler(verb, action_object=None, target=None, **kwargs):
 
     # activity.action_object_str = kwargs.get('action_object_str', None) or str(action_object)
     activity.action_object_str = kwargs.get('action_object_str', None) or get_repr(action_object)
+    activity.action_object_key = kwargs.get('action_object_key', None) or ''
     activity.save()
@@ -456,6 +456,13 @@ PIPELINE = {
             ),
             'output_filename': 'js/transmittal-list.js',
         },
+        'task_progress': {
+            'source_filenames': (
+                'js/tasks/views.js',
+                'js/tasks/app.js',
+            ),
+            'output_filename': 'js/task-progress.js',
+        },
         'reporting': {
             'source_filenames': (
                 'js/vendor/d3.min.js',
@@ -494,6 +501,16 @@ ELASTIC_HOSTS = [{'host': 'localhost', 'port': 9200}]
 ELASTIC_INDEX = 'documents'
 ELASTIC_BULK_SIZE = 150
 ELASTIC_AUTOINDEX = True
+ELASTIC_INDEX_QUEUE_DELAY = 5  # Seconds to wait before indexing edited docs
+ELASTIC_SUPPORTS_WAIT_FOR = False  # Set to True with Elasticsearch >= 5
+ELASTIC_REFRESH_DELAY = 2  # Seconds until unrefreshed writes are searchable
+ELASTIC_REINDEX_CHUNK_SIZE = 1000  # Revisions fetched from db at once
+ELASTIC_REINDEX_THREADS = 4
+ELASTIC_REINDEX_CHECKPOINT = SITE_ROOT.child('reindex_checkpoint.json')
+# Cached search results are invalidated when the category is indexed again,
+# but documents only become searchable after the next index refresh
+SEARCH_CACHE_TIMEOUT = 60  # seconds
+SEARCH_FACETS_MAX_SIZE = 200  # Max number of buckets per aggregation
 
 # ######### CUSTOM CONFIGURATION
 PAGINATE_BY = 50  # Document list pagination
@@ -524,11 +541,21 @@ USE_X_SENDFILE = False
 EXPORTS_URL = '/exports/'
 EXPORTS_SUBDIR = 'exports'
 EXPORTS_CHUNK_SIZE = 150
+EXPORTS_SCROLL_SIZE = 500  # Ids fetched from each ES shard per scroll page
+EXPORTS_QUEUE_SIZE = 10  # Chunks of ids fetched from ES ahead of the db
+EXPORTS_WORKERS = 4  # Threads fetching and formatting chunks, 1 to disable
 EXPORTS_VALIDITY_DURATION = 60
 EXPORTS_TO_KEEP = 20
 
+# Batch downloads config
+DOWNLOADS_BACKGROUND_FILES = 200  # Bigger archives are built by a task
+DOWNLOADS_BACKGROUND_SIZE = 500 * 1024 * 1024  # Same, in bytes of files
+DOWNLOADS_ARCHIVES_TO_KEEP = 5
+
 # Where to look for files to import?
 IMPORT_ROOT = SITE_ROOT.child('import')
+IMPORTS_CHUNK_SIZE = 200  # Rows imported in a single transaction
+IMPORTS_VALIDATION_WORKERS = 4  # Threads validating chunks, 1 to disable
 
 # ######### END CUSTOM CONFIGURATION
 
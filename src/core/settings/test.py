@@ -52,6 +52,11 @@ STATICFILES_STORAGE = 'pipeline.storage.NonPackagingPipelineStorage'
 
 ELASTIC_INDEX = 'test_documents'
 ELASTIC_AUTOINDEX = False
+ELASTIC_REINDEX_CHECKPOINT = '/tmp/phase_test_reindex_checkpoint.json'
+
+# Worker threads would not see data created in test transactions
+EXPORTS_WORKERS = 1
+IMPORTS_VALIDATION_WORKERS = 1
 
 # Makes Celery working synchronously and in memory
 CELERY_ALWAYS_EAGER = True
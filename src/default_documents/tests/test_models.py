@@ -1,9 +1,17 @@
 # -*- coding: utf-8 -*-
 
 
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+from mock import patch
+
 from default_documents.tests.test import ContractorDeliverableTestCase
 
 from accounts.factories import EntityFactory
+from documents.loaders import RevisionLoader
+from documents.serializers import RevisionSerializer, ATTRIBUTE
+from documents.tests.utils import legacy_to_json
 
 
 class DocumentKeyTests(ContractorDeliverableTestCase):
@@ -24,3 +32,43 @@ class DocumentKeyTests(ContractorDeliverableTestCase):
 
         self.assertEqual(doc.metadata.generate_document_key(),
                          'FAC09001-FWF-000-HSE-REP-0004')
+
+
+class JsonSerializerTests(ContractorDeliverableTestCase):
+    def test_compiled_serializer_matches_legacy_output(self):
+        doc = self.create_doc()
+        revision = doc.get_latest_revision()
+        self.assertEqual(revision.to_json(), legacy_to_json(revision))
+
+    def test_serializer_is_built_once_per_class(self):
+        doc = self.create_doc()
+        revision = doc.get_latest_revision()
+        serializer = revision.get_json_serializer()
+        self.assertIs(type(revision).get_json_serializer(), serializer)
+
+    def test_attribute_errors_fall_back_to_other_objects(self):
+        doc = self.create_doc()
+        revision = doc.get_latest_revision()
+        serializer = RevisionSerializer(type(revision))
+        serializer.plan = [('title', 'revision', ATTRIBUTE, 'title')]
+
+        def missing(self):
+            raise AttributeError('title')
+
+        with patch.object(type(revision), 'title', property(missing),
+                          create=True):
+            data = serializer.serialize(revision)
+        self.assertEqual(data['title'], revision.metadata.title)
+
+
+class RevisionLoaderTests(ContractorDeliverableTestCase):
+    def count_queries(self, nb_docs):
+        docs = [self.create_doc() for _ in range(nb_docs)]
+        loader = RevisionLoader(self.category.revision_class())
+        with CaptureQueriesContext(connection) as context:
+            revisions = loader.load_documents([doc.pk for doc in docs])
+            [revision.to_json() for revision in revisions]
+        return len(context.captured_queries)
+
+    def test_constant_number_of_queries(self):
+        self.assertEqual(self.count_queries(2), self.count_queries(5))
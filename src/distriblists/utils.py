@@ -10,6 +10,7 @@ from django.utils.translation import ugettext_lazy as _
 from accounts.models import User
 from distriblists.models import DistributionList
 from distriblists.forms import DistributionListForm
+from imports.readers import SpreadsheetReader
 
 
 header_alignment = Alignment(
@@ -28,22 +29,21 @@ cell_border = Border(
     vertical=Side(style='thin')
 )
 
+# The first column holds document keys or distribution list names
+KEY_COLUMN = 'key'
+
 
 def import_review_members(filepath, category):
     """Import review members from an excel file."""
-    wb = openpyxl.load_workbook(filepath)
-    ws = wb.active
-
-    # Extracts the user list from the header row
-    emails, user_ids = _extract_users(ws)
+    with SpreadsheetReader(filepath, converter=None) as reader:
+        # Extracts the user list from the header row
+        emails, user_ids = _extract_users(reader)
 
-    max_col = len(user_ids) + 1  # Don't use ws.max_column, it's not reliable
-    rows = ws.iter_rows(min_row=2, max_row=ws.max_row, max_col=max_col)
-    results = []
-    for idx, row in enumerate(rows):
-        result = _import_review_members(row, emails, user_ids, category)
-        result['line'] = idx + 2
-        results.append(result)
+        results = []
+        for row in reader:
+            result = _import_review_members(row, emails, user_ids, category)
+            result['line'] = reader.line_num
+            results.append(result)
 
     return results
 
@@ -52,7 +52,7 @@ def _import_review_members(row, emails, user_ids, category):
     """Saves a review member list for a single row."""
     errors = []
 
-    key = row[0].value
+    key = row[KEY_COLUMN]
     try:
         instance = category.document_class().objects \
             .filter(document__category=category) \
@@ -69,8 +69,8 @@ def _import_review_members(row, emails, user_ids, category):
     reviewers = []
     leader = None
     approver = None
-    for idx, cell in enumerate(row[1:]):
-        role = cell.value
+    for idx, email in enumerate(emails):
+        role = row[email]
         if role:
             user_id = user_ids[idx]
             if user_id is None:
@@ -209,40 +209,38 @@ def _export_role(ws, line, all_users, user, role):
 
 def import_lists(filepath, category):
     """Import distribution lists from an excel file."""
-    wb = openpyxl.load_workbook(filepath)
-    ws = wb.active
-
-    # Extracts the user list from the header row
-    emails, user_ids = _extract_users(ws)
+    with SpreadsheetReader(filepath, converter=None) as reader:
+        # Extracts the user list from the header row
+        emails, user_ids = _extract_users(reader)
 
-    max_col = len(user_ids) + 1  # Don't use ws.max_column, it's not reliable
-    rows = ws.iter_rows(min_row=2, max_row=ws.max_row, max_col=max_col)
-    results = []
-    for idx, row in enumerate(rows):
-        result = _import_list(row, emails, user_ids, category)
-        result['line'] = idx + 2
-        results.append(result)
+        results = []
+        for row in reader:
+            result = _import_list(row, emails, user_ids, category)
+            result['line'] = reader.line_num
+            results.append(result)
 
     return results
 
 
-def _extract_users(ws):
+def _extract_users(reader):
     """Extract the xls header, i.e the list of email users.
 
     We cannot rely on the worksheet's dimensions and, say, extract the first
     row until the latest column because this value is sometimes off, especially
     with documents created with LibreOffice.
 
+    The reader columns are renamed after the first one and the emails, so
+    rows hold the roles indexed by email.
+
     Return the list of user ids.
 
     """
     emails = []
-    column_index = 2
-    user_cell = ws.cell(row=1, column=column_index)
-    while user_cell.value:
-        emails.append(user_cell.value)
-        column_index += 1
-        user_cell = ws.cell(row=1, column=column_index)
+    for value in reader.fieldnames[1:]:
+        if not value:
+            break
+        emails.append(value)
+    reader.fieldnames = [KEY_COLUMN] + emails
 
     qs = User.objects.filter(email__in=emails) \
         .values_list('email', 'id')
@@ -257,7 +255,7 @@ def _import_list(row, emails, user_ids, category):
     errors = []
 
     # Fetch existing list if it exists
-    list_name = row[0].value
+    list_name = row[KEY_COLUMN]
     try:
         instance = DistributionList.objects.get(name=list_name)
         categories = list(instance.categories.all())
@@ -272,8 +270,8 @@ def _import_list(row, emails, user_ids, category):
     reviewers = []
     leader = None
     approver = None
-    for idx, cell in enumerate(row[1:]):
-        role = cell.value
+    for idx, email in enumerate(emails):
+        role = row[email]
         if role:
             user_id = user_ids[idx]
             if user_id is None:
@@ -0,0 +1,92 @@
+# -*- coding: utf-8 -*-
+
+
+from documents.serializers import FOREIGN_KEY, MANY_TO_MANY
+
+
+# How to reach the object holding a field, starting from the revision
+PREFIXES = {
+    'revision': '',
+    'metadata': 'metadata__',
+    'document': 'metadata__document__',
+}
+
+
+class RevisionLoader(object):
+    """Loads revisions with all the data required to serialize them.
+
+    Indexing, exporting or processing revisions requires data from the
+    revision, the metadata, the document and its category, plus all the
+    related objects used by the configured fields (e.g. the leader or the
+    approver). Fetching all those lazily means several queries per revision.
+
+    Given a revision class and the list of fields that will be accessed
+    (the indexed fields by default), the loader builds the
+    `select_related` and `prefetch_related` plan once, so loading a chunk
+    of revisions always costs a constant number of queries.
+
+    """
+    base_select_related = (
+        'metadata__document__category__organisation',
+        'metadata__document__category__category_template__metadata_model',
+        # Some metadata properties (e.g `status`) use the latest revision
+        'metadata__latest_revision',
+    )
+
+    def __init__(self, revision_class, fields=None):
+        self.revision_class = revision_class
+        serializer = revision_class.get_json_serializer()
+        if fields is None:
+            fields = serializer.fields
+
+        select_related = set(self.base_select_related)
+
+        # Many properties use the revision's m2m relations (e.g
+        # `can_be_transmitted` counts transmittals), and we cannot tell which
+        # ones from the field configuration, so we prefetch them all.
+        prefetch_related = set(
+            field.name for field in revision_class._meta.get_fields()
+            if field.many_to_many and field.concrete)
+        for field in fields:
+            key, source, kind, attname = serializer.compile_field(field)
+            if kind == FOREIGN_KEY:
+                select_related.add(PREFIXES[source] + key)
+            elif kind == MANY_TO_MANY:
+                prefetch_related.add(PREFIXES[source] + key)
+
+        self.select_related = sorted(select_related)
+        self.prefetch_related = sorted(prefetch_related)
+
+    def get_queryset(self):
+        return self.revision_class.objects \
+            .select_related(*self.select_related) \
+            .prefetch_related(*self.prefetch_related)
+
+    def load(self, pks):
+        """Load the revisions with the given pks."""
+        return self.get_queryset().filter(pk__in=pks)
+
+    def load_documents(self, document_ids):
+        """Load all revisions of the given documents."""
+        return self.get_queryset() \
+            .filter(metadata__document_id__in=document_ids)
+
+    def iter_chunks(self, chunk_size, from_pk=0, queryset=None):
+        """Iterate over revisions, chunk by chunk.
+
+        We use keyset pagination (`pk > last_pk`) instead of offsets, so
+        fetching a chunk costs the same at the end of the table than at the
+        beginning, and only a single chunk is ever kept in memory.
+
+        """
+        if queryset is None:
+            queryset = self.get_queryset()
+        queryset = queryset.order_by('pk')
+
+        last_pk = from_pk
+        while True:
+            chunk = list(queryset.filter(pk__gt=last_pk)[:chunk_size])
+            if not chunk:
+                break
+            yield chunk
+            last_pk = chunk[-1].pk
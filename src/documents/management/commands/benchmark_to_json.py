@@ -0,0 +1,63 @@
+# -*- coding: utf-8 -*-
+
+
+import timeit
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from categories.models import Category
+from documents.tests.utils import generate_random_documents, legacy_to_json
+
+
+class Command(BaseCommand):
+    help = 'Compare the compiled `to_json` serializer with the legacy one'
+
+    def add_arguments(self, parser):
+        parser.add_argument('category_id', type=int)
+        parser.add_argument(
+            '--generate',
+            type=int, dest='generate', default=0,
+            help='Number of random documents to generate (and discard) '
+                 'before running the benchmark.')
+        parser.add_argument(
+            '--rounds',
+            type=int, dest='rounds', default=5)
+
+    def handle(self, *args, **options):
+        category = Category.objects \
+            .select_related('organisation', 'category_template') \
+            .get(pk=options['category_id'])
+
+        # Generated documents are rolled back at the end of the benchmark
+        with transaction.atomic():
+            if options['generate']:
+                generate_random_documents(options['generate'], category)
+            self.benchmark(category, options['rounds'])
+            transaction.set_rollback(True)
+
+    def benchmark(self, category, rounds):
+        Revision = category.revision_class()
+        revisions = list(Revision.objects
+                         .filter(metadata__document__category=category)
+                         .select_related())
+        self.stdout.write('Serializing {} revisions, {} rounds'.format(
+            len(revisions), rounds))
+
+        for revision in revisions:
+            if revision.to_json() != legacy_to_json(revision):
+                self.stderr.write('Outputs differ for revision {}'.format(
+                    revision.pk))
+
+        legacy = timeit.timeit(
+            lambda: [legacy_to_json(rev) for rev in revisions],
+            number=rounds)
+        compiled = timeit.timeit(
+            lambda: [rev.to_json() for rev in revisions],
+            number=rounds)
+
+        self.stdout.write('Legacy:   {:.3f}s'.format(legacy))
+        self.stdout.write('Compiled: {:.3f}s'.format(compiled))
+        if compiled:
+            self.stdout.write(self.style.SUCCESS(
+                'Speedup:  x{:.2f}'.format(legacy / compiled)))
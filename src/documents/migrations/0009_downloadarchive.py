@@ -0,0 +1,35 @@
+# -*- coding: utf-8 -*-
+
+
+from django.db import migrations, models
+import django.utils.timezone
+import privatemedia.fields
+import privatemedia.storage
+import uuid
+from django.conf import settings
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('documents', '0008_auto_20160607_1650'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DownloadArchive',
+            fields=[
+                ('id', models.UUIDField(primary_key=True, serialize=False, editable=False, default=uuid.uuid4)),
+                ('name', models.CharField(max_length=255, verbose_name='Name')),
+                ('archive_file', privatemedia.fields.PrivateFileField(upload_to='archives', max_length=255, verbose_name='Archive file', blank=True, storage=privatemedia.storage.ProtectedStorage())),
+                ('task_id', models.CharField(help_text='Id of the task building the archive', max_length=50, verbose_name='Task id', blank=True, default='')),
+                ('created_on', models.DateTimeField(default=django.utils.timezone.now, verbose_name='Created on')),
+                ('owner', models.ForeignKey(verbose_name='Owner', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Download archive',
+                'verbose_name_plural': 'Download archives',
+            },
+        ),
+    ]
@@ -0,0 +1,19 @@
+# -*- coding: utf-8 -*-
+
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('documents', '0009_downloadarchive'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='downloadarchive',
+            name='error_msg',
+            field=models.TextField(help_text='Error raised while building the archive', verbose_name='Error message', blank=True, default=''),
+        ),
+    ]
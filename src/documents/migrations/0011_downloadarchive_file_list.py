@@ -0,0 +1,19 @@
+# -*- coding: utf-8 -*-
+
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('documents', '0010_downloadarchive_error_msg'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='downloadarchive',
+            name='file_list',
+            field=models.TextField(help_text='Json list of the (path, name in the archive) files', verbose_name='File list', blank=True, default=''),
+        ),
+    ]
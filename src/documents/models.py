@@ -1,8 +1,9 @@
 # -*- coding: utf-8 -*-
+import json
 import logging
 import os
-import zipfile
-import tempfile
+import uuid
+import shutil
 from collections import OrderedDict
 
 from django.db import models
@@ -16,9 +17,11 @@ from annoying.functions import get_object_or_None
 
 from accounts.models import User
 from documents.fields import RevisionFileField
+from documents.serializers import RevisionSerializer
+from documents.zipstream import stream_zip
+from privatemedia.fields import PrivateFileField
 from categories.models import Category
 from documents.templatetags.documents import MenuItem, DividerMenuItem
-import collections
 
 logger = logging.getLogger(__name__)
 
@@ -346,44 +349,47 @@ class Metadata(six.with_metaclass(MetadataBase, models.Model)):
         return DocumentDownloadForm(data, queryset=queryset)
 
     @classmethod
-    def compress_documents(cls, documents, **kwargs):
-        """Compress the given files' documents (or queryset) in a zip file.
+    def get_archived_files(cls, documents, **kwargs):
+        """List the files of the given documents (or queryset) to archive.
 
         * format can be either 'both', 'native' or 'pdf'
         * revisions can be either 'latest' or 'all'
 
-        Returns the name of the ziped file.
+        Yields (path, name in the archive) tuples.
         """
         format = kwargs.pop('format', 'both')
         revisions = kwargs.pop('revisions', 'latest')
-        temp_file = tempfile.TemporaryFile()
+        for document in documents:
+            if revisions == 'latest':
+                revs = [document.latest_revision]
+            elif revisions == 'all':
+                revs = document.get_all_revisions()
 
-        with zipfile.ZipFile(temp_file, mode='w') as zip_file:
             files = []
-            for document in documents:
-                if revisions == 'latest':
-                    revs = [document.latest_revision]
-                elif revisions == 'all':
-                    revs = document.get_all_revisions()
-
-                for rev in revs:
-                    if rev is not None:
-                        if format in ('native', 'both'):
-                            files.append(rev.native_file)
-                        if format in ('pdf', 'both'):
-                            files.append(rev.pdf_file)
+            for rev in revs:
+                if rev is not None:
+                    if format in ('native', 'both'):
+                        files.append(rev.native_file)
+                    if format in ('pdf', 'both'):
+                        files.append(rev.pdf_file)
 
             for file_ in files:
                 if file_.name:
                     if os.path.isfile(file_.path):
-                        zip_file.write(
-                            file_.path,
-                            file_.name,
-                            compress_type=zipfile.ZIP_DEFLATED)
+                        yield (file_.path, file_.name)
                     else:
                         msg = "Can't serve %s, the file is missing"
                         logger.error(msg % file_.name)
-        return temp_file
+
+    @classmethod
+    def compress_documents(cls, documents, **kwargs):
+        """Compress the given files' documents (or queryset) in a zip file.
+
+        See `get_archived_files` for the available options.
+
+        Returns an iterator over the zip data, generated on the fly.
+        """
+        return stream_zip(cls.get_archived_files(documents, **kwargs))
 
 
 class RevisionBase(ModelBase):
@@ -486,72 +492,28 @@ class MetadataRevisionBase(models.Model):
     def unique_id(self):
         return self.id
 
+    @classmethod
+    def get_json_serializer(cls):
+        """Returns the serializer used by `to_json`.
+
+        The serializer is built once per revision class.
+
+        """
+        if '_json_serializer' not in cls.__dict__:
+            cls._json_serializer = RevisionSerializer(cls)
+        return cls._json_serializer
+
     def to_json(self):
         """Converts the revision to a json representation.
 
         Suitable for indexing in ES, for example.
 
-        The first element of the list is the linkified document number.
-
         If a value is a Model instance (e.g a foreign key), we return both it's
         unicode and id values.
+
+        See `documents.serializers.RevisionSerializer`.
         """
-        fields = tuple()
-        metadata = self.metadata
-        document = metadata.document
-
-        def add_to_fields(key):
-            # Search the value of `key` in the revision, metadata and document,
-            # in that order. If not found, raise an exception.
-            # Note that the value can be "None" so careful with have to
-            # explicitely catch the AttributeError exception
-            try:
-                value = getattr(self, key)
-            except AttributeError:
-                try:
-                    value = getattr(metadata, key)
-                except AttributeError:
-                    try:
-                        value = getattr(document, key)
-                    except AttributeError:
-                        error = 'Cannot find field {} in doc {} ({})'.format(
-                            key, document.document_key, document.document_type())
-                        raise RuntimeError(error)
-
-            if isinstance(value, collections.Callable):
-                value = value()
-
-            if isinstance(value, models.Model):
-                field = (
-                    (str(key), value.__str__()),
-                    ('%s_id' % key, value.pk)
-                )
-            else:
-                field = ((str(key), value),)
-
-            return field
-
-        config = document.category.document_class().PhaseConfig
-        filter_fields = list(config.filter_fields)
-        column_fields = list(dict(config.column_fields).values())
-        indexable_fields = getattr(config, 'indexable_fields', [])
-        fields_to_index = set(filter_fields + column_fields + indexable_fields)
-
-        for field in fields_to_index:
-            fields += add_to_fields(field)
-
-        fields_infos = dict(fields)
-        fields_infos.update({
-            'url': document.get_absolute_url(),
-            'document_key': document.document_key,
-            'document_number': document.document_number,
-            'document_pk': document.pk,
-            'metadata_pk': metadata.pk,
-            'pk': self.pk,
-            'revision': self.revision,
-            'is_latest_revision': document.current_revision == self.revision,
-        })
-        return fields_infos
+        return self.get_json_serializer().serialize(self)
 
     def get_initial_ignored_fields(self):
         """New revision initial data that must stay default."""
@@ -681,3 +643,125 @@ class MetadataRevision(MetadataRevisionBase):
 
     class Meta(MetadataRevisionBase.Meta):
         abstract = True
+
+
+class DownloadArchive(models.Model):
+    """A zip archive of files, built in the background.
+
+    Archiving many or large files takes too long to keep a web worker busy,
+    so the archive is built by a task, and downloaded once ready.
+
+    """
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    owner = models.ForeignKey(
+        'accounts.User',
+        verbose_name=_('Owner'))
+    name = models.CharField(
+        _('Name'),
+        max_length=255)
+    archive_file = PrivateFileField(
+        _('Archive file'),
+        upload_to='archives',
+        max_length=255,
+        blank=True)
+    task_id = models.CharField(
+        _('Task id'),
+        max_length=50,
+        blank=True, default='',
+        help_text=_('Id of the task building the archive'))
+    error_msg = models.TextField(
+        _('Error message'),
+        blank=True, default='',
+        help_text=_('Error raised while building the archive'))
+    file_list = models.TextField(
+        _('File list'),
+        blank=True, default='',
+        help_text=_('Json list of the (path, name in the archive) files'))
+    created_on = models.DateTimeField(
+        _('Created on'),
+        default=timezone.now)
+
+    class Meta:
+        app_label = 'documents'
+        verbose_name = _('Download archive')
+        verbose_name_plural = _('Download archives')
+
+    def __str__(self):
+        return self.name
+
+    def get_absolute_url(self):
+        return reverse('archive_download', args=[self.id])
+
+    def is_ready(self):
+        return bool(self.archive_file)
+
+    def is_failed(self):
+        return bool(self.error_msg)
+
+    def get_poll_url(self):
+        if not self.task_id or self.is_failed():
+            return None
+        return reverse('task_poll', args=[self.task_id])
+
+    def get_file_dir(self):
+        return 'archives/{}'.format(self.id)
+
+    def get_file_name(self):
+        # The archive is downloaded under the file's base name
+        return '{}/{}'.format(self.get_file_dir(), self.name)
+
+    def get_files(self):
+        return [tuple(file_) for file_ in json.loads(self.file_list or '[]')]
+
+    def start_build(self, files):
+        """Asynchronously build the archive of the given files.
+
+        `files` is a list of (path, name in the archive) tuples. It is
+        stored in db, since it can be too large for a task message.
+
+        """
+        from documents.tasks import build_archive
+        logger.info('Starting archive {}'.format(self.id))
+        self.file_list = json.dumps(files)
+        self.save(update_fields=['file_list'])
+        result = build_archive.delay(str(self.pk))
+        DownloadArchive.objects \
+            .filter(pk=self.pk) \
+            .update(task_id=result.id)
+        self.task_id = result.id
+
+    def build(self, progress_callback=None):
+        """Write the archive file.
+
+        `progress_callback` is called with the progress percentage every
+        time a new file is archived.
+
+        """
+        def monitor(files):
+            for index, file_ in enumerate(files):
+                if progress_callback:
+                    progress_callback(float(index) / len(files) * 100)
+                yield file_
+
+        file_name = self.get_file_name()
+        storage = self.archive_file.storage
+        file_path = storage.path(file_name)
+        file_dir = os.path.dirname(file_path)
+        if not os.path.exists(file_dir):
+            os.makedirs(file_dir)
+
+        files = self.get_files()
+        with open(file_path, 'wb') as the_file:
+            for data in stream_zip(monitor(files)):
+                the_file.write(data)
+
+        self.archive_file.name = file_name
+        self.file_list = ''
+        self.save(update_fields=['archive_file', 'file_list'])
+        logger.info('Archive {} done'.format(self.id))
+
+    def delete_file(self):
+        storage = self.archive_file.storage
+        file_dir = storage.path(self.get_file_dir())
+        if os.path.exists(file_dir):
+            shutil.rmtree(file_dir)
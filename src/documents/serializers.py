@@ -0,0 +1,125 @@
+# -*- coding: utf-8 -*-
+
+
+from django.db import models
+from django.core.exceptions import FieldDoesNotExist
+
+
+# Where to look for a field value, in that order
+SOURCES = ('revision', 'metadata', 'document')
+
+# How to extract a field value
+FIELD = 'field'  # A regular db field
+FOREIGN_KEY = 'foreign_key'  # A forward FK or one-to-one field
+MANY_TO_MANY = 'many_to_many'  # A many to many field
+ATTRIBUTE = 'attribute'  # A property, a method or anything else
+UNKNOWN = 'unknown'  # Not found on classes, maybe an instance attribute
+
+
+class RevisionSerializer(object):
+    """Converts revisions of a given class to a json representation.
+
+    Indexed fields are configured in the document `PhaseConfig` class, and
+    their value can be found in the revision, the metadata or the document.
+
+    Looking up for those each time a revision is converted is quite costly,
+    so we find out once and for all where every field is located and how to
+    extract its value.
+
+    """
+    def __init__(self, revision_class):
+        self.revision_class = revision_class
+        self.metadata_class = revision_class._meta.get_field('metadata').rel.to
+        self.fields = self.get_fields_to_index()
+        self.plan = [self.compile_field(field) for field in self.fields]
+
+    def get_fields_to_index(self):
+        config = self.metadata_class.PhaseConfig
+        filter_fields = list(config.filter_fields)
+        column_fields = list(dict(config.column_fields).values())
+        indexable_fields = getattr(config, 'indexable_fields', [])
+        return set(filter_fields + column_fields + indexable_fields)
+
+    def compile_field(self, key):
+        """Returns a (key, source, kind, attname) tuple for the given field."""
+        from documents.models import Document
+
+        classes = (self.revision_class, self.metadata_class, Document)
+        for source, class_ in zip(SOURCES, classes):
+            try:
+                field = class_._meta.get_field(key)
+                if field.many_to_many and field.concrete:
+                    return (key, source, MANY_TO_MANY, key)
+                if field.concrete:
+                    kind = FOREIGN_KEY if field.is_relation else FIELD
+                    return (key, source, kind, field.attname)
+            except FieldDoesNotExist:
+                pass
+
+            if hasattr(class_, key):
+                return (key, source, ATTRIBUTE, key)
+
+        return (key, None, UNKNOWN, key)
+
+    def get_dynamic_value(self, key, objects):
+        """Search the value of `key` in the revision, metadata and document.
+
+        This is only used for values that cannot be found on the classes,
+        or when an attribute raises `AttributeError`.
+
+        """
+        for obj in objects:
+            try:
+                return getattr(obj, key)
+            except AttributeError:
+                pass
+
+        document = objects[-1]
+        error = 'Cannot find field {} in doc {} ({})'.format(
+            key, document.document_key, document.document_type())
+        raise RuntimeError(error)
+
+    def serialize(self, revision):
+        metadata = revision.metadata
+        document = metadata.document
+        objects = (revision, metadata, document)
+        sources = dict(zip(SOURCES, objects))
+
+        data = {}
+        for key, source, kind, attname in self.plan:
+            if kind == FIELD:
+                data[key] = getattr(sources[source], attname)
+                continue
+
+            if kind == UNKNOWN:
+                value = self.get_dynamic_value(key, objects)
+            elif kind == ATTRIBUTE:
+                # Properties may raise `AttributeError`, in which case the
+                # value is searched in all the objects, like `to_json` did
+                try:
+                    value = getattr(sources[source], key)
+                except AttributeError:
+                    value = self.get_dynamic_value(key, objects)
+            else:
+                value = getattr(sources[source], key)
+
+            if kind != FOREIGN_KEY and callable(value):
+                value = value()
+
+            if isinstance(value, models.Model):
+                data[key] = value.__str__()
+                data['%s_id' % key] = value.pk
+            else:
+                data[key] = value
+
+        data.update({
+            'url': document.get_absolute_url(),
+            'document_key': document.document_key,
+            'document_number': document.document_number,
+            'document_pk': document.pk,
+            'metadata_pk': metadata.pk,
+            'pk': revision.pk,
+            'revision': revision.revision,
+            'is_latest_revision': document.current_revision == revision.revision,
+        })
+        return data
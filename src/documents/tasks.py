@@ -0,0 +1,43 @@
+# -*- coding: utf-8 -*-
+
+
+import logging
+
+from django.conf import settings
+from celery import current_task
+
+from core.celery import app
+
+
+logger = logging.getLogger(__name__)
+
+
+@app.task
+def build_archive(archive_id):
+    from documents.models import DownloadArchive
+    archive = DownloadArchive.objects.get(pk=archive_id)
+
+    # Cleanup oldest archives when there are too many
+    oldest_archives = list(DownloadArchive.objects
+                           .filter(owner=archive.owner)
+                           .order_by('-created_on')
+                           [settings.DOWNLOADS_ARCHIVES_TO_KEEP:])
+    for oldest_archive in oldest_archives:
+        oldest_archive.delete_file()
+        oldest_archive.delete()
+
+    def report_progress(progress):
+        current_task.update_state(
+            state='PROGRESS',
+            meta={'progress': progress})
+
+    try:
+        archive.build(progress_callback=report_progress)
+    except Exception as e:
+        # The archive must not be left pending forever
+        logger.exception('Archive {} failed'.format(archive.id))
+        archive.delete_file()
+        DownloadArchive.objects \
+            .filter(pk=archive.pk) \
+            .update(error_msg=str(e) or e.__class__.__name__)
+        raise
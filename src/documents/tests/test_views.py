@@ -12,13 +12,16 @@ from django.core.urlresolvers import reverse
 from django.test import TestCase, override_settings
 from django.test.client import Client
 
+from mock import patch
+
 from accounts.factories import UserFactory
 from audit_trail.models import Activity
 from categories.factories import CategoryFactory
 from default_documents.factories import MetadataRevisionFactory
 from default_documents.models import DemoMetadata, DemoMetadataRevision
 from documents.factories import DocumentFactory
-from documents.models import Document
+from documents.models import Document, DownloadArchive
+from documents.tasks import build_archive
 
 
 class GenericViewTest(TestCase):
@@ -121,10 +124,10 @@ class DocumentDownloadTest(TestCase):
         # Login as admin so we won't be bothered by missing permissions
         self.category = CategoryFactory()
         self.download_url = self.category.get_download_url()
-        user = UserFactory(email='testadmin@phase.fr', password='pass',
-                           is_superuser=True,
-                           category=self.category)
-        self.client.login(email=user.email, password='pass')
+        self.user = UserFactory(email='testadmin@phase.fr', password='pass',
+                                is_superuser=True,
+                                category=self.category)
+        self.client.login(email=self.user.email, password='pass')
         self.maxDiff = None
 
     def tearDown(self):
@@ -179,15 +182,18 @@ class DocumentDownloadTest(TestCase):
         })
         self.assertEqual(r.status_code, 200)
         self.assertDictEqual(r._headers, {
-            'content-length': ('Content-Length', '22'),
             'content-type': ('Content-Type', 'application/zip'),
             'vary': ('Vary', 'Cookie'),
             'x-frame-options': ('X-Frame-Options', 'SAMEORIGIN'),
+            'x-accel-buffering': ('X-Accel-Buffering', 'no'),
             'content-disposition': (
                 'Content-Disposition',
                 'attachment; filename=download.zip'
             )
         })
+        content = b''.join(r.streaming_content)
+        self.assertEqual(len(content), 22)
+        self.assertEqual(ZipFile(BytesIO(content)).namelist(), [])
 
     def test_all_revisions_document_download(self):
         """
@@ -219,10 +225,79 @@ class DocumentDownloadTest(TestCase):
         })
         self.assertEqual(r.status_code, 200)
 
-        zipfile = BytesIO(r.content)
+        zipfile = BytesIO(b''.join(r.streaming_content))
         filelist = ZipFile(zipfile).namelist()
         self.assertEqual(len(filelist), 4)
 
+    @override_settings(DOWNLOADS_BACKGROUND_FILES=1)
+    def test_large_download_is_built_in_background(self):
+        document = DocumentFactory(
+            document_key='HAZOP-related',
+            category=self.category,
+            revision={
+                'native_file': SimpleUploadedFile('native.docx', b'content'),
+                'pdf_file': SimpleUploadedFile('pdf.pdf', b'content'),
+            }
+        )
+        r = self.client.post(self.download_url, {
+            'document_ids': document.id,
+            'revisions': 'latest',
+            'format': 'both',
+        })
+        archive = DownloadArchive.objects.get()
+        self.addCleanup(archive.delete_file)
+        self.assertRedirects(
+            r, archive.get_absolute_url(), fetch_redirect_response=False)
+        self.assertTrue(archive.is_ready())
+
+        r = self.client.get(archive.get_absolute_url())
+        self.assertEqual(r.status_code, 200)
+        content = b''.join(r.streaming_content)
+        self.assertEqual(len(ZipFile(BytesIO(content)).namelist()), 2)
+
+    def test_file_list_is_not_sent_to_the_task(self):
+        archive = DownloadArchive.objects.create(
+            owner=self.user, name='download.zip')
+        files = [('/path/to/file.pdf', 'file.pdf')]
+        with patch('documents.tasks.build_archive.delay') as delay_mock:
+            delay_mock.return_value.id = 'task'
+            archive.start_build(files)
+
+        delay_mock.assert_called_once_with(str(archive.pk))
+        archive.refresh_from_db()
+        self.assertEqual(archive.get_files(), files)
+
+    def test_pending_archive_displays_progress(self):
+        archive = DownloadArchive.objects.create(
+            owner=self.user, name='download.zip', task_id='task')
+        r = self.client.get(archive.get_absolute_url())
+        self.assertContains(r, reverse('task_poll', args=['task']))
+
+    def test_failed_archive_displays_error(self):
+        archive = DownloadArchive.objects.create(
+            owner=self.user, name='download.zip', task_id='task')
+        with patch.object(DownloadArchive, 'build',
+                          side_effect=IOError('disk full')):
+            with self.assertRaises(IOError):
+                build_archive(str(archive.pk))
+
+        archive.refresh_from_db()
+        self.assertEqual(archive.error_msg, 'disk full')
+        self.assertFalse(archive.is_ready())
+        self.assertIsNone(archive.get_poll_url())
+
+        # The progress is not polled anymore
+        r = self.client.get(archive.get_absolute_url())
+        self.assertContains(r, 'could not be built')
+        self.assertNotContains(r, reverse('task_poll', args=['task']))
+
+    def test_archives_of_other_users_cannot_be_downloaded(self):
+        other_user = UserFactory(email='other@phase.fr')
+        archive = DownloadArchive.objects.create(
+            owner=other_user, name='download.zip')
+        r = self.client.get(archive.get_absolute_url())
+        self.assertEqual(r.status_code, 404)
+
 
 class DocumentReviseTests(TestCase):
     def setUp(self):
@@ -294,6 +369,7 @@ class DocumentDeleteTests(TestCase):
         activity = Activity.objects.latest('created_on')
         self.assertEqual(activity.verb, Activity.VERB_DELETED)
         self.assertEqual(activity.action_object_str, document_str)
+        self.assertEqual(activity.action_object_key, document.document_key)
         self.assertEqual(activity.actor, self.user)
 
         res = self.client.post(delete_url)
@@ -0,0 +1,91 @@
+# -*- coding: utf-8 -*-
+
+
+import os
+import shutil
+import tempfile
+from io import BytesIO
+from zipfile import ZipFile, ZIP_STORED, ZIP_DEFLATED
+
+from django.test import SimpleTestCase
+
+from documents.zipstream import ZipStreamWriter, stream_zip
+
+
+class StreamZipTests(SimpleTestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.pdf_path = self.create_file('document.pdf', os.urandom(10000))
+        self.txt_path = self.create_file('document.txt', b'content' * 1000)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def create_file(self, name, content):
+        path = os.path.join(self.tmpdir, name)
+        with open(path, 'wb') as the_file:
+            the_file.write(content)
+        return path
+
+    def test_archive_is_streamed(self):
+        files = [
+            (self.pdf_path, 'key/document.pdf'),
+            (self.txt_path, 'key/document.txt'),
+        ]
+        chunks = list(stream_zip(files, chunk_size=1000))
+        self.assertTrue(len(chunks) > 10)
+
+        archive = ZipFile(BytesIO(b''.join(chunks)))
+        self.assertIsNone(archive.testzip())
+        self.assertEqual(
+            archive.read('key/document.txt'), b'content' * 1000)
+
+    def test_pdf_files_are_not_compressed(self):
+        files = [
+            (self.pdf_path, 'document.pdf'),
+            (self.txt_path, 'document.txt'),
+        ]
+        archive = ZipFile(BytesIO(b''.join(stream_zip(files))))
+        self.assertEqual(
+            archive.getinfo('document.pdf').compress_type, ZIP_STORED)
+        self.assertEqual(
+            archive.getinfo('document.txt').compress_type, ZIP_DEFLATED)
+
+    def test_missing_files_are_skipped(self):
+        files = [
+            (os.path.join(self.tmpdir, 'missing.pdf'), 'missing.pdf'),
+            (self.txt_path, 'document.txt'),
+        ]
+        archive = ZipFile(BytesIO(b''.join(stream_zip(files))))
+        self.assertEqual(archive.namelist(), ['document.txt'])
+
+    def test_non_ascii_names(self):
+        files = [(self.txt_path, 'clé/document.txt')]
+        archive = ZipFile(BytesIO(b''.join(stream_zip(files))))
+        self.assertEqual(archive.namelist(), ['clé/document.txt'])
+
+
+class ZipStreamWriterTests(SimpleTestCase):
+    def test_zip64_entries(self):
+        buf = BytesIO()
+        with ZipStreamWriter(buf) as writer:
+            with writer.open('export.csv', zip64=True) as entry:
+                entry.write(b'Document Number;Title\n')
+                entry.write(b'toto;Toto\n')
+
+        archive = ZipFile(BytesIO(buf.getvalue()))
+        self.assertIsNone(archive.testzip())
+        self.assertEqual(
+            archive.read('export.csv'), b'Document Number;Title\ntoto;Toto\n')
+
+    def test_many_entries(self):
+        buf = BytesIO()
+        with ZipStreamWriter(buf) as writer:
+            for i in range(70000):
+                with writer.open(str(i), compress_type=ZIP_STORED) as entry:
+                    entry.write(b'x')
+
+        # More than 65535 entries require the zip64 end record
+        archive = ZipFile(BytesIO(buf.getvalue()))
+        self.assertEqual(len(archive.namelist()), 70000)
+        self.assertEqual(archive.read('69999'), b'x')
@@ -1,6 +1,6 @@
 from random import choice
 
-from django.db import transaction
+from django.db import models, transaction
 
 from documents.factories import DocumentFactory
 from default_documents.factories import MetadataRevisionFactory
@@ -36,3 +36,64 @@ def generate_random_documents(nb_of_docs, category):
                 ),
                 metadata=metadata
             )
+
+
+def legacy_to_json(revision):
+    """The original `to_json` implementation, kept for comparison.
+
+    Every field is looked up with nested `getattr` calls on the revision, the
+    metadata and the document, and the field list is rebuilt on every call.
+
+    """
+    fields = tuple()
+    metadata = revision.metadata
+    document = metadata.document
+
+    def add_to_fields(key):
+        try:
+            value = getattr(revision, key)
+        except AttributeError:
+            try:
+                value = getattr(metadata, key)
+            except AttributeError:
+                try:
+                    value = getattr(document, key)
+                except AttributeError:
+                    error = 'Cannot find field {} in doc {} ({})'.format(
+                        key, document.document_key, document.document_type())
+                    raise RuntimeError(error)
+
+        if callable(value):
+            value = value()
+
+        if isinstance(value, models.Model):
+            field = (
+                (str(key), value.__str__()),
+                ('%s_id' % key, value.pk)
+            )
+        else:
+            field = ((str(key), value),)
+
+        return field
+
+    config = document.category.document_class().PhaseConfig
+    filter_fields = list(config.filter_fields)
+    column_fields = list(dict(config.column_fields).values())
+    indexable_fields = getattr(config, 'indexable_fields', [])
+    fields_to_index = set(filter_fields + column_fields + indexable_fields)
+
+    for field in fields_to_index:
+        fields += add_to_fields(field)
+
+    fields_infos = dict(fields)
+    fields_infos.update({
+        'url': document.get_absolute_url(),
+        'document_key': document.document_key,
+        'document_number': document.document_number,
+        'document_pk': document.pk,
+        'metadata_pk': metadata.pk,
+        'pk': revision.pk,
+        'revision': revision.revision,
+        'is_latest_revision': document.current_revision == revision.revision,
+    })
+    return fields_infos
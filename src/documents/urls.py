@@ -3,7 +3,8 @@ from django.conf.urls import url
 from documents.views import (
     DocumentList, DocumentCreate, DocumentDetail, DocumentEdit,
     DocumentDownload, DocumentRedirect, DocumentRevise, DocumentDelete,
-    DocumentRevisionDelete, RevisionFileDownload, DocumentFileDownload
+    DocumentRevisionDelete, RevisionFileDownload, DocumentFileDownload,
+    ArchiveDownload
 )
 
 urlpatterns = [
@@ -14,6 +15,9 @@ urlpatterns = [
         name='document_short_url'),
 
     # Downloads
+    url(r'^archives/(?P<uid>[-\w]+)/$',
+        ArchiveDownload.as_view(),
+        name="archive_download"),
     url(r'^(?P<organisation>[\w-]+)/(?P<category>[\w-]+)/download/$',
         DocumentDownload.as_view(),
         name="document_download"),
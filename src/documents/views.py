@@ -1,14 +1,15 @@
 # -*- coding: utf-8 -*-
 
 
+import os
 import json
 
 from django.utils import timezone
 from django.conf import settings
 from django.http import (
-    HttpResponse, Http404, HttpResponseForbidden, HttpResponseRedirect
+    HttpResponse, Http404, HttpResponseForbidden, HttpResponseRedirect,
+    StreamingHttpResponse
 )
-from wsgiref.util import FileWrapper
 from django.core.exceptions import PermissionDenied
 from django.views.generic import (
     ListView, DetailView, RedirectView, DeleteView)
@@ -30,8 +31,9 @@ from favorites.api.serializers import FavoriteSerializer
 from bookmarks.models import get_user_bookmarks
 from bookmarks.api.serializers import BookmarkSerializer
 from categories.views import CategoryMixin
-from documents.models import Document
+from documents.models import Document, DownloadArchive
 from documents.utils import save_document_forms
+from documents.zipstream import stream_zip
 from documents.forms.models import documentform_factory
 from documents.forms.filters import filterform_factory
 from notifications.models import notify
@@ -465,11 +467,15 @@ class DocumentDelete(LoginRequiredMixin,
         """
         document = self.object.document
         document_str = str(document)
+        document_key = document.document_key
         success_url = self.get_success_url()
         document.delete()
+        # The category is logged, so incremental exports can list deleted
+        # documents
         activity_log.send(verb=Activity.VERB_DELETED,
-                          target=None,
+                          target=self.category,
                           action_object_str=document_str,
+                          action_object_key=document_key,
                           sender=None,
                           actor=self.request.user)
 
@@ -584,7 +590,57 @@ class DocumentRevise(DocumentEdit):
         return context
 
 
-class DocumentDownload(BaseDocumentList):
+class ArchiveDownloadMixin(object):
+    """Send zip archives of files.
+
+    Small archives are streamed while being compressed. Large ones would
+    keep a web worker busy for too long, so they are built by a task, and
+    the user is redirected to a page displaying the progress.
+
+    """
+    archive_name = 'download.zip'
+
+    def is_large_archive(self, files):
+        if len(files) > settings.DOWNLOADS_BACKGROUND_FILES:
+            return True
+
+        size = sum(
+            os.path.getsize(path) for path, arcname in files
+            if os.path.isfile(path))
+        return size > settings.DOWNLOADS_BACKGROUND_SIZE
+
+    def archive_response(self, files):
+        """Return the archive of the given (path, name in the archive) files."""
+        if self.is_large_archive(files):
+            archive = DownloadArchive.objects.create(
+                owner=self.request.user,
+                name=self.archive_name)
+            archive.start_build(files)
+            return HttpResponseRedirect(archive.get_absolute_url())
+
+        # The zip file is generated while being downloaded
+        response = StreamingHttpResponse(
+            stream_zip(files), content_type='application/zip')
+        response['Content-Disposition'] = 'attachment; filename={}'.format(
+            self.archive_name)
+        # Prevents nginx from buffering the whole archive before sending it
+        response['X-Accel-Buffering'] = 'no'
+        return response
+
+
+class ZipViewArchiveMixin(ArchiveDownloadMixin):
+    """Send `zipview.views.BaseZipView` archives with `ArchiveDownloadMixin`."""
+
+    def get(self, request, *args, **kwargs):
+        self.archive_name = self.zipfile_name
+        files = []
+        for file_ in self.get_files():
+            file_.close()
+            files.append((file_.name, os.path.basename(file_.name)))
+        return self.archive_response(files)
+
+
+class DocumentDownload(ArchiveDownloadMixin, BaseDocumentList):
 
     def post(self, request, *args, **kwargs):
         _class = self.category.document_class()
@@ -596,17 +652,34 @@ class DocumentDownload(BaseDocumentList):
         else:
             raise Http404('Invalid parameters to download files.')
 
-        # Generates the temporary zip file
-        zip_filename = _class.compress_documents(data['document_ids'], **data)
-        file_size = zip_filename.tell()
-        zip_filename.seek(0)
-        wrapper = FileWrapper(zip_filename)
+        files = list(_class.get_archived_files(data['document_ids'], **data))
+        return self.archive_response(files)
 
-        # Returns the zip file for download
-        response = HttpResponse(wrapper, content_type='application/zip')
-        response['Content-Disposition'] = 'attachment; filename=download.zip'
-        response['Content-Length'] = file_size
-        return response
+
+class ArchiveDownload(LoginRequiredMixin, DetailView):
+    """Download an archive built in the background.
+
+    While the archive is being built, a page displaying the progress is
+    shown instead.
+
+    """
+    model = DownloadArchive
+    pk_url_kwarg = 'uid'
+
+    def breadcrumb_section(self):
+        return (_('Download'), '#')
+
+    def get_queryset(self):
+        return super(ArchiveDownload, self).get_queryset() \
+            .filter(owner=self.request.user)
+
+    def get(self, request, *args, **kwargs):
+        self.object = self.get_object()
+        if self.object.is_ready():
+            return serve_model_file_field(self.object, 'archive_file')
+
+        context = self.get_context_data(object=self.object)
+        return self.render_to_response(context)
 
 
 class BaseFileDownload(LoginRequiredMixin, CategoryMixin, DetailView):
@@ -0,0 +1,283 @@
+# -*- coding: utf-8 -*-
+
+
+import os
+import time
+import struct
+import logging
+import zipfile
+import zlib
+
+
+logger = logging.getLogger(__name__)
+
+
+# Those files are already compressed, deflating them again only costs cpu
+STORED_EXTENSIONS = (
+    '.pdf', '.zip', '.gz', '.jpg', '.jpeg', '.png',
+    '.docx', '.xlsx', '.pptx')
+
+CHUNK_SIZE = 64 * 1024
+
+# Zip format constants, see the "APPNOTE.TXT" specification
+LOCAL_HEADER = struct.Struct('<IHHHHHIIIHH')
+LOCAL_HEADER_SIGNATURE = 0x04034b50
+DATA_DESCRIPTOR = struct.Struct('<IIII')
+DATA_DESCRIPTOR64 = struct.Struct('<IIQQ')
+DATA_DESCRIPTOR_SIGNATURE = 0x08074b50
+CENTRAL_HEADER = struct.Struct('<IHHHHHHIIIHHHHHII')
+CENTRAL_HEADER_SIGNATURE = 0x02014b50
+END_RECORD = struct.Struct('<IHHHHIIH')
+END_RECORD_SIGNATURE = 0x06054b50
+END_RECORD64 = struct.Struct('<IQHHIIQQQQ')
+END_RECORD64_SIGNATURE = 0x06064b50
+END_LOCATOR64 = struct.Struct('<IIQI')
+END_LOCATOR64_SIGNATURE = 0x07064b50
+ZIP64_EXTRA_ID = 0x0001
+
+FLAG_DATA_DESCRIPTOR = 0x08
+FLAG_UTF8 = 0x800
+VERSION = 20
+VERSION_ZIP64 = 45
+MADE_BY_UNIX = 3 << 8
+MAX_16 = 0xFFFF
+MAX_32 = 0xFFFFFFFF
+
+
+def dos_date_time(timestamp):
+    """Convert a timestamp to the zip (msdos) date and time format."""
+    year, month, day, hour, minute, second = time.localtime(timestamp)[:6]
+    if year < 1980:
+        year, month, day, hour, minute, second = 1980, 1, 1, 0, 0, 0
+    date = (year - 1980) << 9 | month << 5 | day
+    time_ = hour << 11 | minute << 5 | second // 2
+    return date, time_
+
+
+class ZipEntry(object):
+    """A file being written in a `ZipStreamWriter` archive."""
+
+    def __init__(self, writer, arcname, compress_type, timestamp, mode,
+                 zip64):
+        self.writer = writer
+        self.compress_type = compress_type
+        self.zip64 = zip64
+        self.crc = 0
+        self.file_size = 0
+        self.compress_size = 0
+        self.offset = writer.offset
+        self.date, self.time = dos_date_time(timestamp)
+        self.external_attr = (mode & MAX_16) << 16
+
+        try:
+            self.name = arcname.encode('ascii')
+            self.flags = FLAG_DATA_DESCRIPTOR
+        except UnicodeEncodeError:
+            self.name = arcname.encode('utf-8')
+            self.flags = FLAG_DATA_DESCRIPTOR | FLAG_UTF8
+
+        if compress_type == zipfile.ZIP_DEFLATED:
+            self.compressor = zlib.compressobj(
+                zlib.Z_DEFAULT_COMPRESSION, zlib.DEFLATED, -15)
+        else:
+            self.compressor = None
+
+        self.write_local_header()
+
+    def write_local_header(self):
+        """Write the entry header, sizes are not known yet."""
+        if self.zip64:
+            # Tells readers the data descriptor holds 64 bits sizes
+            extra = struct.pack('<HHQQ', ZIP64_EXTRA_ID, 16, 0, 0)
+            version, size = VERSION_ZIP64, MAX_32
+        else:
+            extra = b''
+            version, size = VERSION, 0
+
+        self.writer.write(LOCAL_HEADER.pack(
+            LOCAL_HEADER_SIGNATURE, version, self.flags, self.compress_type,
+            self.time, self.date, 0, size, size, len(self.name), len(extra)))
+        self.writer.write(self.name)
+        self.writer.write(extra)
+
+    def write(self, data):
+        self.crc = zlib.crc32(data, self.crc)
+        self.file_size += len(data)
+        if self.compressor:
+            data = self.compressor.compress(data)
+        self.compress_size += len(data)
+        self.writer.write(data)
+
+    def close(self):
+        if self.compressor:
+            data = self.compressor.flush()
+            self.compress_size += len(data)
+            self.writer.write(data)
+
+        if self.zip64:
+            descriptor = DATA_DESCRIPTOR64
+        elif self.compress_size > MAX_32 or self.file_size > MAX_32:
+            raise zipfile.LargeZipFile(
+                'File size too large, use zip64 entries')
+        else:
+            descriptor = DATA_DESCRIPTOR
+        self.writer.write(descriptor.pack(
+            DATA_DESCRIPTOR_SIGNATURE, self.crc & MAX_32,
+            self.compress_size, self.file_size))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        # An interrupted entry is left unfinished, as the whole archive
+        if exc_type is None:
+            self.close()
+            self.writer.entries.append(self)
+
+    def central_header(self):
+        """Return the entry record of the central directory."""
+        extra_values = []
+        file_size, compress_size, offset = \
+            self.file_size, self.compress_size, self.offset
+        if file_size > MAX_32:
+            extra_values.append(file_size)
+            file_size = MAX_32
+        if compress_size > MAX_32:
+            extra_values.append(compress_size)
+            compress_size = MAX_32
+        if offset > MAX_32:
+            extra_values.append(offset)
+            offset = MAX_32
+
+        if extra_values:
+            extra = struct.pack(
+                '<HH' + 'Q' * len(extra_values),
+                ZIP64_EXTRA_ID, 8 * len(extra_values), *extra_values)
+            version = VERSION_ZIP64
+        else:
+            extra = b''
+            version = VERSION_ZIP64 if self.zip64 else VERSION
+
+        header = CENTRAL_HEADER.pack(
+            CENTRAL_HEADER_SIGNATURE, MADE_BY_UNIX | version, version,
+            self.flags, self.compress_type, self.time, self.date,
+            self.crc & MAX_32, compress_size, file_size,
+            len(self.name), len(extra), 0, 0, 0, self.external_attr, offset)
+        return header + self.name + extra
+
+
+class ZipStreamWriter(object):
+    """Write a zip archive to a file object that cannot be seeked.
+
+    The `zipfile` module needs to go back to entry headers to write the
+    entry sizes and checksums, at least before python 3.6. Here, they are
+    written in a data descriptor after the entry data instead, so the
+    archive can be sent while it is being written.
+
+    Entries that could exceed 4 GB must be opened with `zip64=True`.
+
+    """
+    def __init__(self, fileobj):
+        self.fileobj = fileobj
+        self.offset = 0
+        self.entries = []
+
+    def write(self, data):
+        self.fileobj.write(data)
+        self.offset += len(data)
+
+    def open(self, arcname, compress_type=zipfile.ZIP_DEFLATED,
+             timestamp=None, mode=0o644, zip64=False):
+        """Start a new entry, to be used as a context manager."""
+        if timestamp is None:
+            timestamp = time.time()
+        return ZipEntry(
+            self, arcname, compress_type, timestamp, mode, zip64)
+
+    def close(self):
+        """Write the central directory."""
+        directory_offset = self.offset
+        for entry in self.entries:
+            self.write(entry.central_header())
+        directory_size = self.offset - directory_offset
+        nb_entries = len(self.entries)
+
+        if nb_entries > MAX_16 or directory_offset > MAX_32 or \
+                directory_size > MAX_32:
+            end_record64_offset = self.offset
+            self.write(END_RECORD64.pack(
+                END_RECORD64_SIGNATURE, END_RECORD64.size - 12,
+                MADE_BY_UNIX | VERSION_ZIP64, VERSION_ZIP64, 0, 0,
+                nb_entries, nb_entries, directory_size, directory_offset))
+            self.write(END_LOCATOR64.pack(
+                END_LOCATOR64_SIGNATURE, 0, end_record64_offset, 1))
+
+        self.write(END_RECORD.pack(
+            END_RECORD_SIGNATURE, 0, 0,
+            min(nb_entries, MAX_16), min(nb_entries, MAX_16),
+            min(directory_size, MAX_32), min(directory_offset, MAX_32), 0))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.close()
+
+
+class StreamBuffer(object):
+    """A write only file object that is emptied by the reader."""
+
+    def __init__(self):
+        self.chunks = []
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        return len(data)
+
+    def pop(self):
+        data = b''.join(self.chunks)
+        self.chunks = []
+        return data
+
+
+def get_compress_type(filename):
+    _, extension = os.path.splitext(filename.lower())
+    if extension in STORED_EXTENSIONS:
+        return zipfile.ZIP_STORED
+    return zipfile.ZIP_DEFLATED
+
+
+def stream_zip(files, chunk_size=CHUNK_SIZE):
+    """Generate a zip archive of the given files on the fly.
+
+    `files` is an iterable of (path, name in the archive) tuples.
+
+    The archive data is yielded as soon as it is compressed, so the
+    download starts immediately and only a chunk is ever kept in memory.
+
+    """
+    stream = StreamBuffer()
+    with ZipStreamWriter(stream) as archive:
+        for path, arcname in files:
+            try:
+                stat = os.stat(path)
+                the_file = open(path, 'rb')
+            except OSError:
+                logger.warning('File: {} missing in zip archive'.format(path))
+                continue
+
+            entry = archive.open(
+                arcname,
+                compress_type=get_compress_type(path),
+                timestamp=stat.st_mtime,
+                mode=stat.st_mode,
+                zip64=stat.st_size > zipfile.ZIP64_LIMIT)
+            with the_file, entry:
+                for data in iter(lambda: the_file.read(chunk_size), b''):
+                    entry.write(data)
+                    yield stream.pop()
+            yield stream.pop()
+
+    # The central directory is written when the archive is closed
+    yield stream.pop()
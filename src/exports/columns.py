@@ -0,0 +1,117 @@
+# -*- coding: utf-8 -*-
+
+
+import collections
+
+from documents.loaders import PREFIXES, RevisionLoader
+from documents.models import Document
+from documents.serializers import SOURCES, FIELD, FOREIGN_KEY
+from transmittals.utils import FieldWrapper
+
+
+# How to get a column value
+DB_COLUMN = 'db_column'  # Fetched as is from the db
+RELATED_OBJECT = 'related_object'  # A FK id, replaced by the related object
+COMPUTED = 'computed'  # Requires a revision instance (e.g a property)
+
+
+class ColumnPlan(object):
+    """Fetches exported rows with as few model instances as possible.
+
+    Most exported fields are plain db columns of the revision, the metadata
+    or the document, that can be fetched with a single `values_list` query.
+    Foreign keys are fetched as ids, and related objects are loaded in bulk
+    once per chunk.
+
+    Only the remaining fields (properties, methods…) require to load
+    revision instances.
+
+    """
+    def __init__(self, revision_class, fields):
+        self.revision_class = revision_class
+        serializer = revision_class.get_json_serializer()
+        classes = dict(zip(
+            SOURCES,
+            (revision_class, serializer.metadata_class, Document)))
+
+        self.paths = ['pk']
+        self.columns = []
+        self.computed_fields = []
+        for field in fields:
+            key, source, kind, attname = serializer.compile_field(field)
+            if kind == FIELD or (kind == FOREIGN_KEY and key == attname):
+                index = self.add_path(PREFIXES[source] + attname)
+                self.columns.append((DB_COLUMN, index))
+                continue
+
+            if kind == FOREIGN_KEY:
+                model_field = classes[source]._meta.get_field(key)
+                if model_field.target_field.primary_key:
+                    index = self.add_path(PREFIXES[source] + attname)
+                    related_model = model_field.related_model
+                    self.columns.append((RELATED_OBJECT, (index, related_model)))
+                    continue
+
+            self.computed_fields.append(field)
+            self.columns.append((COMPUTED, field))
+
+        if self.computed_fields:
+            self.loader = RevisionLoader(
+                revision_class, fields=self.computed_fields)
+
+    def add_path(self, path):
+        """Add a column to fetch, and return its index in the fetched rows."""
+        if path not in self.paths:
+            self.paths.append(path)
+        return self.paths.index(path)
+
+    def fetch(self, pks):
+        """Return the rows of values for the revisions with the given pks."""
+        rows = list(self.revision_class.objects
+                    .filter(pk__in=pks)
+                    .values_list(*self.paths))
+        related_objects = self.load_related_objects(rows)
+        if self.computed_fields:
+            revisions = dict(
+                (revision.pk, revision)
+                for revision in self.loader.load(pks))
+        else:
+            revisions = {}
+
+        return [self.build_row(row, related_objects, revisions)
+                for row in rows]
+
+    def load_related_objects(self, rows):
+        """Load all related objects at once, grouped by model."""
+        ids = collections.defaultdict(set)
+        for kind, arg in self.columns:
+            if kind == RELATED_OBJECT:
+                index, model = arg
+                ids[model].update(row[index] for row in rows)
+
+        return dict(
+            (model, model.objects.in_bulk(model_ids - set([None])))
+            for model, model_ids in ids.items())
+
+    def build_row(self, row, related_objects, revisions):
+        values = []
+        wrapper = None
+        for kind, arg in self.columns:
+            if kind == DB_COLUMN:
+                value = row[arg]
+            elif kind == RELATED_OBJECT:
+                index, model = arg
+                value = related_objects[model].get(row[index])
+            else:
+                if wrapper is None:
+                    revision = revisions[row[0]]
+                    wrapper = FieldWrapper((
+                        revision,
+                        revision.metadata,
+                        revision.metadata.document))
+                value = getattr(wrapper, arg, '')
+                # Attributes and method can be passed
+                if isinstance(value, collections.Callable):
+                    value = value()
+            values.append(value)
+        return values
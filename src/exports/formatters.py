@@ -48,7 +48,7 @@ class CSVFormatter(BaseFormatter):
 
     def prepare_data(self, doc):
         if isinstance(doc, list):
-            data = doc
+            data = [self.format_value(value) for value in doc]
         elif isinstance(doc, MetadataRevisionBase):
             doc = FieldWrapper((
                 doc,
@@ -73,6 +73,9 @@ class CSVFormatter(BaseFormatter):
         if isinstance(data, collections.Callable):
             data = data()
 
+        return self.format_value(data)
+
+    def format_value(self, data):
         # We want dd-mm-yyy format for exports whereas
         if type(data) == dt.date:
             data = data.strftime(FR_DATE_FORMAT)
@@ -1,10 +1,49 @@
 # -*- coding: utf-8 -*-
 
 
+import queue
+import threading
+from itertools import islice
+
 from django.conf import settings
+from django.db.models import Q
+from django.contrib.contenttypes.models import ContentType
 
 from accounts.models import Entity
+from audit_trail.models import Activity
+from documents.models import Document
 from search.builder import SearchBuilder
+from exports.columns import ColumnPlan
+
+
+# Values of the first column of incremental exports
+CHANGE_UPDATED = 'updated'
+CHANGE_DELETED = 'deleted'
+
+
+class LazyChunk(object):
+    """A chunk of rows, that are only fetched from the db when read.
+
+    Chunks are read by the pool of threads that formats them (see
+    `exports.utils.format_chunks`), so db queries run in those threads
+    too, instead of the thread consuming the generator.
+
+    """
+    def __init__(self, fetch, pks):
+        self.fetch = fetch
+        self.pks = pks
+        self.rows = None
+
+    def get_rows(self):
+        if self.rows is None:
+            self.rows = self.fetch(self.pks)
+        return self.rows
+
+    def __iter__(self):
+        return iter(self.get_rows())
+
+    def __len__(self):
+        return len(self.get_rows())
 
 
 class ExportGenerator(object):
@@ -15,22 +54,36 @@ class ExportGenerator(object):
 
     Yields data in chunks.
 
+    Document ids are fetched from Elasticsearch in a background thread, and
+    sent by batches through a bounded queue, so the db can be queried while
+    the ES scroll is still running, without keeping all ids in memory.
+
+    If `updated_since` is set, only revisions that were modified since that
+    date are exported, followed by the list of documents deleted in between.
+    Each row then starts with the kind of change.
+
     """
-    def __init__(self, category, filters, fields, owner=None, export_all_revisions=False):
+    def __init__(self, category, filters, fields, owner=None,
+                 export_all_revisions=False, updated_since=None):
         self.category = category
         self.fields = fields
         self.export_all_revisions = export_all_revisions
         self.filters = filters
         self.filters.update({
             'start': 0,
-            'size': 60000})
+            'size': settings.EXPORTS_SCROLL_SIZE})
 
         self.owner = owner
+        self.updated_since = updated_since
 
     def __iter__(self):
-        self.pks, self.total = self.get_es_results()
         self.start = -1
+        self.exhausted = False
         self.chunk_size = settings.EXPORTS_CHUNK_SIZE
+        pks, self.total = self.get_es_results()
+        # Built once, before chunks are read by several threads
+        self.get_column_plan()
+        self.start_pipeline(pks)
         return self
 
     def get_entities(self):
@@ -47,6 +100,9 @@ class ExportGenerator(object):
 
         Only return document ids, since the actual data export will use db.
 
+        Returns a (pks, total) tuple, where `pks` is an iterator over the
+        scroll results, and `total` is the number of hits.
+
         """
 
         # For contractor accessing phase, we have to filter
@@ -56,13 +112,49 @@ class ExportGenerator(object):
             self.category,
             self.filters,
             filter_on_entities=entities)
-        result = builder.scan_results(
+        query = builder.build_query(
             ['pk'],
             only_latest_revisions=not self.export_all_revisions)
-        pks = [doc['pk'][0] for doc in result]
-        total = len(pks)
+        total = query.count()
+        pks = (doc['pk'][0] for doc in query.scan())
         return pks, total
 
+    def start_pipeline(self, pks):
+        """Start fetching batches of ids in the background."""
+        self.queue = queue.Queue(maxsize=settings.EXPORTS_QUEUE_SIZE)
+        self.stopped = threading.Event()
+        self.producer = threading.Thread(
+            target=self.produce_batches, args=(iter(pks),))
+        self.producer.daemon = True
+        self.producer.start()
+
+    def produce_batches(self, pks):
+        try:
+            while True:
+                batch = list(islice(pks, self.chunk_size))
+                if not batch:
+                    break
+                if not self.put_batch(batch):
+                    return
+            self.put_batch(None)
+        except Exception as e:
+            self.put_batch(e)
+
+    def put_batch(self, batch):
+        """Wait for room in the queue, unless the export is stopped."""
+        while not self.stopped.is_set():
+            try:
+                self.queue.put(batch, timeout=1)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+    def close(self):
+        """Stop fetching ids, e.g if the export is interrupted."""
+        if hasattr(self, 'stopped'):
+            self.stopped.set()
+
     def __next__(self):
         return self.next_data_chunk()
 
@@ -77,29 +169,107 @@ class ExportGenerator(object):
             self.start = 0
             return self.data_header()
 
-        if self.start >= self.total:
+        if self.exhausted:
             raise StopIteration()
 
-        chunk = self.get_chunk()
-        self.start += self.chunk_size
+        batch = self.queue.get()
+        if batch is None:
+            self.exhausted = True
+            if self.updated_since is None:
+                raise StopIteration()
+            return self.get_deleted_rows()
+        if isinstance(batch, Exception):
+            raise batch
+
+        chunk = self.get_chunk(batch)
+        self.start += len(batch)
         return chunk
 
     def data_header(self):
         return
 
-    def get_chunk(self):
-        """Get a single piece of data."""
-        Model = self.category.revision_class()
-        pks = self.pks[self.start:self.start + self.chunk_size]
-        qs = Model.objects \
-            .filter(pk__in=pks) \
-            .select_related()
-        return qs
+    def get_chunk(self, pks):
+        """Get a single piece of data, as a lazy list of rows of values."""
+        return LazyChunk(self.fetch_rows, pks)
+
+    def fetch_rows(self, pks):
+        if self.updated_since is None:
+            return self.get_column_plan().fetch(pks)
+
+        rows = self.get_column_plan().fetch(self.get_updated_pks(pks))
+        return [[CHANGE_UPDATED] + row for row in rows]
+
+    def get_updated_pks(self, pks):
+        """Filter out revisions that were not modified since the last export.
+
+        Some changes (e.g a new revision) only touch the document.
+
+        """
+        Revision = self.category.revision_class()
+        return list(Revision.objects
+                    .filter(pk__in=pks)
+                    .filter(Q(updated_on__gt=self.updated_since)
+                            | Q(metadata__document__updated_on__gt=self.updated_since))
+                    .values_list('pk', flat=True))
+
+    def get_deleted_rows(self):
+        """List documents deleted since the last export.
+
+        Deleted documents are only known through the audit trail, that does
+        not tell if they matched the export filters, so the list covers the
+        whole category. To avoid disclosing document numbers, it is not
+        provided to users restricted to some entities.
+
+        """
+        if self.get_entities() is not None:
+            return []
+
+        category_type = ContentType.objects.get_for_model(self.category)
+        # Deletions logged before keys were recorded only have a number
+        deleted = set(Activity.objects
+                      .filter(verb=Activity.VERB_DELETED)
+                      .filter(target_content_type=category_type)
+                      .filter(target_object_id=self.category.pk)
+                      .filter(created_on__gt=self.updated_since)
+                      .values_list('action_object_str', 'action_object_key'))
+
+        # The document could have been created again since
+        existing = list(Document.objects
+                        .filter(category=self.category)
+                        .filter(Q(document_key__in=[
+                            key for number, key in deleted if key])
+                            | Q(document_number__in=[
+                                number for number, key in deleted if not key]))
+                        .values_list('document_number', 'document_key'))
+        existing_numbers = set(number for number, key in existing)
+        existing_keys = set(key for number, key in existing)
+
+        fields = list(self.fields.values())
+        rows = []
+        for number, key in sorted(deleted):
+            if key in existing_keys or \
+                    (not key and number in existing_numbers):
+                continue
+            # Unknown identifiers are left empty
+            identifiers = {'document_number': number, 'document_key': key}
+            rows.append([CHANGE_DELETED] + [
+                identifiers.get(field, '') for field in fields])
+        return rows
+
+    def get_column_plan(self):
+        if not hasattr(self, '_column_plan'):
+            Model = self.category.revision_class()
+            fields = list(self.fields.values())
+            self._column_plan = ColumnPlan(Model, fields)
+        return self._column_plan
 
 
 class CSVGenerator(ExportGenerator):
     def data_header(self):
-        return [list(self.fields.keys())]
+        header = list(self.fields.keys())
+        if self.updated_since is not None:
+            header = ['Change'] + header
+        return [header]
 
 
 class XLSXGenerator(CSVGenerator):
@@ -0,0 +1,82 @@
+# -*- coding: utf-8 -*-
+
+
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from categories.models import Category
+from documents.tests.utils import generate_random_documents
+from exports.columns import ColumnPlan
+from exports.formatters import CSVFormatter
+from exports.models import Export
+
+
+class Command(BaseCommand):
+    help = 'Compare exports using model instances and using a column plan'
+
+    def add_arguments(self, parser):
+        parser.add_argument('category_id', type=int)
+        parser.add_argument(
+            '--generate',
+            type=int, dest='generate', default=0,
+            help='Number of random documents to generate (and discard) '
+                 'before running the benchmark.')
+
+    def handle(self, *args, **options):
+        category = Category.objects \
+            .select_related('organisation', 'category_template') \
+            .get(pk=options['category_id'])
+
+        # Generated documents are rolled back at the end of the benchmark
+        with transaction.atomic():
+            if options['generate']:
+                generate_random_documents(options['generate'], category)
+            self.benchmark(category)
+            transaction.set_rollback(True)
+
+    def benchmark(self, category):
+        Revision = category.revision_class()
+        fields = Export(category=category).get_fields()
+        formatter = CSVFormatter(fields)
+        pks = list(Revision.objects
+                   .filter(metadata__document__category=category)
+                   .values_list('pk', flat=True))
+        chunk_size = settings.EXPORTS_CHUNK_SIZE
+        chunks = [pks[i:i + chunk_size] for i in range(0, len(pks), chunk_size)]
+        self.stdout.write('Exporting {} revisions'.format(len(pks)))
+
+        def instances_export():
+            return [formatter.format(Revision.objects
+                                     .filter(pk__in=chunk)
+                                     .select_related())
+                    for chunk in chunks]
+
+        plan = ColumnPlan(Revision, list(fields.values()))
+
+        def columnar_export():
+            return [formatter.format(plan.fetch(chunk)) for chunk in chunks]
+
+        instances, instances_time = self.run(instances_export)
+        columnar, columnar_time = self.run(columnar_export)
+
+        if sorted(b''.join(instances).splitlines()) != \
+                sorted(b''.join(columnar).splitlines()):
+            self.stderr.write('Exported data differ')
+
+        self.report('Instances', len(pks), instances_time)
+        self.report('Columnar', len(pks), columnar_time)
+        computed = ', '.join(plan.computed_fields) or 'none'
+        self.stdout.write('Computed fields: {}'.format(computed))
+
+    def run(self, func):
+        start = time.time()
+        result = func()
+        return result, time.time() - start
+
+    def report(self, name, nb_rows, duration):
+        rate = nb_rows / duration if duration else 0
+        self.stdout.write('{:10} {:.3f}s ({:.0f} rows/s)'.format(
+            name + ':', duration, rate))
@@ -0,0 +1,58 @@
+# -*- coding: utf-8 -*-
+
+
+import shutil
+import tempfile
+import time
+import tracemalloc
+
+from django.core.management.base import BaseCommand
+from django.test import override_settings
+
+from exports.formatters import XLSXFormatter
+from exports.models import Export
+
+
+class Command(BaseCommand):
+    help = 'Measure the peak memory of xlsx exports for growing sizes'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'sizes',
+            nargs='*', type=int, default=[10000, 100000],
+            help='Numbers of rows to export.')
+
+    def handle(self, *args, **options):
+        tmpdir = tempfile.mkdtemp()
+        try:
+            with override_settings(PRIVATE_ROOT=tmpdir):
+                for nb_rows in options['sizes']:
+                    self.report(nb_rows, *self.run(nb_rows))
+        finally:
+            shutil.rmtree(tmpdir)
+
+    def generate_rows(self, nb_rows, chunk_size=1000):
+        yield [['Document Number', 'Title', 'Status', 'Revision']]
+        for start in range(0, nb_rows, chunk_size):
+            yield [
+                ['FAC09001-FWF-000-HSE-REP-{:06}'.format(i),
+                 'Document title {}'.format(i), 'STD', str(i % 10)]
+                for i in range(start, min(start + chunk_size, nb_rows))]
+
+    def run(self, nb_rows):
+        export = Export(format='xlsx')
+        formatter = XLSXFormatter({})
+        tracemalloc.start()
+        start = time.time()
+        try:
+            export.xlsx_file_writer(self.generate_rows(nb_rows), formatter)
+            duration = time.time() - start
+            _, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+        return duration, peak
+
+    def report(self, nb_rows, duration, peak):
+        rate = nb_rows / duration if duration else 0
+        self.stdout.write('{:>8} rows: {:.3f}s ({:.0f} rows/s), peak memory {:.1f} MB'.format(
+            nb_rows, duration, rate, peak / 1024.0 / 1024.0))
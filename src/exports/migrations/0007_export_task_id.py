@@ -0,0 +1,24 @@
+# -*- coding: utf-8 -*-
+
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('exports', '0006_export_export_all_revisions'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='export',
+            name='task_id',
+            field=models.CharField(default='', help_text='Id of the task processing the export', max_length=50, verbose_name='Task id', blank=True),
+        ),
+        migrations.AlterField(
+            model_name='export',
+            name='status',
+            field=models.CharField(default='new', max_length=30, verbose_name='Status', choices=[('new', 'New'), ('processing', 'Processing'), ('done', 'Done'), ('cancelled', 'Cancelled')]),
+        ),
+    ]
@@ -0,0 +1,19 @@
+# -*- coding: utf-8 -*-
+
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('exports', '0007_export_task_id'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='export',
+            name='compression',
+            field=models.CharField(default='none', help_text='Only used for csv exports.', max_length=5, verbose_name='Compression', choices=[('none', 'None'), ('gzip', 'Gzip'), ('zip', 'Zip')]),
+        ),
+    ]
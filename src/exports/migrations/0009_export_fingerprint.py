@@ -0,0 +1,19 @@
+# -*- coding: utf-8 -*-
+
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('exports', '0008_export_compression'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='export',
+            name='fingerprint',
+            field=models.CharField(default='', help_text='Identical exports share the same fingerprint', max_length=40, verbose_name='Fingerprint', db_index=True, blank=True),
+        ),
+    ]
@@ -0,0 +1,19 @@
+# -*- coding: utf-8 -*-
+
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('exports', '0009_export_fingerprint'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='export',
+            name='changes_since',
+            field=models.DateTimeField(help_text='Only export changes made since this date.', null=True, verbose_name='Changes since', blank=True),
+        ),
+    ]
@@ -0,0 +1,19 @@
+# -*- coding: utf-8 -*-
+
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('exports', '0010_export_changes_since'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='export',
+            name='status',
+            field=models.CharField(default='new', max_length=30, verbose_name='Status', choices=[('new', 'New'), ('processing', 'Processing'), ('done', 'Done'), ('cancelled', 'Cancelled'), ('error', 'Error')]),
+        ),
+    ]
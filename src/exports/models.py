@@ -2,11 +2,18 @@
 
 
 import os
+import gzip
+import json
 import uuid
+import shutil
+import hashlib
 import logging
 from collections import OrderedDict
+from contextlib import contextmanager
 
 from django.db import models
+from django.db.models import Max
+from django.core.serializers.json import DjangoJSONEncoder
 from django.utils.translation import ugettext_lazy as _
 from django.utils import timezone
 from django.utils.module_loading import import_string
@@ -17,12 +24,26 @@ from django.conf import settings
 from model_utils import Choices
 from openpyxl import Workbook
 
+from accounts.models import get_entities
+from documents.models import Document
+from documents.zipstream import ZipStreamWriter
+from search.cache import get_index_generation
+from exports.utils import format_chunks
 from exports.tasks import process_export
 
 
 logger = logging.getLogger(__name__)
 
 
+# Querystring parameters that do not change the exported data
+IGNORED_PARAMETERS = ('start', 'size', 'cursor', 'sort_by', 'facets')
+
+
+class ExportCancelled(Exception):
+    """Raised when the export was cancelled while being processed."""
+    pass
+
+
 class Export(models.Model):
     """Represents a document export request."""
 
@@ -30,8 +51,15 @@ class Export(models.Model):
         ('new', _('New')),
         ('processing', _('Processing')),
         ('done', _('Done')),
+        ('cancelled', _('Cancelled')),
+        ('error', _('Error')),
     )
     FORMATS = Choices('csv', 'pdf', 'xlsx')
+    COMPRESSIONS = Choices(
+        ('none', _('None')),
+        ('gzip', _('Gzip')),
+        ('zip', _('Zip')),
+    )
 
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
     owner = models.ForeignKey(
@@ -54,13 +82,34 @@ class Export(models.Model):
         max_length=5,
         choices=FORMATS,
         default=FORMATS.csv)
+    compression = models.CharField(
+        _('Compression'),
+        max_length=5,
+        choices=COMPRESSIONS,
+        default=COMPRESSIONS.none,
+        help_text=_('Only used for csv exports.'))
     export_all_revisions = models.BooleanField(
         _('Export all revisions'),
         default=False,
         help_text=_('If False, only last revisions are included.'))
+    changes_since = models.DateTimeField(
+        _('Changes since'),
+        null=True, blank=True,
+        help_text=_('Only export changes made since this date.'))
     created_on = models.DateTimeField(
         _('Created on'),
         default=timezone.now)
+    fingerprint = models.CharField(
+        _('Fingerprint'),
+        max_length=40,
+        blank=True, default='',
+        db_index=True,
+        help_text=_('Identical exports share the same fingerprint'))
+    task_id = models.CharField(
+        _('Task id'),
+        max_length=50,
+        blank=True, default='',
+        help_text=_('Id of the task processing the export'))
 
     class Meta:
         app_label = 'exports'
@@ -73,6 +122,52 @@ class Export(models.Model):
     def is_ready(self):
         return self.status == self.STATUSES.done
 
+    def is_pending(self):
+        return self.status in (self.STATUSES.new, self.STATUSES.processing)
+
+    def get_poll_url(self):
+        if not self.task_id:
+            return None
+        return reverse('task_poll', args=[self.task_id])
+
+    def cancel(self):
+        """Ask the export processing task to stop.
+
+        The export task regularly checks the export status, and stops as
+        soon as it notices the export was cancelled.
+
+        """
+        Export.objects \
+            .filter(pk=self.pk) \
+            .filter(status__in=(self.STATUSES.new, self.STATUSES.processing)) \
+            .update(status=self.STATUSES.cancelled)
+        self.refresh_from_db(fields=['status'])
+
+    def is_cancelled(self):
+        return Export.objects \
+            .filter(pk=self.pk) \
+            .filter(status=self.STATUSES.cancelled) \
+            .exists()
+
+    def is_incremental(self):
+        return self.changes_since is not None
+
+    def get_previous_export(self):
+        """Return the last finished export with the same parameters.
+
+        Used as a starting point for incremental exports.
+
+        """
+        return Export.objects \
+            .filter(owner=self.owner) \
+            .filter(category=self.category) \
+            .filter(querystring=self.querystring) \
+            .filter(export_all_revisions=self.export_all_revisions) \
+            .filter(status=self.STATUSES.done) \
+            .exclude(pk=self.pk) \
+            .order_by('-created_on') \
+            .first()
+
     def get_filters(self):
         """Parse querystring and returns a dict."""
         return QueryDict(self.querystring, mutable=True)
@@ -87,19 +182,38 @@ class Export(models.Model):
         fields = getattr(Model.PhaseConfig, 'export_fields', default_fields)
         return fields
 
-    def get_pretty_filename(self):
+    def is_compressed(self):
+        return self.format == self.FORMATS.csv and \
+            self.compression != self.COMPRESSIONS.none
+
+    def get_extension(self):
+        """Return the extension of the exported file."""
+        if not self.is_compressed():
+            return self.format
+        if self.compression == self.COMPRESSIONS.gzip:
+            return '{}.gz'.format(self.format)
+        return 'zip'
+
+    def get_content_type(self):
+        """Return the mime type of compressed exported files."""
+        if self.compression == self.COMPRESSIONS.gzip:
+            return 'application/gzip'
+        return 'application/zip'
+
+    def get_pretty_filename(self, exten=None):
         """Return the filename as it should be downloaded."""
-        return 'export_{time:%Y%m%d-%H%M}_{org}_{cat}.{exten}'.format(
+        return 'export_{time:%Y%m%d-%H%M}_{org}_{cat}{changes}.{exten}'.format(
             time=timezone.localtime(self.created_on),
             org=self.category.organisation.slug,
             cat=self.category.category_template.slug,
-            exten=self.format)
+            changes='_changes' if self.is_incremental() else '',
+            exten=exten or self.get_extension())
 
     def get_filename(self):
         return 'export_{time:%Y%m%d}_{uid}.{exten}'.format(
             time=self.created_on,
             uid=self.id,
-            exten=self.format)
+            exten=self.get_extension())
 
     def get_url(self):
         return os.path.join(
@@ -116,34 +230,162 @@ class Export(models.Model):
             self.get_filedir(),
             self.get_filename())
 
+    def get_fingerprint(self):
+        """Identify exports that would produce the exact same file.
+
+        Two exports are identical if they have the same filters and options,
+        were requested by users seeing the same documents, and if no
+        document of the category was modified or indexed in between.
+
+        """
+        filters = self.get_filters()
+        normalized_filters = sorted(
+            (key, sorted(value for value in values if value))
+            for key, values in filters.lists()
+            if key not in IGNORED_PARAMETERS and any(values))
+
+        owner = self.owner
+        entities = sorted(get_entities(owner)) if owner.is_external else None
+
+        Revision = self.category.revision_class()
+        last_document_update = Document.objects \
+            .filter(category=self.category) \
+            .aggregate(Max('updated_on'))['updated_on__max']
+        last_revision_update = Revision.objects \
+            .filter(metadata__document__category=self.category) \
+            .aggregate(Max('updated_on'))['updated_on__max']
+
+        data = {
+            'category': self.category_id,
+            'filters': normalized_filters,
+            'format': self.format,
+            'compression': self.compression,
+            'export_all_revisions': self.export_all_revisions,
+            'changes_since': self.changes_since,
+            'entities': entities,
+            'index_generation': get_index_generation(
+                self.category.document_type()),
+            'last_document_update': last_document_update,
+            'last_revision_update': last_revision_update,
+        }
+        dump = json.dumps(data, sort_keys=True, cls=DjangoJSONEncoder)
+        return hashlib.sha1(dump.encode('utf-8')).hexdigest()
+
+    def get_identical_export(self):
+        """Return a finished export with the same fingerprint, if any."""
+        exports = Export.objects \
+            .filter(fingerprint=self.fingerprint) \
+            .filter(status=self.STATUSES.done) \
+            .exclude(pk=self.pk) \
+            .order_by('-created_on')
+        for export in exports:
+            if os.path.exists(export.get_filepath()):
+                return export
+        return None
+
+    def reuse_file(self, export):
+        """Use the file of an identical export instead of generating it.
+
+        The file is hard linked, so each export can be deleted independently.
+
+        """
+        source = export.get_filepath()
+        destination = self.get_filepath()
+        try:
+            os.link(source, destination)
+        except OSError:
+            shutil.copyfile(source, destination)
+        logger.info('Export {} reuses the file of export {}'.format(
+            self.id, export.id))
+
     def start_export(self, user_pk=None):
         """Asynchronously starts the export"""
         logger.info('Starting export {}'.format(self.id))
-        process_export.delay(str(self.pk), user_pk=user_pk)
+        result = process_export.delay(str(self.pk), user_pk=user_pk)
+        Export.objects \
+            .filter(pk=self.pk) \
+            .update(task_id=result.id)
+        self.task_id = result.id
 
     def csv_file_writer(self, data_generator, formatter):
         with self.open_file() as the_file:
-            for data_chunk in data_generator:
-                the_file.write(formatter.format(data_chunk))
+            with self.compress(the_file) as stream:
+                for formatted in format_chunks(data_generator, formatter):
+                    stream.write(formatted)
+
+    @contextmanager
+    def compress(self, the_file):
+        """Wraps the export file to compress data on the fly."""
+        if not self.is_compressed():
+            yield the_file
+        elif self.compression == self.COMPRESSIONS.gzip:
+            with gzip.GzipFile(fileobj=the_file, mode='wb') as stream:
+                yield stream
+        else:
+            with ZipStreamWriter(the_file) as archive:
+                name = self.get_pretty_filename(exten=self.format)
+                # The export size is unknown until it is written
+                with archive.open(name, zip64=True) as stream:
+                    yield stream
 
     def xlsx_file_writer(self, data_generator, formatter):
-        wb = Workbook()
-        ws = wb.active
-        for data_chunk in data_generator:
-            formatted = formatter.format(data_chunk)
+        """Stream rows into a write-only workbook.
+
+        Rows of write-only worksheets are flushed to a temporary file as they
+        are appended, so memory usage does not grow with the export size.
+
+        """
+        wb = Workbook(write_only=True)
+        ws = wb.create_sheet()
+        for formatted in format_chunks(data_generator, formatter):
             for el in formatted:
                 ws.append(el)
-        wb.save(self.get_filepath())
 
-    def write_file(self):
-        """Generates and write the file."""
+        with self.open_file() as the_file:
+            wb.save(the_file)
+
+    def write_file(self, progress_callback=None):
+        """Generates and write the file.
+
+        `progress_callback` is called with the progress percentage every
+        time a chunk of data is fetched.
+
+        If the export is cancelled meanwhile, the partial file is removed
+        and `ExportCancelled` is raised.
+
+        """
         data_generator = self.get_data_generator()
         formatter = self.get_data_formatter()
+        chunks = self.monitor(data_generator, progress_callback)
 
         file_writer_name = '{}_file_writer'.format(self.format)
         file_writer = getattr(self, file_writer_name)
-        file_writer(data_generator, formatter)
-        logger.info('Import {} done'.format(self.id))
+        try:
+            file_writer(chunks, formatter)
+        except ExportCancelled:
+            logger.info('Export {} cancelled'.format(self.id))
+            self.delete_file()
+            raise
+        finally:
+            data_generator.close()
+        logger.info('Export {} done'.format(self.id))
+
+    def monitor(self, data_generator, progress_callback=None):
+        """Yield data chunks, while reporting progress and cancellation."""
+        for data_chunk in data_generator:
+            if self.is_cancelled():
+                raise ExportCancelled()
+
+            if progress_callback and data_generator.total:
+                progress = float(data_generator.start) / data_generator.total * 100
+                progress_callback(min(progress, 100.0))
+
+            yield data_chunk
+
+    def delete_file(self):
+        filepath = self.get_filepath()
+        if os.path.exists(filepath):
+            os.remove(filepath)
 
     def open_file(self):
         """Opens the file in which data should be dumped."""
@@ -165,6 +407,7 @@ class Export(models.Model):
             self.get_fields(),
             owner=self.owner,
             export_all_revisions=self.export_all_revisions,
+            updated_since=self.changes_since,
         )
         return generator
 
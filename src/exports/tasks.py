@@ -1,7 +1,10 @@
 # -*- coding: utf-8 -*-
 
 
+import logging
+
 from django.conf import settings
+from celery import current_task
 
 from core.celery import app
 
@@ -10,9 +13,12 @@ from audit_trail.models import Activity
 from audit_trail.signals import activity_log
 
 
+logger = logging.getLogger(__name__)
+
+
 @app.task
 def process_export(export_id, user_pk=None):
-    from exports.models import Export
+    from exports.models import Export, ExportCancelled
     export = Export.objects.select_related().get(id=export_id)
 
     # Cleanup oldest export when there are too many
@@ -30,11 +36,52 @@ def process_export(export_id, user_pk=None):
             .filter(created_on__lt=oldest_export.created_on) \
             .delete()
     user = User.objects.get(pk=user_pk)
-    export.status = 'processing'
-    export.save()
-    export.write_file()
-    export.status = 'done'
-    export.save()
+
+    # The export could have been cancelled while waiting in the queue
+    started = Export.objects \
+        .filter(pk=export.pk) \
+        .exclude(status=Export.STATUSES.cancelled) \
+        .update(status=Export.STATUSES.processing)
+    if not started:
+        return
+
+    def report_progress(progress):
+        current_task.update_state(
+            state='PROGRESS',
+            meta={'progress': progress})
+
+    # Reuse the result of an identical export if there is one
+    export.fingerprint = export.get_fingerprint()
+    export.save(update_fields=['fingerprint'])
+    identical_export = export.get_identical_export()
+
+    try:
+        if identical_export:
+            export.reuse_file(identical_export)
+        else:
+            export.write_file(progress_callback=report_progress)
+    except ExportCancelled:
+        return
+    except Exception:
+        # The export must not be left pending forever
+        logger.exception('Export {} failed'.format(export.id))
+        export.delete_file()
+        Export.objects \
+            .filter(pk=export.pk) \
+            .update(status=Export.STATUSES.error)
+        raise
+
+    # The export could have been cancelled after the last chunk was written
+    done = Export.objects \
+        .filter(pk=export.pk) \
+        .filter(status=Export.STATUSES.processing) \
+        .update(status=Export.STATUSES.done)
+    if not done:
+        logger.info('Export {} cancelled'.format(export.id))
+        export.delete_file()
+        return
+
+    export.status = Export.STATUSES.done
     activity_log.send(verb=Activity.VERB_CREATED,
                       action_object_str=export.get_pretty_filename(),
                       sender=None,
@@ -0,0 +1,59 @@
+# -*- coding: utf-8 -*-
+
+
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.contrib.contenttypes.models import ContentType
+
+from accounts.factories import UserFactory
+from documents.factories import DocumentFactory
+from categories.factories import CategoryFactory
+from default_documents.factories import (
+    ContractorDeliverableFactory, ContractorDeliverableRevisionFactory)
+from default_documents.models import (
+    ContractorDeliverable, ContractorDeliverableRevision)
+from exports.columns import ColumnPlan, DB_COLUMN, RELATED_OBJECT, COMPUTED
+from exports.formatters import CSVFormatter
+
+
+class ColumnPlanTests(TestCase):
+    def setUp(self):
+        Model = ContentType.objects.get_for_model(ContractorDeliverable)
+        self.category = CategoryFactory(category_template__metadata_model=Model)
+        leader = UserFactory(name='Grand Schtroumpf')
+        self.docs = [
+            DocumentFactory(
+                metadata_factory_class=ContractorDeliverableFactory,
+                revision_factory_class=ContractorDeliverableRevisionFactory,
+                category=self.category,
+                revision={'leader': leader})
+            for i in range(1, 10)]
+        self.revisions = [doc.get_latest_revision() for doc in self.docs]
+        self.fields = ContractorDeliverable.PhaseConfig.export_fields
+        self.plan = ColumnPlan(
+            ContractorDeliverableRevision, list(self.fields.values()))
+
+    def test_column_kinds(self):
+        kinds = dict(zip(
+            self.fields.values(),
+            (kind for kind, arg in self.plan.columns)))
+        self.assertEqual(kinds['document_number'], DB_COLUMN)
+        self.assertEqual(kinds['leader'], RELATED_OBJECT)
+        self.assertEqual(kinds['revision_name'], COMPUTED)
+
+    def test_rows_match_model_instances_output(self):
+        formatter = CSVFormatter(self.fields)
+        pks = [revision.pk for revision in self.revisions]
+        rows = sorted(formatter.format(self.plan.fetch(pks)).splitlines())
+        expected = sorted(formatter.format(self.revisions).splitlines())
+        self.assertEqual(rows, expected)
+
+    def test_constant_number_of_queries(self):
+        pks = [revision.pk for revision in self.revisions]
+        with CaptureQueriesContext(connection) as small:
+            self.plan.fetch(pks[:2])
+        with CaptureQueriesContext(connection) as large:
+            self.plan.fetch(pks)
+        self.assertEqual(
+            len(small.captured_queries), len(large.captured_queries))
@@ -1,19 +1,28 @@
 # -*- coding: utf-8 -*-
 
 
+import itertools
 from collections import OrderedDict
 
+from datetime import timedelta
+
 from django.test import TestCase, override_settings
 from django.contrib.contenttypes.models import ContentType
+from django.utils import timezone
 
 from mock import MagicMock
 
+from accounts.factories import UserFactory
+from audit_trail.models import Activity
+from audit_trail.signals import activity_log
+from documents.models import Document
 from documents.factories import DocumentFactory
 from categories.factories import CategoryFactory
 from default_documents.factories import (
     ContractorDeliverableFactory, ContractorDeliverableRevisionFactory)
 from default_documents.models import ContractorDeliverable
-from exports.generators import ExportGenerator, CSVGenerator
+from exports.generators import (
+    ExportGenerator, CSVGenerator, CHANGE_UPDATED, CHANGE_DELETED)
 
 
 class ExportGeneratorTests(TestCase):
@@ -40,20 +49,32 @@ class ExportGeneratorTests(TestCase):
         chunk = next(iterator)  # header
 
         chunk = next(iterator)
-        self.assertEqual(chunk.count(), 5)
+        self.assertEqual(len(chunk), 5)
 
         chunk = next(iterator)
-        self.assertEqual(chunk.count(), 5)
+        self.assertEqual(len(chunk), 5)
 
         chunk = next(iterator)
-        self.assertEqual(chunk.count(), 5)
+        self.assertEqual(len(chunk), 5)
 
         chunk = next(iterator)
-        self.assertEqual(chunk.count(), 4)
+        self.assertEqual(len(chunk), 4)
 
         with self.assertRaises(StopIteration):
             chunk = next(iterator)
 
+    @override_settings(EXPORTS_CHUNK_SIZE=5)
+    def test_rows_are_fetched_when_read(self):
+        generator = ExportGenerator(self.category, {}, {})
+        generator.get_es_results = self.es_mock
+        iterator = iter(generator)
+        next(iterator)  # header
+
+        # The db is queried by the threads formatting the chunks
+        with self.assertNumQueries(0):
+            chunk = next(iterator)
+        self.assertEqual(len(list(chunk)), 5)
+
     def test_csv_generator_header(self):
         fields = OrderedDict((
             ('Title', 'title'),
@@ -63,3 +84,170 @@ class ExportGeneratorTests(TestCase):
         iterator = iter(generator)
         chunk = next(iterator)
         self.assertEqual(chunk, [['Title', 'Document number']])
+
+    def test_es_errors_are_raised(self):
+        def failing_pks():
+            yield 1
+            raise RuntimeError('Elasticsearch is down')
+
+        generator = ExportGenerator(self.category, {}, {})
+        generator.get_es_results = MagicMock(return_value=(failing_pks(), 1))
+        iterator = iter(generator)
+        next(iterator)  # header
+
+        with self.assertRaises(RuntimeError):
+            next(iterator)
+
+    @override_settings(EXPORTS_CHUNK_SIZE=5, EXPORTS_QUEUE_SIZE=1)
+    def test_closed_generator_stops_fetching_ids(self):
+        generator = ExportGenerator(self.category, {}, {})
+        generator.get_es_results = MagicMock(
+            return_value=(itertools.count(1), 0))
+        iterator = iter(generator)
+        next(iterator)  # header
+        next(iterator)
+
+        generator.close()
+        generator.producer.join(5)
+        self.assertFalse(generator.producer.is_alive())
+
+
+class IncrementalExportGeneratorTests(TestCase):
+    def setUp(self):
+        Model = ContentType.objects.get_for_model(ContractorDeliverable)
+        self.category = CategoryFactory(category_template__metadata_model=Model)
+        self.user = UserFactory(
+            email='testadmin@phase.fr',
+            password='pass',
+            is_superuser=True,
+            category=self.category)
+        self.docs = [
+            DocumentFactory(
+                metadata_factory_class=ContractorDeliverableFactory,
+                revision_factory_class=ContractorDeliverableRevisionFactory,
+                category=self.category)
+            for i in range(0, 4)]
+        self.fields = OrderedDict((
+            ('Document number', 'document_number'),
+            ('Title', 'title')))
+        self.since = timezone.now() - timedelta(days=1)
+
+        # Only the first document changed since the last export
+        Document.objects \
+            .filter(pk__in=[doc.pk for doc in self.docs]) \
+            .update(updated_on=self.since - timedelta(days=1))
+        Revision = self.category.revision_class()
+        Revision.objects \
+            .filter(metadata__document__in=self.docs) \
+            .update(updated_on=self.since - timedelta(days=1))
+        Revision.objects \
+            .filter(pk=self.docs[0].latest_revision.pk) \
+            .update(updated_on=timezone.now())
+
+    def get_rows(self, generator):
+        generator.get_es_results = MagicMock(return_value=(
+            [doc.latest_revision.pk for doc in self.docs],
+            len(self.docs)))
+        return list(itertools.chain(*list(generator)))
+
+    def test_only_changes_are_exported(self):
+        generator = CSVGenerator(
+            self.category, {}, self.fields, owner=self.user,
+            updated_since=self.since)
+        rows = self.get_rows(generator)
+        self.assertEqual(rows, [
+            ['Change', 'Document number', 'Title'],
+            [CHANGE_UPDATED, self.docs[0].document_number,
+             self.docs[0].latest_revision.metadata.title],
+        ])
+
+    def delete_document(self, log_key=True):
+        """Delete a document like `DocumentDelete` does."""
+        document = self.docs.pop()
+        # Keys and numbers are distinct identifiers
+        document.document_number = 'Number {}'.format(document.pk)
+        Document.objects \
+            .filter(pk=document.pk) \
+            .update(document_number=document.document_number)
+        document.delete()
+        activity_log.send(verb=Activity.VERB_DELETED,
+                          target=self.category,
+                          action_object_str=document.document_number,
+                          action_object_key=document.document_key
+                          if log_key else None,
+                          sender=None,
+                          actor=self.user)
+        return document
+
+    def test_deleted_documents_are_listed(self):
+        document = self.delete_document()
+
+        generator = CSVGenerator(
+            self.category, {}, self.fields, owner=self.user,
+            updated_since=self.since)
+        rows = self.get_rows(generator)
+        self.assertEqual(
+            rows[-1], [CHANGE_DELETED, document.document_number, ''])
+
+    def test_deleted_documents_with_default_fields(self):
+        document = self.delete_document()
+
+        # Default export fields use the document key
+        fields = OrderedDict((
+            ('Document Number', 'document_key'),
+            ('Title', 'title')))
+        generator = CSVGenerator(
+            self.category, {}, fields, owner=self.user,
+            updated_since=self.since)
+        rows = self.get_rows(generator)
+        self.assertEqual(rows[0], ['Change', 'Document Number', 'Title'])
+        self.assertEqual(
+            rows[-1], [CHANGE_DELETED, document.document_key, ''])
+
+    def test_deleted_documents_identifiers_have_their_own_columns(self):
+        document = self.delete_document()
+
+        fields = OrderedDict((
+            ('Document key', 'document_key'),
+            ('Document number', 'document_number')))
+        generator = CSVGenerator(
+            self.category, {}, fields, owner=self.user,
+            updated_since=self.since)
+        rows = self.get_rows(generator)
+        self.assertEqual(rows[-1], [
+            CHANGE_DELETED, document.document_key, document.document_number])
+
+    def test_unknown_key_of_deleted_documents_is_left_empty(self):
+        # Deletions logged before keys were recorded
+        document = self.delete_document(log_key=False)
+
+        fields = OrderedDict((
+            ('Document key', 'document_key'),
+            ('Document number', 'document_number')))
+        generator = CSVGenerator(
+            self.category, {}, fields, owner=self.user,
+            updated_since=self.since)
+        rows = self.get_rows(generator)
+        self.assertEqual(
+            rows[-1], [CHANGE_DELETED, '', document.document_number])
+
+    def test_recreated_documents_are_not_listed(self):
+        document = self.delete_document()
+        DocumentFactory(
+            document_key=document.document_key,
+            metadata_factory_class=ContractorDeliverableFactory,
+            revision_factory_class=ContractorDeliverableRevisionFactory,
+            category=self.category)
+
+        generator = CSVGenerator(
+            self.category, {}, self.fields, owner=self.user,
+            updated_since=self.since)
+        rows = self.get_rows(generator)
+        self.assertNotIn(CHANGE_DELETED, [row[0] for row in rows])
+
+    def test_full_export(self):
+        generator = CSVGenerator(
+            self.category, {}, self.fields, owner=self.user)
+        rows = self.get_rows(generator)
+        self.assertEqual(len(rows), 5)
+        self.assertEqual(rows[0], ['Document number', 'Title'])
@@ -2,16 +2,26 @@
 
 
 import datetime
+import gzip
+import os
+import shutil
+import tempfile
+import zipfile
 from uuid import UUID
 
-from django.test import TestCase
+from django.test import SimpleTestCase, TestCase, override_settings
 from django.utils.timezone import utc
 
+from mock import patch
+from openpyxl import Workbook, load_workbook
+
 from categories.factories import CategoryFactory
 from accounts.factories import UserFactory
 from exports.factories import ExportFactory
 from exports.generators import ExportGenerator
-from exports.formatters import CSVFormatter
+from exports.formatters import CSVFormatter, XLSXFormatter
+from exports.models import Export, ExportCancelled
+from exports.tasks import process_export
 
 
 class ExportTests(TestCase):
@@ -40,6 +50,22 @@ class ExportTests(TestCase):
             filename,
             'export_20150101_12345678-1234-5678-1234-567812345678.csv')
 
+    def test_get_compressed_filename(self):
+        uuid = UUID('12345678-1234-5678-1234-567812345678')
+        date = datetime.datetime(2015, 1, 1, tzinfo=utc)
+        export = self.create_export(id=uuid, created_on=date,
+                                    compression='gzip')
+        self.assertEqual(
+            export.get_filename(),
+            'export_20150101_12345678-1234-5678-1234-567812345678.csv.gz')
+
+        export.compression = 'zip'
+        self.assertTrue(export.get_filename().endswith('.zip'))
+
+        # Only csv exports can be compressed
+        export.format = 'xlsx'
+        self.assertTrue(export.get_filename().endswith('.xlsx'))
+
     def test_get_data_generator(self):
         export = self.create_export()
         generator = export.get_data_generator()
@@ -57,3 +83,196 @@ class ExportTests(TestCase):
         self.assertEqual(filters['toto'], 'riri')
         self.assertEqual(filters['tata'], 'fifi')
         self.assertEqual(filters['tutu'], 'loulou')
+
+
+class XLSXWriterTests(SimpleTestCase):
+    """See the `benchmark_xlsx_export` command for memory usage."""
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def generate_rows(self, nb_rows, chunk_size=100):
+        yield [['Document Number', 'Title']]
+        for start in range(0, nb_rows, chunk_size):
+            yield [
+                ['FAC09001-FWF-000-HSE-REP-{:06}'.format(i),
+                 'Document title {}'.format(i)]
+                for i in range(start, start + chunk_size)]
+
+    def test_rows_are_streamed_in_a_write_only_workbook(self):
+        export = Export(format='xlsx')
+        formatter = XLSXFormatter({})
+        with override_settings(PRIVATE_ROOT=self.tmpdir):
+            with patch('exports.models.Workbook',
+                       side_effect=Workbook) as workbook_mock:
+                export.xlsx_file_writer(self.generate_rows(500), formatter)
+            with open(export.get_filepath(), 'rb') as f:
+                sheet = load_workbook(f, read_only=True).active
+                rows = [[cell.value for cell in row]
+                        for row in sheet.iter_rows()]
+
+        workbook_mock.assert_called_once_with(write_only=True)
+        self.assertEqual(len(rows), 501)
+        self.assertEqual(
+            rows[-1], ['FAC09001-FWF-000-HSE-REP-000499', 'Document title 499'])
+
+
+class FakeGenerator(object):
+    """Yields a header and a few chunks of rows, like `ExportGenerator`."""
+
+    def __init__(self, nb_chunks=4, chunk_size=10):
+        self.chunks = [[['key-{}'.format(i), 'title']
+                        for i in range(chunk_size)]
+                       for _ in range(nb_chunks)]
+        self.total = nb_chunks * chunk_size
+        self.closed = False
+
+    def __iter__(self):
+        self.start = 0
+        yield [['Document Number', 'Title']]
+        for chunk in self.chunks:
+            self.start += len(chunk)
+            yield chunk
+
+    def close(self):
+        self.closed = True
+
+
+@override_settings(PRIVATE_ROOT='/tmp/phase_media/phase_test_private/')
+class ExportWriterTests(TestCase):
+    def setUp(self):
+        self.category = CategoryFactory()
+        self.user = UserFactory(
+            email='testadmin@phase.fr',
+            password='pass',
+            is_superuser=True,
+            category=self.category)
+        self.generator = FakeGenerator()
+        patcher = patch.object(
+            Export, 'get_data_generator', return_value=self.generator)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def create_export(self):
+        return ExportFactory(owner=self.user, category=self.category)
+
+    def test_progress_is_reported(self):
+        export = self.create_export()
+        progress = []
+        export.write_file(progress_callback=progress.append)
+        self.assertEqual(progress, [0.0, 25.0, 50.0, 75.0, 100.0])
+        self.assertTrue(self.generator.closed)
+        self.assertTrue(os.path.exists(export.get_filepath()))
+
+    def test_cancelled_export_removes_file(self):
+        export = self.create_export()
+        export.cancel()
+        with self.assertRaises(ExportCancelled):
+            export.write_file()
+        self.assertTrue(self.generator.closed)
+        self.assertFalse(os.path.exists(export.get_filepath()))
+
+    def test_gzip_compression(self):
+        export = ExportFactory(owner=self.user, category=self.category,
+                               compression='gzip')
+        export.write_file()
+        with gzip.open(export.get_filepath(), 'rb') as f:
+            lines = f.read().splitlines()
+        self.assertEqual(lines[0], b'Document Number;Title')
+        self.assertEqual(len(lines), self.generator.total + 1)
+
+    def test_zip_compression(self):
+        export = ExportFactory(owner=self.user, category=self.category,
+                               compression='zip')
+        export.write_file()
+        with zipfile.ZipFile(export.get_filepath()) as archive:
+            name, = archive.namelist()
+            self.assertTrue(name.endswith('.csv'))
+            lines = archive.read(name).splitlines()
+        self.assertEqual(lines[0], b'Document Number;Title')
+        self.assertEqual(len(lines), self.generator.total + 1)
+
+
+class ExportFingerprintTests(TestCase):
+    def setUp(self):
+        self.category = CategoryFactory()
+        self.user = UserFactory(
+            email='testadmin@phase.fr',
+            password='pass',
+            is_superuser=True,
+            category=self.category)
+
+    def create_export(self, **kwargs):
+        data = {
+            'owner': self.user,
+            'category': self.category}
+        data.update(kwargs)
+        return ExportFactory(**data)
+
+    def test_equivalent_querystrings(self):
+        export1 = self.create_export(querystring='status=STD&leader=1&title=')
+        export2 = self.create_export(querystring='leader=1&status=STD&size=50')
+        export3 = self.create_export(querystring='leader=2&status=STD')
+        self.assertEqual(export1.get_fingerprint(), export2.get_fingerprint())
+        self.assertNotEqual(export1.get_fingerprint(), export3.get_fingerprint())
+
+    def test_options_change_the_fingerprint(self):
+        export1 = self.create_export()
+        export2 = self.create_export(export_all_revisions=True)
+        export3 = self.create_export(format='xlsx')
+        fingerprints = set(export.get_fingerprint()
+                           for export in (export1, export2, export3))
+        self.assertEqual(len(fingerprints), 3)
+
+    @override_settings(PRIVATE_ROOT='/tmp/phase_media/phase_test_private/')
+    @patch.object(Export, 'write_file')
+    def test_identical_export_file_is_reused(self, write_mock):
+        export1 = self.create_export()
+        export1.fingerprint = export1.get_fingerprint()
+        export1.status = Export.STATUSES.done
+        export1.save()
+        with export1.open_file() as the_file:
+            the_file.write(b'Document Number;Title\n')
+        self.addCleanup(export1.delete_file)
+
+        export2 = self.create_export()
+        self.addCleanup(export2.delete_file)
+        process_export(str(export2.pk), user_pk=self.user.pk)
+
+        self.assertFalse(write_mock.called)
+        export2.refresh_from_db()
+        self.assertEqual(export2.status, Export.STATUSES.done)
+        self.assertTrue(os.path.samefile(
+            export1.get_filepath(), export2.get_filepath()))
+
+    @override_settings(PRIVATE_ROOT='/tmp/phase_media/phase_test_private/')
+    @patch.object(Export, 'write_file', side_effect=ValueError('Boom'))
+    def test_failed_export_is_not_left_pending(self, write_mock):
+        export = self.create_export()
+        with self.assertRaises(ValueError):
+            process_export(str(export.pk), user_pk=self.user.pk)
+
+        export.refresh_from_db()
+        self.assertEqual(export.status, Export.STATUSES.error)
+        self.assertFalse(export.is_pending())
+
+    @override_settings(PRIVATE_ROOT='/tmp/phase_media/phase_test_private/')
+    def test_late_cancellation_is_not_overwritten(self):
+        export = self.create_export()
+        self.addCleanup(export.delete_file)
+
+        # Cancelled once all the chunks were written
+        def write_file(progress_callback=None):
+            with export.open_file() as the_file:
+                the_file.write(b'data')
+            export.cancel()
+
+        with patch.object(Export, 'write_file', side_effect=write_file):
+            process_export(str(export.pk), user_pk=self.user.pk)
+
+        export.refresh_from_db()
+        self.assertEqual(export.status, Export.STATUSES.cancelled)
+        self.assertFalse(os.path.exists(export.get_filepath()))
@@ -0,0 +1,33 @@
+# -*- coding: utf-8 -*-
+
+
+import random
+import time
+
+from django.test import SimpleTestCase
+
+from exports.utils import format_chunks
+
+
+class SlowFormatter(object):
+    """Takes a random time to format chunks, so they finish out of order."""
+
+    def format(self, chunk):
+        time.sleep(random.random() / 100)
+        return b''.join(str(i).encode() for i in chunk)
+
+
+class FormatChunksTests(SimpleTestCase):
+    def setUp(self):
+        self.chunks = [list(range(i, i + 5)) for i in range(0, 100, 5)]
+        self.expected = [SlowFormatter().format(c) for c in self.chunks]
+
+    def test_sequential_formatting(self):
+        formatted = list(format_chunks(
+            iter(self.chunks), SlowFormatter(), workers=1))
+        self.assertEqual(formatted, self.expected)
+
+    def test_parallel_formatting_keeps_order(self):
+        formatted = list(format_chunks(
+            iter(self.chunks), SlowFormatter(), workers=4))
+        self.assertEqual(formatted, self.expected)
@@ -7,6 +7,8 @@ from django.test import TestCase
 from django.core.urlresolvers import reverse
 from django.utils import timezone
 
+from mock import patch
+
 from categories.factories import CategoryFactory
 from accounts.factories import UserFactory
 from exports.factories import ExportFactory
@@ -41,3 +43,84 @@ class ExportCreateTests(TestCase):
         self.client.post(self.url)
 
         self.assertEqual(Export.objects.all().count(), 20)
+
+    @patch('exports.models.Export.start_export')
+    def test_export_changes_since_previous_export(self, start_mock):
+        previous_export = ExportFactory(
+            owner=self.user,
+            category=self.category,
+            querystring='status=STD',
+            status=Export.STATUSES.done,
+            created_on=timezone.now() - timedelta(days=1))
+        ExportFactory(
+            owner=self.user,
+            category=self.category,
+            querystring='status=IDC',
+            status=Export.STATUSES.done)
+
+        self.client.post(self.url, {'status': 'STD', 'mode': 'changes'})
+        export = Export.objects.latest('created_on')
+        self.assertEqual(export.querystring, 'status=STD')
+        self.assertEqual(export.changes_since, previous_export.created_on)
+
+    @patch('exports.models.Export.start_export')
+    def test_export_changes_without_previous_export(self, start_mock):
+        self.client.post(self.url, {'status': 'STD', 'mode': 'changes'})
+        export = Export.objects.get()
+        self.assertIsNone(export.changes_since)
+
+
+class ExportCancelTests(TestCase):
+    def setUp(self):
+        self.category = CategoryFactory()
+        self.user = UserFactory(
+            email='testadmin@phase.fr',
+            password='pass',
+            is_superuser=True,
+            category=self.category)
+        self.client.login(email=self.user.email, password='pass')
+
+    def test_cancel_pending_export(self):
+        export = ExportFactory(owner=self.user, category=self.category)
+        url = reverse('export_cancel', args=[export.id])
+        res = self.client.post(url)
+        self.assertRedirects(res, reverse('export_list'))
+
+        export.refresh_from_db()
+        self.assertEqual(export.status, Export.STATUSES.cancelled)
+
+    def test_cannot_cancel_finished_export(self):
+        export = ExportFactory(
+            owner=self.user, category=self.category,
+            status=Export.STATUSES.done)
+        url = reverse('export_cancel', args=[export.id])
+        self.client.post(url)
+
+        export.refresh_from_db()
+        self.assertEqual(export.status, Export.STATUSES.done)
+
+
+class DownloadViewTests(TestCase):
+    def setUp(self):
+        self.category = CategoryFactory()
+        self.user = UserFactory(
+            email='testadmin@phase.fr',
+            password='pass',
+            is_superuser=True,
+            category=self.category)
+        self.client.login(email=self.user.email, password='pass')
+
+    def test_download_compressed_export(self):
+        export = ExportFactory(
+            owner=self.user, category=self.category,
+            status=Export.STATUSES.done, compression='gzip')
+        with export.open_file() as the_file:
+            with export.compress(the_file) as stream:
+                stream.write(b'Document Number;Title\n')
+        self.addCleanup(export.delete_file)
+
+        res = self.client.get(export.get_absolute_url())
+        self.assertEqual(res['Content-Type'], 'application/gzip')
+        self.assertFalse(res.has_header('Content-Encoding'))
+        self.assertTrue(
+            res['Content-Disposition'].endswith('.csv.gz'))
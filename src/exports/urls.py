@@ -3,7 +3,8 @@
 
 from django.conf.urls import url
 
-from exports.views import ExportCreate, ExportList, DownloadView
+from exports.views import (
+    ExportCreate, ExportList, ExportCancel, DownloadView)
 
 
 urlpatterns = [
@@ -16,5 +17,8 @@ urlpatterns = [
         name="export_create"),
     url(r'^(?P<uid>[-\w]+)/$',
         DownloadView.as_view(),
-        name='export_download')
+        name='export_download'),
+    url(r'^(?P<uid>[-\w]+)/cancel/$',
+        ExportCancel.as_view(),
+        name='export_cancel'),
 ]
@@ -0,0 +1,46 @@
+# -*- coding: utf-8 -*-
+
+
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.db import connection
+
+
+def format_chunk(formatter, chunk):
+    """Format a chunk of data in a worker thread."""
+    try:
+        return formatter.format(chunk)
+    finally:
+        # Every thread opens its own db connection
+        connection.close()
+
+
+def format_chunks(data_generator, formatter, workers=None):
+    """Format data chunks concurrently, and yield them in the original order.
+
+    Fetching revisions from the db and formatting them takes most of the
+    export time, so several chunks are processed at once by a pool of
+    threads. At most `2 * workers` chunks are pending at the same time,
+    so memory usage stays bounded.
+
+    """
+    if workers is None:
+        workers = settings.EXPORTS_WORKERS
+
+    if workers <= 1:
+        for data_chunk in data_generator:
+            yield formatter.format(data_chunk)
+        return
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        pending = deque()
+        for data_chunk in data_generator:
+            pending.append(
+                executor.submit(format_chunk, formatter, data_chunk))
+            if len(pending) >= workers * 2:
+                yield pending.popleft().result()
+
+        while pending:
+            yield pending.popleft().result()
@@ -6,7 +6,8 @@ import os
 from django.views.generic import ListView, UpdateView, View
 from django.utils.translation import ugettext_lazy as _
 from django.core.urlresolvers import reverse
-from django.http import HttpResponse, Http404
+from django.http import (
+    HttpResponse, HttpResponseRedirect, FileResponse, Http404)
 from django.views.static import serve
 from django.shortcuts import get_object_or_404
 from django.conf import settings
@@ -43,6 +44,9 @@ class ExportCreate(LoginRequiredMixin, DocumentListMixin, UpdateView):
         qd.pop('sort_by', None)
         qd.pop('format', None)
         qd.pop('revisions', None)
+        qd.pop('compression', None)
+        qd.pop('cursor', None)
+        qd.pop('mode', None)
         kwargs = super(ExportCreate, self).get_form_kwargs()
         kwargs.update({'data': {
             'querystring': qd.urlencode()
@@ -54,10 +58,14 @@ class ExportCreate(LoginRequiredMixin, DocumentListMixin, UpdateView):
         # export_format = 'xlsx' if 'xlsx_format' in self.request.POST.keys() else 'csv'
         export_format = self.request.POST.get('format', 'csv')
         all_revisions = self.request.POST.get('revisions', 'latest') == 'all'
+        compression = self.request.POST.get('compression', 'none')
+        if compression not in Export.COMPRESSIONS:
+            compression = Export.COMPRESSIONS.none
         export = Export(
             owner=self.request.user,
             category=self.category,
             format=export_format,
+            compression=compression,
             export_all_revisions=all_revisions)
         return export
 
@@ -65,6 +73,12 @@ class ExportCreate(LoginRequiredMixin, DocumentListMixin, UpdateView):
         return self.category.get_absolute_url()
 
     def form_valid(self, form):
+        # Only export what changed since the previous identical export
+        if self.request.POST.get('mode') == 'changes':
+            previous_export = form.instance.get_previous_export()
+            if previous_export:
+                form.instance.changes_since = previous_export.created_on
+
         return_value = super(ExportCreate, self).form_valid(form)
         self.object.start_export(user_pk=self.request.user.pk)
 
@@ -87,6 +101,17 @@ class ExportList(LoginRequiredMixin, ListView):
             .order_by('-created_on')
 
 
+class ExportCancel(LoginRequiredMixin, View):
+    """Cancel an export that is still being processed."""
+    http_method_names = ['post']
+
+    def post(self, request, *args, **kwargs):
+        qs = Export.objects.filter(owner=self.request.user)
+        export = get_object_or_404(qs, id=kwargs.get('uid'))
+        export.cancel()
+        return HttpResponseRedirect(reverse('export_list'))
+
+
 class DownloadView(LoginRequiredMixin, View):
     def get(self, request, *args, **kwargs):
         uid = kwargs.get('uid')
@@ -101,9 +126,23 @@ class DownloadView(LoginRequiredMixin, View):
         filename = export.get_pretty_filename()
         if settings.USE_X_SENDFILE:
             url = '{}{}'.format(settings.PRIVATE_X_ACCEL_PREFIX, url)
-            response = HttpResponse(content_type='application/force-download')
+            if export.is_compressed():
+                content_type = export.get_content_type()
+            else:
+                content_type = 'application/force-download'
+            response = HttpResponse(content_type=content_type)
             response['Content-Disposition'] = 'attachment; filename=%s' % filename
             response['X-Accel-Redirect'] = url
             return response
+        elif export.is_compressed():
+            # The static `serve` view would send gzip files with a
+            # "Content-Encoding: gzip" header, and the browser would
+            # silently uncompress them.
+            response = FileResponse(
+                open(filepath, 'rb'),
+                content_type=export.get_content_type())
+            response['Content-Disposition'] = 'attachment; filename=%s' % filename
+            response['Content-Length'] = os.path.getsize(filepath)
+            return response
         else:
             return serve(request, url, settings.PRIVATE_ROOT)
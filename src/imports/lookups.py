@@ -0,0 +1,187 @@
+# -*- coding: utf-8 -*-
+
+
+from django.apps import apps
+from django.core.exceptions import ObjectDoesNotExist, ValidationError
+
+
+def parse_revision(revision_num):
+    try:
+        return int(revision_num)
+    except (TypeError, ValueError):
+        return None
+
+
+class ForeignKeyCache(object):
+    """Memoized resolution of foreign key columns.
+
+    A file usually refers to a few dozen distinct related objects (e.g
+    originators or units) across thousands of lines, so resolved values
+    are kept for the whole import batch. Before a chunk is imported, the
+    values that were not seen yet are fetched with a single query per
+    column.
+
+    Unknown values are memoized too.
+
+    """
+    def __init__(self, import_fields):
+        self.fields = []
+        for field_name, field_config in (import_fields or {}).items():
+            model_str = field_config.get('model', False)
+            lookup_field = field_config.get('lookup_field', False)
+            if model_str and lookup_field:
+                model = apps.get_model(model_str)
+                self.fields.append((field_name, model, lookup_field))
+
+        self.cache = dict((field[0], {}) for field in self.fields)
+        self.lookups = 0
+        self.misses = 0
+
+    @property
+    def hits(self):
+        return self.lookups - self.misses
+
+    def prewarm(self, rows):
+        """Fetch all the unknown values of the given rows at once."""
+        for field_name, model, lookup_field in self.fields:
+            cache = self.cache[field_name]
+            values = set(row.get(field_name) for row in rows)
+            values -= set([None, ''])
+            values = set(
+                value for value in values if str(value) not in cache)
+            if not values:
+                continue
+
+            resolved = self.resolve(model, lookup_field, values)
+            for value in values:
+                cache[str(value)] = resolved.get(str(value))
+            self.misses += len(values)
+
+    def resolve(self, model, lookup_field, values):
+        """Return a dict of object pks indexed by lookup value."""
+        try:
+            qs = model.objects \
+                .filter(**{'{}__in'.format(lookup_field): values}) \
+                .values_list(lookup_field, 'pk')
+            return dict((str(value), pk) for value, pk in qs)
+        except (ValueError, TypeError, ValidationError):
+            # Some values are invalid for the lookup field, we have to
+            # resolve values one by one to find out which ones
+            resolved = {}
+            for value in values:
+                try:
+                    obj = model.objects.get(**{lookup_field: value})
+                    resolved[str(value)] = obj.pk
+                except (ObjectDoesNotExist, ValueError, TypeError,
+                        ValidationError):
+                    pass
+            return resolved
+
+    def get(self, field_name, value):
+        """Return the pk of the object referenced by a foreign key column."""
+        self.lookups += 1
+        cache = self.cache[field_name]
+        if str(value) not in cache:
+            self.prewarm([{field_name: value}])
+            if str(value) not in cache:
+                # Empty values are not prewarmed
+                self.misses += 1
+                cache[str(value)] = None
+
+        pk = cache[str(value)]
+        if pk is None:
+            raise ObjectDoesNotExist()
+        return pk
+
+
+class ChunkLookups(object):
+    """Objects required to import a chunk of rows, fetched in bulk.
+
+    Importing a row requires the existing metadata and revision, if any,
+    and the objects referenced by the foreign key columns configured in
+    `PhaseConfig.import_fields`. Fetching those row by row costs several
+    queries per row, so they are fetched for the whole chunk at once.
+
+    Foreign keys are resolved through a `ForeignKeyCache`, that should be
+    shared by all the chunks of an import batch.
+
+    Imported rows must be registered with `add`, so the following rows
+    of the chunk can update the same document.
+
+    """
+    def __init__(self, category, rows, foreign_keys=None):
+        self.metadata_class = category.document_class()
+        self.revision_class = category.revision_class()
+        config = self.metadata_class.PhaseConfig
+        self.import_fields = getattr(config, 'import_fields', None)
+
+        keys = set(row.get('document_key') for row in rows)
+        keys -= set([None, ''])
+        self.numbers = set(parse_revision(row.get('revision')) for row in rows)
+        self.numbers.discard(None)
+
+        self.metadata = self.load_metadata(keys)
+        self.revisions = self.load_revisions(self.metadata.values())
+
+        if foreign_keys is None:
+            foreign_keys = ForeignKeyCache(self.import_fields)
+        self.foreign_keys = foreign_keys
+        self.foreign_keys.prewarm(rows)
+
+    def load_metadata(self, keys):
+        qs = self.metadata_class.objects \
+            .select_related('document', 'latest_revision') \
+            .filter(document_key__in=keys)
+        return dict((metadata.document_key, metadata) for metadata in qs)
+
+    def load_revisions(self, metadata_list):
+        """Load the revisions referenced by the chunk rows."""
+        metadata_by_pk = dict(
+            (metadata.pk, metadata) for metadata in metadata_list)
+        if not metadata_by_pk or not self.numbers:
+            return {}
+
+        qs = self.revision_class.objects \
+            .filter(metadata_id__in=list(metadata_by_pk.keys())) \
+            .filter(revision__in=self.numbers)
+        revisions = {}
+        for revision in qs:
+            revision.metadata = metadata_by_pk[revision.metadata_id]
+            revisions[(revision.metadata_id, revision.revision)] = revision
+        return revisions
+
+    def get_metadata(self, key):
+        return self.metadata.get(key)
+
+    def get_revision(self, metadata, revision_num):
+        if metadata is None:
+            return None
+        return self.revisions.get(
+            (metadata.pk, parse_revision(revision_num)))
+
+    def get_foreign_key(self, field_name, value):
+        """Return the pk of the object referenced by a foreign key column."""
+        return self.foreign_keys.get(field_name, value)
+
+    def add(self, metadata, revision):
+        """Register an imported document."""
+        self.metadata[metadata.document_key] = metadata
+        self.revisions[(metadata.pk, revision.revision)] = revision
+
+    def reload(self, key):
+        """Fetch a document again, because its instances were left dirty.
+
+        Forms update their instance even when they are not valid.
+
+        """
+        metadata = self.metadata.pop(key, None)
+        if metadata is None:
+            return
+
+        for revision_key in list(self.revisions.keys()):
+            if revision_key[0] == metadata.pk:
+                del self.revisions[revision_key]
+
+        reloaded = self.load_metadata([key])
+        self.metadata.update(reloaded)
+        self.revisions.update(self.load_revisions(reloaded.values()))
@@ -0,0 +1,96 @@
+# -*- coding: utf-8 -*-
+
+
+import os
+import random
+import string
+import tempfile
+import time
+import tracemalloc
+
+from django.core.management.base import BaseCommand, CommandError
+from openpyxl import Workbook, load_workbook
+
+from imports.readers import SpreadsheetReader, xls_to_django
+
+
+HEADER = (
+    'document_key', 'title', 'revision', 'status', 'docclass',
+    'received_date', 'created_on', 'revision_date')
+
+
+class Command(BaseCommand):
+    help = 'Compare reading an xlsx file with a full workbook and streaming'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', nargs='?')
+        parser.add_argument(
+            '--generate',
+            type=int, dest='generate', default=0,
+            help='Number of random rows to write in a temporary workbook '
+                 'instead of reading an existing file.')
+
+    def handle(self, *args, **options):
+        if options['generate']:
+            path = self.generate(options['generate'])
+        elif options['path']:
+            path = options['path']
+        else:
+            raise CommandError('Give a file path or a number of rows')
+
+        try:
+            self.benchmark(path)
+        finally:
+            if options['generate']:
+                os.remove(path)
+
+    def generate(self, nb_rows):
+        fd, path = tempfile.mkstemp(suffix='.xlsx')
+        os.close(fd)
+        wb = Workbook(write_only=True)
+        ws = wb.create_sheet()
+        ws.append(HEADER)
+        for row in range(nb_rows):
+            title = ''.join(random.choice(string.ascii_letters)
+                            for _ in range(40))
+            ws.append([
+                'DOC-{:08}'.format(row), title, random.randint(0, 10),
+                'STD', random.randint(1, 4), '2015-10-10', '2015-10-10',
+                '2015-10-10'])
+        wb.save(path)
+        return path
+
+    def benchmark(self, path):
+        size = os.path.getsize(path) / 1024.0 / 1024.0
+        self.stdout.write('Reading {} ({:.1f} MB)'.format(path, size))
+
+        def workbook_read():
+            ws = load_workbook(path).active
+            rows = ws.iter_rows()
+            header = [cell.value for cell in next(rows)]
+            count = 0
+            for row in rows:
+                dict(zip(header, [xls_to_django(cell.value) for cell in row]))
+                count += 1
+            return count
+
+        def streaming_read():
+            with SpreadsheetReader(path) as reader:
+                return sum(1 for row in reader)
+
+        self.report('Workbook', *self.run(workbook_read))
+        self.report('Streaming', *self.run(streaming_read))
+
+    def run(self, func):
+        tracemalloc.start()
+        start = time.time()
+        result = func()
+        duration = time.time() - start
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        return result, duration, peak
+
+    def report(self, name, nb_rows, duration, peak):
+        rate = nb_rows / duration if duration else 0
+        self.stdout.write('{:10} {:.3f}s ({:.0f} rows/s), peak memory {:.1f} MB'.format(
+            name + ':', duration, rate, peak / 1024.0 / 1024.0))
@@ -0,0 +1,24 @@
+# -*- coding: utf-8 -*-
+
+
+from django.db import models, migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('imports', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='importbatch',
+            name='lookup_hits',
+            field=models.PositiveIntegerField(default=0, help_text='Foreign keys resolved without querying the db', verbose_name='Lookup hits'),
+        ),
+        migrations.AddField(
+            model_name='importbatch',
+            name='lookup_misses',
+            field=models.PositiveIntegerField(default=0, help_text='Foreign key values fetched from the db', verbose_name='Lookup misses'),
+        ),
+    ]
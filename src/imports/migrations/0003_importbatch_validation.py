@@ -0,0 +1,24 @@
+# -*- coding: utf-8 -*-
+
+
+from django.db import models, migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('imports', '0002_importbatch_lookup_stats'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='importbatch',
+            name='task_id',
+            field=models.CharField(default='', max_length=50, blank=True, help_text='Id of the task processing the batch', verbose_name='Task id'),
+        ),
+        migrations.AlterField(
+            model_name='importbatch',
+            name='status',
+            field=models.CharField(default='new', max_length=50, verbose_name='Status', choices=[('new', 'New'), ('validating', 'Validating'), ('validated', 'Awaiting confirmation'), ('started', 'Started'), ('success', 'Success'), ('partial_success', 'Partial success'), ('error', 'Error')]),
+        ),
+    ]
@@ -1,10 +1,9 @@
-import csv
-import datetime as dt
+import copy
 import json
-from itertools import zip_longest
+from itertools import islice
 
-from django.apps import apps
-from django.db import models
+from django.conf import settings
+from django.db import models, transaction
 from django.core.exceptions import ObjectDoesNotExist
 from django.core.urlresolvers import reverse
 from django.utils.encoding import python_2_unicode_compatible
@@ -13,60 +12,24 @@ from django.utils.translation import ugettext_lazy as _
 
 from django_extensions.db.fields import UUIDField
 from model_utils import Choices
-from annoying.functions import get_object_or_None
-from openpyxl import load_workbook
 
 from categories.models import Category
 from documents.models import Document
 from documents.forms.models import documentform_factory
 from documents.utils import save_document_forms
-
-
-class normal_dialect(csv.Dialect):
-    delimiter = ';'
-    quotechar = '"'
-    doublequote = False
-    skipinitialspace = True
-    lineterminator = '\r\n'
-    quoting = csv.QUOTE_NONE
-    strict = True
-
-
-csv.register_dialect('normal', normal_dialect)
-
-
-def xls_to_django(value):
-    """Converts an excel value into a format we can use.
-
-    Excel stores all numeric values as floats. For exemple, if you put "1" in
-    a cell, importing that cell will yield a value of "1.0", which can cause
-    errors.
-
-    We need to convert numbers into strings since this is the format expected
-    by django forms
-
-    We also have to handle datetime objects returned by openpyxl to convert
-    them to the relevant format : YYYY-MM-DD.
-
-    I feel like this is an awful hack. But Excel is a gigantic hack, so it's
-    the best I can do.
-
-    """
-    if value is None:
-        value = ''
-    elif hasattr(value, 'is_integer') and value.is_integer():
-        value = '%s' % int(value)
-    elif type(value) in (dt.datetime, dt.date):
-        value = value.strftime('%Y-%m-%d')
-    else:
-        value = '%s' % value
-    return value
+from imports.lookups import ChunkLookups, ForeignKeyCache
+from imports.readers import SpreadsheetReader
+from imports.tasks import validate_import, do_import
+from imports.validation import validate_chunks
+from search.utils import deferred_indexing
 
 
 @python_2_unicode_compatible
 class ImportBatch(models.Model):
     STATUSES = Choices(
         ('new', _('New')),
+        ('validating', _('Validating')),
+        ('validated', _('Awaiting confirmation')),
         ('started', _('Started')),
         ('success', _('Success')),
         ('partial_success', _('Partial success')),
@@ -92,6 +55,22 @@ class ImportBatch(models.Model):
         _('Created on'),
         default=timezone.now
     )
+    lookup_hits = models.PositiveIntegerField(
+        _('Lookup hits'),
+        default=0,
+        help_text=_('Foreign keys resolved without querying the db')
+    )
+    lookup_misses = models.PositiveIntegerField(
+        _('Lookup misses'),
+        default=0,
+        help_text=_('Foreign key values fetched from the db')
+    )
+    task_id = models.CharField(
+        _('Task id'),
+        max_length=50,
+        blank=True, default='',
+        help_text=_('Id of the task processing the batch')
+    )
 
     class Meta:
         verbose_name = _('Import batch')
@@ -108,6 +87,43 @@ class ImportBatch(models.Model):
     def get_absolute_url(self):
         return reverse('import_status', args=[self.uid])
 
+    def is_pending(self):
+        return self.status in (
+            self.STATUSES.new,
+            self.STATUSES.validating,
+            self.STATUSES.started)
+
+    def get_poll_url(self):
+        if not self.task_id or not self.is_pending():
+            return None
+        return reverse('task_poll', args=[self.task_id])
+
+    def get_error_count(self):
+        return self.import_set.filter(status=Import.STATUSES.error).count()
+
+    def set_task_id(self, task_id):
+        ImportBatch.objects \
+            .filter(pk=self.pk) \
+            .update(task_id=task_id)
+        self.task_id = task_id
+
+    def start_validation(self):
+        """Asynchronously checks the file content."""
+        result = validate_import.delay(str(self.pk))
+        self.set_task_id(result.id)
+
+    def start_import(self):
+        """Asynchronously imports the file, once validated."""
+        started = ImportBatch.objects \
+            .filter(pk=self.pk) \
+            .filter(status=self.STATUSES.validated) \
+            .update(status=self.STATUSES.started)
+        if not started:
+            return
+        self.status = self.STATUSES.started
+        result = do_import.delay(str(self.pk))
+        self.set_task_id(result.id)
+
     def get_form_class(self):
         form_class = documentform_factory(self.imported_type.model_class())
         return form_class
@@ -129,43 +145,120 @@ class ImportBatch(models.Model):
         return self.get_revisionform_class()(data, **kwargs)
 
     def __iter__(self):
-        """Loop over csv data."""
-        if self.file.path.endswith('csv'):
-            with open(self.file.path, 'r') as f:
-                csvfile = csv.DictReader(f, dialect='normal')
-                for row in csvfile:
-                    imp = Import(batch=self, data=row)
-                    yield imp
-        else:
-            wb = load_workbook(filename=self.file.path, read_only=True)
-            sheet = wb.active
-            header_row = None
-            for row in sheet.iter_rows():
-                if header_row is None:
-                    header_row = [c.value for c in list(row)]
-                    continue
-                values = [xls_to_django(c.value) for c in list(row)]
-                row = dict(zip_longest(header_row, values))
-                imp = Import(batch=self, data=row)
-                yield imp
-
-    def do_import(self):
-        line = 1
+        """Loop over the file rows.
+
+        Empty rows are skipped, so imports hold the line number of their
+        row in the file.
+
+        """
+        with SpreadsheetReader(self.file.path) as reader:
+            for row in reader:
+                yield Import(batch=self, line=reader.line_num, data=row)
+
+    def get_foreign_key_cache(self):
+        model_class = self.imported_type.model_class()
+        import_fields = getattr(model_class.PhaseConfig, 'import_fields', None)
+        return ForeignKeyCache(import_fields)
+
+    def count_rows(self):
+        """Return the number of rows to import."""
+        with SpreadsheetReader(self.file.path) as reader:
+            return reader.count_rows()
+
+    def iter_chunks(self):
+        """Loop over imported rows, by chunks."""
+        imports = iter(self)
+        while True:
+            chunk = list(islice(imports, settings.IMPORTS_CHUNK_SIZE))
+            if not chunk:
+                break
+            yield chunk
+
+    def validate(self, progress_callback=None):
+        """Dry run the import, and store the invalid lines.
+
+        Rows go through the same form validation as during the actual
+        import, but nothing but the errors is saved, so users can fix
+        their file without waiting for the whole import to end. Chunks are
+        validated concurrently, see `validate_chunks`.
+
+        Rows are checked against the current db content, e.g a row updating
+        a document created earlier in the same file is validated as a
+        document creation.
+
+        `progress_callback` is called with the progress percentage every
+        time a chunk is validated.
+
+        """
+        self.import_set.all().delete()
+        self.status = self.STATUSES.validating
+        self.save(update_fields=['status'])
+
+        total = self.count_rows()
+        validated = 0
+        chunks = self.iter_chunks()
+        for nb_rows, invalid_rows in validate_chunks(self.category, chunks):
+            Import.objects.bulk_create(invalid_rows)
+            validated += nb_rows
+            if progress_callback and total:
+                progress = float(validated) / total * 100
+                progress_callback(min(progress, 100.0))
+
+        self.status = self.STATUSES.validated
+        self.save(update_fields=['status'])
+
+    def do_import(self, progress_callback=None):
+        """Import all the rows of the file.
+
+        Rows are imported by chunks, each in a single transaction, and all
+        existing objects the chunk rows refer to are fetched at once
+        beforehand.
+
+        Foreign keys are resolved once for the whole batch.
+
+        Imported documents are indexed in bulk at the end of the import.
+
+        Import results are saved in bulk once their chunk is imported.
+
+        `progress_callback` is called with the progress percentage every
+        time a chunk is imported.
+
+        """
+        # Validation errors are replaced with the actual import results
+        self.import_set.all().delete()
+        self.status = self.STATUSES.started
+        self.save(update_fields=['status'])
+
+        total = self.count_rows() if progress_callback else 0
+        imported = 0
         error_count = 0
-        for imp in self:
-            imp.do_import(line)
-            imp.save()
-            if imp.status == Import.STATUSES.error:
-                error_count += 1
-            line += 1
-
-        if error_count == line - 1:
+        foreign_keys = self.get_foreign_key_cache()
+        with deferred_indexing():
+            for chunk in self.iter_chunks():
+                lookups = ChunkLookups(
+                    self.category, [imp.data for imp in chunk],
+                    foreign_keys=foreign_keys)
+                with transaction.atomic():
+                    for imp in chunk:
+                        imp.do_import(imp.line, lookups=lookups)
+                        if imp.status == Import.STATUSES.error:
+                            error_count += 1
+                    Import.objects.bulk_create(chunk)
+                imported += len(chunk)
+
+                if progress_callback and total:
+                    progress = float(imported) / total * 100
+                    progress_callback(min(progress, 100.0))
+
+        if error_count == imported:
             self.status = self.STATUSES.error
         elif error_count > 0:
             self.status = self.STATUSES.partial_success
         else:
             self.status = self.STATUSES.success
-        self.save()
+        self.lookup_hits = foreign_keys.hits
+        self.lookup_misses = foreign_keys.misses
+        self.save(update_fields=['status', 'lookup_hits', 'lookup_misses'])
 
 
 class Import(models.Model):
@@ -200,7 +293,7 @@ class Import(models.Model):
         self.denormalized = {}
         super(Import, self).__init__(*args, **kwargs)
 
-    def get_denormalized_value(self, import_fields, field_name, value):
+    def get_denormalized_value(self, import_fields, field_name, value, lookups):
         """" Returns the related object pk if the field is a foreign key.
         The PhaseConfig `import_fields` must be configured."""
 
@@ -215,12 +308,8 @@ class Import(models.Model):
         if not model_str or not lookup_field:
             return value
 
-        app_label, model_name = model_str.split('.')
-        model = apps.get_model(app_label=app_label, model_name=model_name)
-        params = {lookup_field: value}
         try:
-            obj = model.objects.get(**params).pk
-            return obj
+            return lookups.get_foreign_key(field_name, value)
 
         except ObjectDoesNotExist:
             self.errors = json.dumps({
@@ -228,7 +317,7 @@ class Import(models.Model):
             })
             self.status = self.STATUSES.error
 
-    def denormalize_data(self, category):
+    def denormalize_data(self, category, lookups):
         """This method processes data to get foreign key objects."""
 
         # Check the `PhaseConfig` attribute
@@ -244,7 +333,8 @@ class Import(models.Model):
 
         # Process each field_name/value to get the fk pk if any
         for field_name, value in list(self.data.items()):
-            val = self.get_denormalized_value(import_fields, field_name, value)
+            val = self.get_denormalized_value(
+                import_fields, field_name, value, lookups)
             # We fill the dict
             self.denormalized[field_name] = val
 
@@ -254,45 +344,109 @@ class Import(models.Model):
             self.batch.get_revisionform(self.denormalized, instance=revision_instance)
         )
 
-    def do_import(self, line):
-        assert hasattr(self, 'data')
+    def get_row_forms(self, lookups, copy_instances=False):
+        """Return the forms bound to the row data.
 
-        self.line = line
+        Returns None when the row cannot be denormalized, the row errors
+        are set in this case.
+
+        Forms update their instances during validation, so instances can
+        be copied to keep the ones in `lookups` untouched.
 
+        """
         # Checking if the document already exists
         key = self.data.get('document_key', None)
-        doc = get_object_or_None(Document, document_key=key)
-        metadata = doc.metadata if doc else None
+        metadata = lookups.get_metadata(key)
 
         # Processing csv data to denormalize foreign keys
-        self.denormalize_data(self.batch.category)
+        self.denormalize_data(self.batch.category, lookups)
         # In case of denormalization error, we exit
         if self.status == self.STATUSES.error:
-            return
+            return None
 
         # Checking if the revision already exists
         revision_num = self.data.get('revision', None)
-        revision = metadata.get_revision(revision_num) if metadata and revision_num else None
+        revision = lookups.get_revision(metadata, revision_num) if revision_num else None
+
+        if copy_instances:
+            metadata = copy.copy(metadata)
+            revision = copy.copy(revision)
+        return self.get_forms(metadata, revision)
+
+    def set_form_errors(self, form, revision_form):
+        errors = dict(list(form.errors.items()) + list(revision_form.errors.items()))
+        self.errors = json.dumps(errors)
+        self.status = self.STATUSES.error
+
+    def validate(self, line, lookups=None):
+        """Check the row without saving anything.
 
-        form, revision_form = self.get_forms(metadata, revision)
+        The status is only set when the row is invalid.
+
+        """
+        assert hasattr(self, 'data')
+
+        self.line = line
+        if lookups is None:
+            lookups = ChunkLookups(self.batch.category, [self.data])
+
+        forms = self.get_row_forms(lookups, copy_instances=True)
+        if forms is None:
+            return
+
+        form, revision_form = forms
         try:
-            if form.is_valid() and revision_form.is_valid():
-                # The `save_document_forms` function sends a signal triggering
-                # ES indexing and schedule field rewriting. Setting
-                # `rewrite_schedule` to False disables rewriting
-                #  (ES indexing is still enabled)
-                doc, metadata, revision = save_document_forms(
-                    form, revision_form,
-                    self.batch.category,
-                    rewrite_schedule=False)
-                self.document = doc
-                self.status = self.STATUSES.success
-            else:
-                errors = dict(list(form.errors.items()) + list(revision_form.errors.items()))
-                self.errors = json.dumps(errors)
-                self.status = self.STATUSES.error
+            if not (form.is_valid() and revision_form.is_valid()):
+                self.set_form_errors(form, revision_form)
         except Exception as e:
             self.errors = json.dumps({
                 'An error occurred': [str(e)]
             })
             self.status = self.STATUSES.error
+
+    def do_import(self, line, lookups=None):
+        """Import the row.
+
+        `lookups` holds the existing objects referenced by the row, see
+        `ChunkLookups`. They are fetched if not provided.
+
+        """
+        assert hasattr(self, 'data')
+
+        self.line = line
+        if lookups is None:
+            lookups = ChunkLookups(self.batch.category, [self.data])
+
+        key = self.data.get('document_key', None)
+        forms = self.get_row_forms(lookups)
+        if forms is None:
+            return
+
+        form, revision_form = forms
+        try:
+            # Rows are imported within the chunk transaction, a savepoint
+            # keeps it usable after a db error on this row
+            with transaction.atomic():
+                if form.is_valid() and revision_form.is_valid():
+                    # The `save_document_forms` function sends a signal
+                    # triggering ES indexing and schedule field rewriting.
+                    # Setting `rewrite_schedule` to False disables rewriting
+                    #  (ES indexing is still enabled)
+                    doc, metadata, revision = save_document_forms(
+                        form, revision_form,
+                        self.batch.category,
+                        rewrite_schedule=False)
+                    lookups.add(metadata, revision)
+                    # Only keep the id, results are saved in bulk later
+                    self.document_id = doc.id
+                    self.status = self.STATUSES.success
+                else:
+                    self.set_form_errors(form, revision_form)
+        except Exception as e:
+            self.errors = json.dumps({
+                'An error occurred': [str(e)]
+            })
+            self.status = self.STATUSES.error
+
+        if self.status == self.STATUSES.error:
+            lookups.reload(key)
@@ -0,0 +1,132 @@
+# -*- coding: utf-8 -*-
+
+
+import csv
+import datetime as dt
+
+from openpyxl import load_workbook
+
+
+class normal_dialect(csv.Dialect):
+    delimiter = ';'
+    quotechar = '"'
+    doublequote = False
+    skipinitialspace = True
+    lineterminator = '\r\n'
+    quoting = csv.QUOTE_NONE
+    strict = True
+
+
+csv.register_dialect('normal', normal_dialect)
+
+
+def xls_to_django(value):
+    """Converts an excel value into a format we can use.
+
+    Excel stores all numeric values as floats. For exemple, if you put "1" in
+    a cell, importing that cell will yield a value of "1.0", which can cause
+    errors.
+
+    We need to convert numbers into strings since this is the format expected
+    by django forms
+
+    We also have to handle datetime objects returned by openpyxl to convert
+    them to the relevant format : YYYY-MM-DD.
+
+    I feel like this is an awful hack. But Excel is a gigantic hack, so it's
+    the best I can do.
+
+    """
+    if value is None:
+        value = ''
+    elif hasattr(value, 'is_integer') and value.is_integer():
+        value = '%s' % int(value)
+    elif type(value) in (dt.datetime, dt.date):
+        value = value.strftime('%Y-%m-%d')
+    else:
+        value = '%s' % value
+    return value
+
+
+def is_empty(values):
+    return all(value is None or value == '' for value in values)
+
+
+class SpreadsheetReader(object):
+    """Stream the rows of a csv or xlsx file as dicts.
+
+    Rows are read one at a time, and xlsx files are opened in read-only
+    mode, so memory usage does not depend on the file size.
+
+    Like `csv.DictReader`, values are keyed by the names found in the
+    header row. `fieldnames` can be replaced before iterating to rename
+    columns, and columns without a name are ignored. Empty rows are
+    skipped, and `line_num` holds the line number of the last row read.
+
+    Values are passed through `converter`, which turns spreadsheet values
+    into the strings django forms expect by default. Use `None` to get
+    raw values.
+
+    `source` is a path, or a file object for xlsx files.
+
+    """
+    def __init__(self, source, converter=xls_to_django):
+        self.source = source
+        self.converter = converter
+        self.line_num = 0
+        self.max_row = None
+
+        name = source if isinstance(source, str) else \
+            getattr(source, 'name', '')
+        if name.endswith('csv'):
+            self.file = open(source, 'r')
+            self.values = csv.reader(self.file, dialect='normal')
+        else:
+            self.file = open(source, 'rb') if isinstance(source, str) else None
+            wb = load_workbook(filename=self.file or source, read_only=True)
+            sheet = wb.active
+            # The sheet dimensions are not always stored in the file
+            self.max_row = sheet.max_row
+            self.values = (
+                [cell.value for cell in row] for row in sheet.iter_rows())
+
+        header = next(self.values, [])
+        self.line_num = 1
+        self.fieldnames = [value if value else None for value in header]
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def close(self):
+        if self.file:
+            self.file.close()
+
+    def __iter__(self):
+        convert = self.converter or (lambda value: value)
+        for values in self.values:
+            self.line_num += 1
+            if is_empty(values):
+                continue
+
+            nb_values = len(values)
+            row = {}
+            for index, name in enumerate(self.fieldnames):
+                if name is None:
+                    continue
+                value = values[index] if index < nb_values else None
+                row[name] = convert(value)
+            yield row
+
+    def count_rows(self):
+        """Return the number of rows below the header.
+
+        Uses the sheet dimensions when they are available, otherwise all
+        the remaining rows are read.
+
+        """
+        if self.max_row is not None:
+            return max(self.max_row - 1, 0)
+        return sum(1 for row in self)
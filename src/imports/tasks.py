@@ -1,8 +1,48 @@
+import logging
+from contextlib import contextmanager
+
+from celery import current_task
+
 from core.celery import app
-from imports.models import ImportBatch
+
+
+logger = logging.getLogger(__name__)
+
+
+def report_progress(progress):
+    current_task.update_state(
+        state='PROGRESS',
+        meta={'progress': progress})
+
+
+@contextmanager
+def report_failure(batch):
+    """Mark the batch as failed if the task crashes.
+
+    Otherwise, the batch would be left pending forever.
+
+    """
+    try:
+        yield
+    except Exception:
+        logger.exception('Import {} failed'.format(batch.uid))
+        type(batch).objects \
+            .filter(pk=batch.pk) \
+            .update(status=batch.STATUSES.error)
+        raise
+
+
+@app.task
+def validate_import(batch_uid):
+    from imports.models import ImportBatch
+    batch = ImportBatch.objects.get(uid=batch_uid)
+    with report_failure(batch):
+        batch.validate(progress_callback=report_progress)
 
 
 @app.task
 def do_import(batch_uid):
+    from imports.models import ImportBatch
     batch = ImportBatch.objects.get(uid=batch_uid)
-    batch.do_import()
+    with report_failure(batch):
+        batch.do_import(progress_callback=report_progress)
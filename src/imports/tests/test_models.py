@@ -1,11 +1,17 @@
-from django.test import TestCase
+from django.test import TestCase, override_settings
+from mock import patch
+from django.core.exceptions import ObjectDoesNotExist
+from django.db import connection
 from django.core.files.uploadedfile import SimpleUploadedFile
 
 from documents.models import Document
+from documents.utils import save_document_forms
 from accounts.factories import UserFactory
 from default_documents.models import DemoMetadataRevision
 from categories.factories import CategoryFactory
 from imports.models import ImportBatch, Import
+from imports.lookups import ChunkLookups, ForeignKeyCache
+from imports.tasks import validate_import, do_import
 
 
 class ImportTests(TestCase):
@@ -183,6 +189,245 @@ class ImportTests(TestCase):
         self.assertEqual(doc.latest_revision.docclass, 2)
 
 
+class ImportBatchMixin(object):
+    """Create import batches from csv lines."""
+
+    def setUp(self):
+        self.category = CategoryFactory()
+        self.user = UserFactory(
+            email='testadmin@phase.fr',
+            password='pass',
+            is_superuser=True,
+            category=self.category
+        )
+
+    def create_batch(self, lines):
+        header = 'document_key;title;status;docclass;received_date'
+        content = '\r\n'.join([header] + lines).encode()
+        return ImportBatch.objects.create(
+            category=self.category,
+            file=SimpleUploadedFile('import.csv', content))
+
+
+class ChunkImportTests(ImportBatchMixin, TestCase):
+
+    @override_settings(IMPORTS_CHUNK_SIZE=2)
+    def test_import_by_chunks(self):
+        batch = self.create_batch([
+            'toto;doc-toto;STD;1;2015-10-10',
+            'tata;doc-tata;FIN;2;2015-10-10',
+            'toto;doc-toto;IDC;2;2015-10-11',
+        ])
+        batch.do_import()
+
+        self.assertEqual(batch.status, ImportBatch.STATUSES.success)
+        self.assertEqual(Document.objects.all().count(), 2)
+        self.assertEqual(DemoMetadataRevision.objects.all().count(), 3)
+        self.assertEqual(
+            list(batch.import_set.order_by('line').values_list('line', flat=True)),
+            [2, 3, 4])
+
+    def test_results_are_saved_in_bulk(self):
+        batch = self.create_batch([
+            'toto;doc-toto;STD;1;2015-10-10',
+            'tata;doc-tata;FIN;;2015-10-10',
+        ])
+        with patch.object(Import, 'save') as save:
+            batch.do_import()
+        self.assertFalse(save.called)
+
+        toto = batch.import_set.get(line=2)
+        self.assertEqual(toto.status, Import.STATUSES.success)
+        self.assertEqual(toto.document.document_key, 'toto')
+        tata = batch.import_set.get(line=3)
+        self.assertEqual(tata.status, Import.STATUSES.error)
+        self.assertIsNone(tata.document)
+
+    def test_invalid_row_does_not_alter_following_rows(self):
+        batch = self.create_batch([
+            'toto;doc-toto;STD;1;2015-10-10',
+            'toto;doc-invalid;IDC;;2015-10-10',
+            'toto;doc-toto;IDC;2;2015-10-11',
+        ])
+        batch.do_import()
+
+        self.assertEqual(batch.status, ImportBatch.STATUSES.partial_success)
+        document = Document.objects.get(document_key='toto')
+        self.assertEqual(document.title, 'doc-toto')
+        self.assertEqual(document.current_revision, 1)
+
+    def test_db_error_does_not_break_the_chunk(self):
+        batch = self.create_batch([
+            'toto;doc-toto;STD;1;2015-10-10',
+            'tata;doc-tata;FIN;2;2015-10-10',
+            'titi;doc-titi;FIN;2;2015-10-10',
+        ])
+
+        def broken_save(form, revision_form, *args, **kwargs):
+            if form.data.get('document_key') == 'tata':
+                # Aborts the current transaction
+                with connection.cursor() as cursor:
+                    cursor.execute('SELECT * FROM unknown_table')
+            return save_document_forms(form, revision_form, *args, **kwargs)
+
+        with patch('imports.models.save_document_forms',
+                   side_effect=broken_save):
+            batch.do_import()
+
+        self.assertEqual(batch.status, ImportBatch.STATUSES.partial_success)
+        self.assertEqual(
+            sorted(Document.objects.values_list('document_key', flat=True)),
+            ['titi', 'toto'])
+        tata = batch.import_set.get(line=3)
+        self.assertEqual(tata.status, Import.STATUSES.error)
+
+    def test_lookups_are_fetched_in_bulk(self):
+        batch = self.create_batch([
+            'toto;doc-toto;STD;1;2015-10-10',
+            'tata;doc-tata;FIN;2;2015-10-10',
+        ])
+        batch.do_import()
+
+        rows = [
+            {'document_key': 'toto', 'revision': '0'},
+            {'document_key': 'tata', 'revision': '0'},
+            {'document_key': 'titi'},
+        ]
+        with self.assertNumQueries(2):
+            lookups = ChunkLookups(self.category, rows)
+
+        metadata = lookups.get_metadata('toto')
+        self.assertEqual(metadata.document.document_key, 'toto')
+        self.assertEqual(lookups.get_revision(metadata, '0').revision, 0)
+        self.assertIsNone(lookups.get_metadata('titi'))
+
+
+class ValidationTests(ImportBatchMixin, TestCase):
+
+    @override_settings(IMPORTS_CHUNK_SIZE=2)
+    def test_validation_stores_invalid_lines_only(self):
+        batch = self.create_batch([
+            'toto;doc-toto;STD;1;2015-10-10',
+            'tata;doc-tata;FIN;;2015-10-10',
+            'titi;doc-titi;FIN;2;2015-10-10',
+        ])
+        progress = []
+        batch.validate(progress_callback=progress.append)
+
+        self.assertEqual(batch.status, ImportBatch.STATUSES.validated)
+        self.assertEqual(Document.objects.all().count(), 0)
+        invalid = batch.import_set.all()
+        self.assertEqual(invalid.count(), 1)
+        self.assertEqual(invalid[0].line, 3)
+        self.assertEqual(invalid[0].status, Import.STATUSES.error)
+        self.assertIn('docclass', invalid[0].errors)
+        self.assertEqual(progress[-1], 100.0)
+
+    def test_empty_rows_do_not_shift_line_numbers(self):
+        batch = self.create_batch([
+            'toto;doc-toto;STD;1;2015-10-10',
+            ';;;;',
+            'tata;doc-tata;FIN;;2015-10-10',
+        ])
+        batch.validate()
+        self.assertEqual(
+            list(batch.import_set.values_list('line', flat=True)), [4])
+
+        batch.start_import()
+        self.assertEqual(
+            list(batch.import_set.order_by('line')
+                 .values_list('line', flat=True)),
+            [2, 4])
+
+    def test_validation_does_not_alter_existing_documents(self):
+        batch = self.create_batch(['toto;doc-toto;STD;1;2015-10-10'])
+        batch.do_import()
+
+        batch = self.create_batch([
+            'toto;doc-invalid;IDC;;2015-10-10',
+            'toto;doc-valid;IDC;2;2015-10-11',
+        ])
+        batch.validate()
+        self.assertEqual(batch.import_set.all().count(), 1)
+        document = Document.objects.get(document_key='toto')
+        self.assertEqual(document.title, 'doc-toto')
+
+    def test_confirmed_import_replaces_validation_results(self):
+        batch = self.create_batch([
+            'toto;doc-toto;STD;1;2015-10-10',
+            'tata;doc-tata;FIN;;2015-10-10',
+        ])
+        batch.validate()
+        batch.start_import()
+
+        batch.refresh_from_db()
+        self.assertEqual(batch.status, ImportBatch.STATUSES.partial_success)
+        self.assertEqual(batch.import_set.all().count(), 2)
+        self.assertEqual(Document.objects.all().count(), 1)
+
+    def test_unvalidated_batch_cannot_be_imported(self):
+        batch = self.create_batch(['toto;doc-toto;STD;1;2015-10-10'])
+        batch.start_import()
+        self.assertEqual(Document.objects.all().count(), 0)
+
+    @patch.object(ImportBatch, 'validate', side_effect=ValueError)
+    def test_failed_validation_is_not_left_pending(self, validate_mock):
+        batch = self.create_batch(['toto;doc-toto;STD;1;2015-10-10'])
+        with self.assertRaises(ValueError):
+            validate_import(str(batch.uid))
+
+        batch.refresh_from_db()
+        self.assertEqual(batch.status, ImportBatch.STATUSES.error)
+        self.assertFalse(batch.is_pending())
+
+    @patch.object(ImportBatch, 'do_import', side_effect=ValueError)
+    def test_failed_import_is_not_left_pending(self, import_mock):
+        batch = self.create_batch(['toto;doc-toto;STD;1;2015-10-10'])
+        with self.assertRaises(ValueError):
+            do_import(str(batch.uid))
+
+        batch.refresh_from_db()
+        self.assertEqual(batch.status, ImportBatch.STATUSES.error)
+        self.assertFalse(batch.is_pending())
+
+
+class ForeignKeyCacheTests(TestCase):
+
+    def setUp(self):
+        self.user = UserFactory(email='testadmin@phase.fr')
+        self.cache = ForeignKeyCache({
+            'owner': {'model': 'accounts.User', 'lookup_field': 'email'},
+            'leader': {'model': 'accounts.User', 'lookup_field': 'id'},
+            'title': {},
+        })
+
+    def test_values_are_resolved_once(self):
+        rows = [
+            {'owner': 'testadmin@phase.fr', 'leader': ''},
+            {'owner': 'testadmin@phase.fr', 'leader': ''},
+            {'owner': 'unknown@phase.fr', 'leader': ''},
+        ]
+        with self.assertNumQueries(1):
+            self.cache.prewarm(rows)
+
+        with self.assertNumQueries(0):
+            self.cache.prewarm(rows)
+            for row in rows[:2]:
+                self.assertEqual(
+                    self.cache.get('owner', row['owner']), self.user.pk)
+            with self.assertRaises(ObjectDoesNotExist):
+                self.cache.get('owner', 'unknown@phase.fr')
+
+        self.assertEqual(self.cache.misses, 2)
+        self.assertEqual(self.cache.hits, 1)
+
+    def test_invalid_values_are_ignored(self):
+        self.cache.prewarm([{'leader': 'toto'}, {'leader': str(self.user.pk)}])
+        self.assertEqual(self.cache.get('leader', self.user.pk), self.user.pk)
+        with self.assertRaises(ObjectDoesNotExist):
+            self.cache.get('leader', 'toto')
+
+
 class ExcelTests(TestCase):
 
     def setUp(self):
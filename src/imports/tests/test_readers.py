@@ -0,0 +1,81 @@
+# -*- coding: utf-8 -*-
+
+
+import datetime as dt
+import os
+import shutil
+import tempfile
+
+from django.test import SimpleTestCase
+
+from imports.readers import SpreadsheetReader, xls_to_django
+
+
+class XlsToDjangoTests(SimpleTestCase):
+    def test_values_are_converted_to_strings(self):
+        self.assertEqual(xls_to_django(None), '')
+        self.assertEqual(xls_to_django(1.0), '1')
+        self.assertEqual(xls_to_django(1.5), '1.5')
+        self.assertEqual(xls_to_django(dt.date(2015, 10, 10)), '2015-10-10')
+        self.assertEqual(xls_to_django('toto'), 'toto')
+
+
+class SpreadsheetReaderTests(SimpleTestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def create_csv(self, lines):
+        path = os.path.join(self.tmpdir, 'import.csv')
+        with open(path, 'w') as the_file:
+            the_file.write('\r\n'.join(lines))
+        return path
+
+    def test_rows_are_mapped_by_header(self):
+        path = self.create_csv([
+            'document_key;;title',
+            'toto;ignored;doc-toto',
+            'tata',
+        ])
+        with SpreadsheetReader(path) as reader:
+            rows = list(reader)
+
+        self.assertEqual(rows, [
+            {'document_key': 'toto', 'title': 'doc-toto'},
+            {'document_key': 'tata', 'title': ''},
+        ])
+
+    def test_columns_can_be_renamed(self):
+        path = self.create_csv(['a;b', 'toto;doc-toto'])
+        with SpreadsheetReader(path) as reader:
+            reader.fieldnames = ['document_key', 'title']
+            rows = list(reader)
+        self.assertEqual(rows, [{'document_key': 'toto', 'title': 'doc-toto'}])
+
+    def test_empty_rows_are_skipped(self):
+        path = self.create_csv([
+            'document_key;title',
+            'toto;doc-toto',
+            ';',
+            'tata;doc-tata',
+        ])
+        lines = []
+        with SpreadsheetReader(path) as reader:
+            for row in reader:
+                lines.append((reader.line_num, row['document_key']))
+        self.assertEqual(lines, [(2, 'toto'), (4, 'tata')])
+
+    def test_xlsx_rows(self):
+        path = os.path.join(
+            os.path.dirname(__file__), 'demo_import_file.xlsx')
+        with SpreadsheetReader(path) as reader:
+            rows = list(reader)
+
+        self.assertEqual(len(rows), 3)
+        self.assertEqual(rows[0]['document_key'], 'test-1234')
+        self.assertEqual(rows[0]['revision'], '0')
+        self.assertEqual(rows[0]['docclass'], '1')
+        # Missing cells
+        self.assertEqual(rows[2]['revision'], '')
@@ -0,0 +1,84 @@
+from django.core.urlresolvers import reverse
+from django.test import TestCase
+
+from documents.models import Document
+from imports.models import ImportBatch
+from imports.tests.test_models import ImportBatchMixin
+
+
+class ImportConfirmTests(ImportBatchMixin, TestCase):
+
+    def setUp(self):
+        super(ImportConfirmTests, self).setUp()
+        self.client.login(email=self.user.email, password='pass')
+
+    def test_get_is_not_allowed(self):
+        batch = self.create_batch(['toto;doc-toto;STD;1;2015-10-10'])
+        batch.validate()
+
+        res = self.client.get(reverse('import_confirm', args=[batch.uid]))
+        self.assertEqual(res.status_code, 405)
+        batch.refresh_from_db()
+        self.assertEqual(batch.status, ImportBatch.STATUSES.validated)
+        self.assertEqual(Document.objects.all().count(), 0)
+
+    def test_confirm_validated_batch(self):
+        batch = self.create_batch(['toto;doc-toto;STD;1;2015-10-10'])
+        batch.validate()
+
+        res = self.client.post(reverse('import_confirm', args=[batch.uid]))
+        self.assertRedirects(
+            res, batch.get_absolute_url(), fetch_redirect_response=False)
+        batch.refresh_from_db()
+        self.assertEqual(batch.status, ImportBatch.STATUSES.success)
+        self.assertEqual(Document.objects.all().count(), 1)
+
+    def test_confirm_unvalidated_batch_does_nothing(self):
+        batch = self.create_batch(['toto;doc-toto;STD;1;2015-10-10'])
+
+        res = self.client.post(reverse('import_confirm', args=[batch.uid]))
+        self.assertRedirects(
+            res, batch.get_absolute_url(), fetch_redirect_response=False)
+        batch.refresh_from_db()
+        self.assertEqual(batch.status, ImportBatch.STATUSES.new)
+        self.assertEqual(batch.task_id, '')
+        self.assertEqual(Document.objects.all().count(), 0)
+
+
+class ImportStatusTests(ImportBatchMixin, TestCase):
+
+    def setUp(self):
+        super(ImportStatusTests, self).setUp()
+        self.client.login(email=self.user.email, password='pass')
+        self.batch = self.create_batch(['toto;doc-toto;STD;1;2015-10-10'])
+        self.poll_url = reverse('task_poll', args=['task'])
+
+    def set_state(self, status, task_id='task'):
+        ImportBatch.objects \
+            .filter(pk=self.batch.pk) \
+            .update(status=status, task_id=task_id)
+
+    def test_pending_batch_displays_progress(self):
+        self.set_state(ImportBatch.STATUSES.validating)
+        res = self.client.get(self.batch.get_absolute_url())
+        self.assertContains(res, 'task-progress')
+        self.assertContains(res, self.poll_url)
+
+    def test_progress_needs_a_task(self):
+        self.set_state(ImportBatch.STATUSES.new, task_id='')
+        res = self.client.get(self.batch.get_absolute_url())
+        self.assertNotContains(res, 'task-progress')
+
+    def test_failed_batch_is_not_polled(self):
+        self.set_state(ImportBatch.STATUSES.error)
+        res = self.client.get(self.batch.get_absolute_url())
+        self.assertNotContains(res, self.poll_url)
+        self.assertNotContains(res, reverse(
+            'import_confirm', args=[self.batch.uid]))
+
+    def test_validated_batch_can_be_confirmed(self):
+        self.set_state(ImportBatch.STATUSES.validated)
+        res = self.client.get(self.batch.get_absolute_url())
+        self.assertNotContains(res, self.poll_url)
+        self.assertContains(res, reverse(
+            'import_confirm', args=[self.batch.uid]))
@@ -1,6 +1,7 @@
 from django.conf.urls import url
 
-from imports.views import ImportList, FileUpload, ImportStatus, ImportTemplate
+from imports.views import (
+    ImportList, FileUpload, ImportStatus, ImportConfirm, ImportTemplate)
 
 
 urlpatterns = [
@@ -16,5 +17,8 @@ urlpatterns = [
         name='import_file'),
     url(r'^(?P<uid>[\w-]+)/$',
         ImportStatus.as_view(),
-        name='import_status')
+        name='import_status'),
+    url(r'^(?P<uid>[\w-]+)/confirm/$',
+        ImportConfirm.as_view(),
+        name='import_confirm'),
 ]
@@ -5,7 +5,7 @@ import csv
 
 from django.http import HttpResponse
 from openpyxl import Workbook
-from .models import normal_dialect
+from .readers import normal_dialect
 
 csv.register_dialect('normal', normal_dialect)
 
@@ -0,0 +1,62 @@
+# -*- coding: utf-8 -*-
+
+
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.db import connection
+
+from imports.lookups import ChunkLookups
+
+
+def validate_rows(category, chunk):
+    """Validate a chunk of rows.
+
+    Returns the number of validated rows and the list of invalid ones.
+
+    """
+    lookups = ChunkLookups(category, [imp.data for imp in chunk])
+    invalid_rows = []
+    for imp in chunk:
+        imp.validate(imp.line, lookups=lookups)
+        if imp.status == imp.STATUSES.error:
+            invalid_rows.append(imp)
+    return len(chunk), invalid_rows
+
+
+def validate_chunk(category, chunk):
+    """Validate a chunk of rows in a worker thread."""
+    try:
+        return validate_rows(category, chunk)
+    finally:
+        # Every thread opens its own db connection
+        connection.close()
+
+
+def validate_chunks(category, chunks, workers=None):
+    """Validate chunks of rows concurrently, and yield the results in order.
+
+    Validating a row mostly means waiting for the queries of the form
+    validation, so several chunks are validated at once by a pool of
+    threads. At most `2 * workers` chunks are pending at the same time,
+    so memory usage stays bounded.
+
+    """
+    if workers is None:
+        workers = settings.IMPORTS_VALIDATION_WORKERS
+
+    if workers <= 1:
+        for chunk in chunks:
+            yield validate_rows(category, chunk)
+        return
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        pending = deque()
+        for chunk in chunks:
+            pending.append(executor.submit(validate_chunk, category, chunk))
+            if len(pending) >= workers * 2:
+                yield pending.popleft().result()
+
+        while pending:
+            yield pending.popleft().result()
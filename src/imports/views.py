@@ -1,15 +1,17 @@
 
 
-from django.views.generic import CreateView, DetailView, ListView, FormView
+from django.conf import settings
+from django.views.generic import CreateView, ListView, FormView, View
 from django.utils.translation import ugettext_lazy as _
 from django.core.urlresolvers import reverse
+from django.http import HttpResponseRedirect
+from django.shortcuts import get_object_or_404
 from braces.views import LoginRequiredMixin
 
 from categories.models import Category
 from notifications.models import notify
 from imports.models import ImportBatch
 from imports.forms import FileUploadForm, ImportTemplateGenerationForm
-from imports.tasks import do_import
 from .utils import make_csv_template, make_xlsx_template
 
 
@@ -40,11 +42,11 @@ class FileUpload(ImportMixin, LoginRequiredMixin, CreateView):
 
     def form_valid(self, form):
         response = super(FileUpload, self).form_valid(form)
-        do_import.delay(self.object.uid)
+        self.object.start_validation()
 
-        message_text = '''You required the import of a new file. Results
-                       <a href="%(url)s">should be available in a few
-                       seconds.</a>'''
+        message_text = '''You required the import of a new file. Please
+                       <a href="%(url)s">check the validation results</a>
+                       to confirm the import.'''
         message_data = {
             'url': self.object.get_absolute_url(),
         }
@@ -52,19 +54,43 @@ class FileUpload(ImportMixin, LoginRequiredMixin, CreateView):
         return response
 
 
-class ImportStatus(ImportMixin, LoginRequiredMixin, DetailView):
-    model = ImportBatch
-    pk_url_kwarg = 'uid'
+class ImportStatus(ImportMixin, LoginRequiredMixin, ListView):
     template_name = 'imports/import_status.html'
+    context_object_name = 'imports'
+    paginate_by = settings.PAGINATE_BY
 
     def breadcrumb_object(self):
         return self.object
 
+    def get_object(self):
+        return get_object_or_404(ImportBatch, uid=self.kwargs['uid'])
+
+    def get_queryset(self):
+        return self.object.import_set \
+            .select_related('document') \
+            .order_by('line')
+
     def get_context_data(self, **kwargs):
         context = super(ImportStatus, self).get_context_data(**kwargs)
-
+        context.update({
+            'object': self.object,
+        })
         return context
 
+    def get(self, request, *args, **kwargs):
+        self.object = self.get_object()
+        return super(ImportStatus, self).get(request, *args, **kwargs)
+
+
+class ImportConfirm(LoginRequiredMixin, View):
+    """Start writing a validated import batch."""
+    http_method_names = ['post']
+
+    def post(self, request, *args, **kwargs):
+        batch = get_object_or_404(ImportBatch, uid=kwargs.get('uid'))
+        batch.start_import()
+        return HttpResponseRedirect(batch.get_absolute_url())
+
 
 class ImportTemplate(ImportMixin, LoginRequiredMixin, FormView):
     """Renders a csv template which header is populated with PhaseConfig
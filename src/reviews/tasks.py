@@ -13,12 +13,14 @@ from reviews.signals import pre_batch_review, post_batch_review, batch_item_inde
 from reviews.models import Review
 from notifications.models import notify
 from discussion.models import Note
+from search.utils import synchronous_indexing
 
 
 logger = logging.getLogger(__name__)
 
 
 @app.task
+@synchronous_indexing()
 def do_batch_import(user_id, category_id, contenttype_id, document_ids,
                     remark=None):
 
@@ -110,6 +112,7 @@ def do_batch_import(user_id, category_id, contenttype_id, document_ids,
 
 
 @app.task
+@synchronous_indexing()
 def batch_close_reviews(user_id, review_ids):
     """Close several reviews at once.
 
@@ -190,6 +193,7 @@ def batch_close_reviews(user_id, review_ids):
 
 
 @app.task
+@synchronous_indexing()
 def batch_cancel_reviews(user_id, category_id, contenttype_id, document_ids):
     contenttype = ContentType.objects.get_for_id(contenttype_id)
     document_class = contenttype.model_class()
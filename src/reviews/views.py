@@ -22,7 +22,8 @@ from zipview.views import BaseZipView
 from audit_trail.models import Activity
 from audit_trail.signals import activity_log
 from documents.models import Document
-from documents.views import DocumentListMixin, BaseDocumentBatchActionView
+from documents.views import (
+    DocumentListMixin, BaseDocumentBatchActionView, ZipViewArchiveMixin)
 from discussion.models import Note
 from notifications.models import notify
 from reviews.models import Review
@@ -608,7 +609,7 @@ class CommentsDownload(LoginRequiredMixin, DetailView):
         return serve_model_file_field(review, 'comments')
 
 
-class CommentsArchiveDownload(LoginRequiredMixin, BaseZipView):
+class CommentsArchiveDownload(LoginRequiredMixin, ZipViewArchiveMixin, BaseZipView):
     """Download at once all comments for a review."""
 
     zipfile_name = 'comments.zip'
@@ -1,6 +1,10 @@
 # -*- coding: utf-8 -*-
 
 
+import base64
+import binascii
+import json
+
 from django.conf import settings
 from django.forms import ModelChoiceField
 from django.db import models
@@ -11,6 +15,28 @@ from documents.forms.filters import filterform_factory
 from search import elastic
 
 
+# Sort values used by elasticsearch for documents with a missing (numeric or
+# date) value, that are sorted last.
+MISSING_SORT_VALUES = (None, 2 ** 63 - 1, -2 ** 63, float('inf'), float('-inf'))
+
+
+def encode_cursor(data):
+    dump = json.dumps(data).encode('utf-8')
+    return base64.urlsafe_b64encode(dump).decode('ascii')
+
+
+def decode_cursor(cursor):
+    try:
+        dump = base64.urlsafe_b64decode(cursor.encode('ascii'))
+        data = json.loads(dump.decode('utf-8'))
+        value, pk = data['after']
+        offset = int(data['offset'])
+        sort_by = data['sort_by']
+    except (binascii.Error, UnicodeError, ValueError, TypeError, KeyError):
+        raise RuntimeError('Search cursor is invalid')
+    return {'after': [value, pk], 'offset': offset, 'sort_by': sort_by}
+
+
 class SearchBuilder(object):
     """Builds Elasticsearch query objects.
 
@@ -20,11 +46,13 @@ class SearchBuilder(object):
 
     """
 
-    def __init__(self, category, filters=None, filter_on_entities=None):
+    def __init__(self, category, filters=None, filter_on_entities=None,
+                 cursor=None):
         if filters is None:
             filters = {}
         self.category = category
         self.init_filters(filters)
+        self.init_cursor(cursor)
 
         DocumentModel = self.category.document_class()
         Config = DocumentModel.PhaseConfig
@@ -46,6 +74,37 @@ class SearchBuilder(object):
         self.filter_form = form
         self.filters = form.cleaned_data
 
+    def init_cursor(self, cursor):
+        """Decode the opaque pagination cursor.
+
+        A cursor points after the last hit of the previous page, so we don't
+        need to use `from` to paginate, which cost grows with the page number.
+
+        """
+        self.cursor = decode_cursor(cursor) if cursor else None
+        if self.cursor and self.cursor['sort_by'] != self.get_sort_by():
+            raise RuntimeError('Search cursor does not match sort order')
+
+    @property
+    def offset(self):
+        """Number of hits before the current page."""
+        if self.cursor:
+            return self.cursor['offset']
+        return self.filters.get('start', 0) or 0
+
+    def get_next_cursor(self, response):
+        """Return the cursor to fetch the page following the given results."""
+        hits = list(response.hits)
+        if not hits:
+            return None
+
+        value, pk = hits[-1].meta.sort
+        return encode_cursor({
+            'after': [value, pk],
+            'offset': self.offset + len(hits),
+            'sort_by': self.get_sort_by(),
+        })
+
     def get_results(self, *args, **kwargs):
         return self.build_query(*args, **kwargs).execute()
 
@@ -105,15 +164,29 @@ class SearchBuilder(object):
         For foreign key fields, we need to organize buckets by primary keys
         For every other field, the ".raw" field is what we want
 
+        Facets are only used to display counts next to the filter field
+        choices, so we don't need more buckets than there are choices.
+
         """
         for field in self.filter_fields:
-            if isinstance(self.filter_form.fields[field], ModelChoiceField):
-                s.aggs.bucket(field, 'terms', field='%s_id' % field, size=0)
+            form_field = self.filter_form.fields[field]
+            size = self._get_aggregation_size(form_field)
+            if isinstance(form_field, ModelChoiceField):
+                s.aggs.bucket(field, 'terms', field='%s_id' % field,
+                              size=size)
             else:
-                s.aggs.bucket(field, 'terms', field='%s.raw' % field, size=0)
+                s.aggs.bucket(field, 'terms', field='%s.raw' % field,
+                              size=size)
 
         return s
 
+    def _get_aggregation_size(self, form_field):
+        max_size = settings.SEARCH_FACETS_MAX_SIZE
+        choices = getattr(form_field, 'choices', None)
+        if choices is None:
+            return max_size
+        return max(1, min(len(choices), max_size))
+
     def _add_search_query(self, s):
         """Add the full text search to the query."""
         search_terms = self.filters.get('search_terms', None)
@@ -128,26 +201,76 @@ class SearchBuilder(object):
 
         return s
 
-    def _add_sort(self, s):
-        sort_field = self.filters.get('sort_by', 'document_key') or 'document_key'
-        sort_field = '%s.raw' % sort_field
+    def get_sort_by(self):
+        return self.filters.get('sort_by', 'document_key') or 'document_key'
+
+    def get_sort(self):
+        """Return the (field, direction) to sort results with."""
+        sort_field = '%s.raw' % self.get_sort_by()
         if sort_field.startswith('-'):
             sort_field = sort_field.lstrip('-')
             sort_direction = 'desc'
         else:
             sort_direction = 'asc'
-        s = s.sort({sort_field: {
-            'order': sort_direction,
-            'unmapped_type': "String"}})
+        return sort_field, sort_direction
+
+    def _add_sort(self, s):
+        """Sort results, using the revision pk as a tie breaker.
+
+        The tie breaker makes the sort order stable, which is required for
+        cursor based pagination.
+
+        """
+        sort_field, sort_direction = self.get_sort()
+        s = s.sort(
+            {sort_field: {
+                'order': sort_direction,
+                'unmapped_type': "String"}},
+            {'pk': {
+                'order': 'asc',
+                'unmapped_type': 'long'}})
         return s
 
     def _add_pagination(self, s):
-        s = s.extra(
-            from_=self.filters.get('start', 0),
-            size=self.filters.get('size', settings.PAGINATE_BY)
-        )
+        size = self.filters.get('size', settings.PAGINATE_BY)
+        if self.cursor:
+            s = self._add_cursor(s)
+            s = s.extra(from_=0, size=size)
+        else:
+            s = s.extra(from_=self.filters.get('start', 0), size=size)
         return s
 
+    def _add_cursor(self, s):
+        """Only return hits that are sorted after the cursor.
+
+        Documents without a value for the sort field are sorted last,
+        whatever the sort direction.
+
+        We use a post filter, so aggregations are not restricted to the
+        current page.
+
+        """
+        sort_field, sort_direction = self.get_sort()
+        value, pk = self.cursor['after']
+        after_pk = {'range': {'pk': {'gt': pk}}}
+        missing = {'bool': {'must_not': {'exists': {'field': sort_field}}}}
+
+        if value in MISSING_SORT_VALUES:
+            f = {'bool': {'must': [missing, after_pk]}}
+        else:
+            operator = 'gt' if sort_direction == 'asc' else 'lt'
+            f = {'bool': {
+                'should': [
+                    {'range': {sort_field: {operator: value}}},
+                    {'bool': {'must': [
+                        {'term': {sort_field: value}},
+                        after_pk]}},
+                    missing,
+                ],
+                'minimum_should_match': 1,
+            }}
+        return s.post_filter(f)
+
     def _limit_fields(self, s, fields):
         """Set the list of returned fields."""
         s = s.fields(fields)
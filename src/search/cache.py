@@ -0,0 +1,84 @@
+# -*- coding: utf-8 -*-
+
+
+import hashlib
+import json
+import time
+
+from django.core.cache import cache
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import models
+
+
+# Search results are cached until the category they belong to is indexed
+# again. Every category has a "generation" counter, that is part of all the
+# search cache keys and that is bumped whenever the category's documents
+# are sent to the index, so stale results are never hit again.
+
+GENERATION_KEY = 'search_generation_{}'
+
+
+def new_generation():
+    """Generate an initial generation value.
+
+    We don't start at 1, because if the counter is evicted from the cache,
+    we don't want to reuse a generation value that was already used.
+
+    """
+    return int(time.time() * 1000)
+
+
+def get_index_generation(doc_type):
+    """Return the current index generation for the given document type."""
+    key = GENERATION_KEY.format(doc_type)
+    generation = cache.get(key)
+    if generation is None:
+        cache.add(key, new_generation(), None)
+        generation = cache.get(key)
+    return generation
+
+
+def bump_index_generation(doc_types):
+    """Invalidate cached search results for the given document types."""
+    for doc_type in set(doc_types):
+        key = GENERATION_KEY.format(doc_type)
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.set(key, new_generation(), None)
+
+
+def normalize_filters(filters, exclude=()):
+    """Return a canonical version of the given (cleaned) filters.
+
+    Empty values are ignored and model instances are replaced by their
+    pk, so equivalent searches end up with the same representation.
+
+    """
+    normalized = {}
+    for key, value in filters.items():
+        if key in exclude or value in (None, ''):
+            continue
+        if isinstance(value, models.Model):
+            value = value.pk
+        normalized[key] = value
+    return normalized
+
+
+def get_search_cache_key(category, filters, prefix='search', exclude=(),
+                         **extra):
+    """Build a search cache key for the given category and filters.
+
+    Filters listed in `exclude` do not change the cached data (e.g
+    pagination parameters when caching aggregations) and are ignored.
+
+    """
+    data = {
+        'filters': normalize_filters(filters, exclude=exclude),
+        'extra': extra,
+    }
+    dump = json.dumps(data, sort_keys=True, cls=DjangoJSONEncoder)
+    digest = hashlib.sha1(dump.encode('utf-8')).hexdigest()
+    doc_type = category.document_type()
+    return '{}_{}_{}_{}'.format(
+        prefix, category.pk, get_index_generation(doc_type), digest)
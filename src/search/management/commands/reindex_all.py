@@ -21,19 +21,26 @@
 #           ALL THE THINGS !!!
 
 
+import json
 import logging
 import datetime
+import os
 import sys
 
-from elasticsearch.helpers import bulk
+from elasticsearch.helpers import parallel_bulk
 
 from django.core.management.base import BaseCommand
 from django.core.management import call_command
 from django.utils.six.moves import input
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
 
 from documents.utils import get_all_revision_classes
 from search import elastic
-from search.utils import build_index_data
+from search.models import IndexedRevision
+from search.utils import (
+    build_index_data, iter_revision_chunks, create_versioned_index,
+    switch_alias, delete_unused_indexes, index_updated_documents)
 from django.conf import settings
 
 logger = logging.getLogger(__name__)
@@ -47,13 +54,27 @@ class Command(BaseCommand):
             '--noinput',
             action='store_false', dest='interactive', default=True,
             help='Tells Django to NOT prompt the user for input of any kind.')
+        parser.add_argument(
+            '--resume',
+            action='store_true', dest='resume', default=False,
+            help='Resume an interrupted reindex from the last checkpoint.')
+        parser.add_argument(
+            '--threads',
+            type=int, dest='threads', default=settings.ELASTIC_REINDEX_THREADS,
+            help='Number of threads sending bulk requests to Elasticsearch.')
+        parser.add_argument(
+            '--chunk-size',
+            type=int, dest='chunk_size',
+            default=settings.ELASTIC_REINDEX_CHUNK_SIZE,
+            help='Number of revisions fetched from the database at once.')
 
     def handle(self, *args, **options):
         interactive = options.get('interactive')
-        if interactive:
+        resume = options.get('resume')
+        if interactive and not resume:
             confirm = input("""
-You have requested a flush of the search index.
-This will IRREVERSIBLY DESTROY all data currently indexed by Elasticsearch.
+You have requested a rebuild of the search index.
+A new index will be built in the background, then replace the current one.
 Are you sure you want to do this?
 
 Type 'yes' to continue, or 'no' to cancel: """)
@@ -66,28 +87,111 @@ Type 'yes' to continue, or 'no' to cancel: """)
         start_reindex = datetime.datetime.now()
         logger.info('Reindex starting at %s' % start_reindex)
 
-        call_command('delete_index', **options)
-        call_command('create_index', **options)
-        call_command('set_mappings', **options)
+        checkpoints = self.load_checkpoints() if resume else {}
+        if checkpoints:
+            logger.info('Resuming reindex from checkpoints {}'.format(
+                checkpoints))
+            index = checkpoints['index']
+        else:
+            index = create_versioned_index()
+            checkpoints = {
+                'index': index,
+                'started_on': timezone.now().isoformat(),
+                'classes': {},
+            }
+            self.save_checkpoints(checkpoints)
+            call_command('set_mappings', index=index)
 
-        logger.info('Preparing index data')
+            # Every revision will be indexed from scratch
+            IndexedRevision.objects.all().delete()
+
+        logger.info('Preparing index data in {}'.format(index))
 
         classes = get_all_revision_classes()
         for class_ in classes:
-            revisions = class_.objects \
-                .filter(metadata__document__is_indexable=True) \
-                .select_related()
+            self.reindex_class(class_, index, checkpoints, **options)
 
-            actions = []
-            logger.info('Starting gathering data for documents of type {}'.format(class_.__name__))
-            for revision in revisions:
-                actions.append(build_index_data(revision))
+        logger.info('Switching alias {} to {}'.format(
+            settings.ELASTIC_INDEX, index))
+        switch_alias(index)
+        delete_unused_indexes()
 
-            bulk(
-                elastic,
-                actions,
-                chunk_size=settings.ELASTIC_BULK_SIZE,
-                request_timeout=600)
+        # Documents edited during the rebuild were indexed in the old index
+        started_on = parse_datetime(checkpoints['started_on'])
+        index_updated_documents(started_on)
+
+        # The reindex completed, there is nothing left to resume
+        self.clear_checkpoints()
 
         end_reindex = datetime.datetime.now()
         logger.info('Reindex ending at %s' % end_reindex)
+
+    def reindex_class(self, class_, index, checkpoints, **options):
+        """Stream all revisions of a given class into the index.
+
+        Revisions are fetched from db chunk by chunk, and each chunk is sent
+        to ES by a pool of threads. Once a chunk is fully indexed, the last
+        indexed pk is saved, so an interrupted reindex can be resumed.
+
+        Documents that cannot be indexed are logged, and don't stop the
+        reindex.
+
+        """
+        class_name = class_.__name__
+        last_pk = checkpoints['classes'].get(class_name, 0)
+        total = class_.objects \
+            .filter(metadata__document__is_indexable=True) \
+            .filter(pk__gt=last_pk) \
+            .count()
+        logger.info('Indexing {} documents of type {}'.format(
+            total, class_name))
+
+        indexed = 0
+        start = datetime.datetime.now()
+        chunks = iter_revision_chunks(
+            class_, from_pk=last_pk, chunk_size=options['chunk_size'])
+        for chunk in chunks:
+            actions = (build_index_data(revision, index=index)
+                       for revision in chunk)
+            results = parallel_bulk(
+                elastic,
+                actions,
+                thread_count=options['threads'],
+                chunk_size=settings.ELASTIC_BULK_SIZE,
+                request_timeout=600,
+                raise_on_error=False,
+                raise_on_exception=False)
+            for success, info in results:
+                if not success:
+                    logger.error('Error indexing document: {}'.format(info))
+
+            indexed += len(chunk)
+            checkpoints['classes'][class_name] = chunk[-1].pk
+            self.save_checkpoints(checkpoints)
+            self.log_progress(class_name, indexed, total, start)
+
+    def log_progress(self, class_name, indexed, total, start):
+        elapsed = (datetime.datetime.now() - start).total_seconds()
+        throughput = indexed / elapsed if elapsed else 0
+        if throughput:
+            eta = datetime.timedelta(
+                seconds=int(max(total - indexed, 0) / throughput))
+        else:
+            eta = 'unknown'
+        logger.info('{}: {}/{} revisions indexed ({:.1f} rev/s, ETA {})'.format(
+            class_name, indexed, total, throughput, eta))
+
+    def load_checkpoints(self):
+        try:
+            with open(settings.ELASTIC_REINDEX_CHECKPOINT) as f:
+                return json.load(f)
+        except (IOError, ValueError):
+            return {}
+
+    def save_checkpoints(self, checkpoints):
+        with open(settings.ELASTIC_REINDEX_CHECKPOINT, 'w') as f:
+            json.dump(checkpoints, f)
+
+    def clear_checkpoints(self):
+        if os.path.exists(settings.ELASTIC_REINDEX_CHECKPOINT):
+            os.remove(settings.ELASTIC_REINDEX_CHECKPOINT)
@@ -12,13 +12,20 @@ logger = logging.getLogger(__name__)
 
 
 class Command(BaseCommand):
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--index',
+            dest='index', default=None,
+            help='Index to create the mappings on (defaults to the alias).')
+
     def handle(self, *args, **options):
+        index = options.get('index')
         categories = Category.objects \
             .select_related('category_template__metadata_model')
         for category in categories:
             doc_class = category.document_class()
             logger.info('Creating mapping for document type %s' % doc_class.__name__)
             try:
-                put_category_mapping(category.id)
+                put_category_mapping(category.id, index=index)
             except ConnectionError:
                 raise CommandError('Elasticsearch cannot be found')
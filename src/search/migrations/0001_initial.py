@@ -0,0 +1,28 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='QueuedDocument',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('document_id', models.PositiveIntegerField(unique=True, verbose_name='Document id')),
+                ('queued_on', models.DateTimeField(default=django.utils.timezone.now, verbose_name='Queued on')),
+            ],
+            options={
+                'verbose_name': 'Queued document',
+                'verbose_name_plural': 'Queued documents',
+            },
+        ),
+    ]
@@ -0,0 +1,32 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('search', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='IndexedRevision',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('doc_type', models.CharField(max_length=250, verbose_name='Document type')),
+                ('revision_id', models.PositiveIntegerField(verbose_name='Revision id')),
+                ('checksum', models.CharField(max_length=40, verbose_name='Checksum')),
+                ('is_latest_revision', models.BooleanField(default=False, verbose_name='Is latest revision')),
+            ],
+            options={
+                'verbose_name': 'Indexed revision',
+                'verbose_name_plural': 'Indexed revisions',
+            },
+        ),
+        migrations.AlterUniqueTogether(
+            name='indexedrevision',
+            unique_together=set([('doc_type', 'revision_id')]),
+        ),
+    ]
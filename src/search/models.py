@@ -0,0 +1,56 @@
+from django.db import models
+from django.utils.translation import ugettext_lazy as _
+from django.utils import timezone
+
+
+class QueuedDocument(models.Model):
+    """A document waiting to be reindexed.
+
+    Documents are not indexed right away when they are modified. Instead,
+    their ids are stored here, so multiple edits of the same document are
+    coalesced, and indexing can be performed in bulk by a background task.
+
+    """
+    document_id = models.PositiveIntegerField(
+        _('Document id'),
+        unique=True)
+    queued_on = models.DateTimeField(
+        _('Queued on'),
+        default=timezone.now)
+
+    class Meta:
+        verbose_name = _('Queued document')
+        verbose_name_plural = _('Queued documents')
+
+    def __str__(self):
+        return '{}'.format(self.document_id)
+
+
+class IndexedRevision(models.Model):
+    """Keeps track of the data indexed for a given revision.
+
+    Most of the time, when a document is edited, only its latest revision
+    actually changes. To avoid sending all the document revisions to the
+    index again, we store a checksum of the indexed data, so we can tell which
+    revisions really need to be reindexed.
+
+    """
+    doc_type = models.CharField(
+        _('Document type'),
+        max_length=250)
+    revision_id = models.PositiveIntegerField(
+        _('Revision id'))
+    checksum = models.CharField(
+        _('Checksum'),
+        max_length=40)
+    is_latest_revision = models.BooleanField(
+        _('Is latest revision'),
+        default=False)
+
+    class Meta:
+        verbose_name = _('Indexed revision')
+        verbose_name_plural = _('Indexed revisions')
+        unique_together = ('doc_type', 'revision_id')
+
+    def __str__(self):
+        return '{} {}'.format(self.doc_type, self.revision_id)
@@ -4,7 +4,7 @@ from django.conf import settings
 
 from categories.models import Category
 from search.utils import (
-    index_document, unindex_document, put_category_mapping, refresh_index)
+    queue_document, unindex_document, put_category_mapping)
 from documents.models import Document
 from documents.signals import document_form_saved
 
@@ -20,15 +20,16 @@ def update_index(**kwargs):
     # Then, the Document is saved again
     # Thus, we MUST not index the document on the first save, since the
     # metadata and revision does not exist yet
+    #
+    # Documents are usually saved several times in a single request, so
+    # they are queued to be indexed only once, after the transaction commit.
     created = kwargs.pop('created', False)
     if not created and doc.is_indexable:
-        index_document(doc.pk)
-    refresh_index()
+        queue_document(doc.pk)
 
 
 def remove_from_index(sender, instance, **kwargs):
-    unindex_document(instance.pk)
-    refresh_index()
+    unindex_document(instance.pk, refresh='wait_for')
 
 
 def save_mapping(sender, instance, **kwargs):
@@ -0,0 +1,45 @@
+from django.test import TestCase
+
+from mock import MagicMock
+
+from categories.factories import CategoryFactory
+from search.builder import SearchBuilder, encode_cursor
+
+
+class CursorPaginationTests(TestCase):
+    def setUp(self):
+        self.category = CategoryFactory()
+
+    def build_response(self, sort_values):
+        response = MagicMock()
+        response.hits = [MagicMock(meta=MagicMock(sort=values))
+                         for values in sort_values]
+        return response
+
+    def test_next_cursor(self):
+        builder = SearchBuilder(self.category, {'sort_by': 'title'})
+        response = self.build_response([['a', 1], ['b', 2]])
+        cursor = builder.get_next_cursor(response)
+
+        builder = SearchBuilder(self.category, {'sort_by': 'title'},
+                                cursor=cursor)
+        self.assertEqual(builder.offset, 2)
+        self.assertEqual(builder.cursor['after'], ['b', 2])
+
+        query = builder.build_query().to_dict()
+        self.assertEqual(query['from'], 0)
+        self.assertTrue('post_filter' in query)
+
+    def test_no_cursor_after_last_page(self):
+        builder = SearchBuilder(self.category, {})
+        self.assertIsNone(builder.get_next_cursor(self.build_response([])))
+
+    def test_invalid_cursor(self):
+        with self.assertRaises(RuntimeError):
+            SearchBuilder(self.category, {}, cursor='invalid')
+
+    def test_cursor_must_match_sort_order(self):
+        cursor = encode_cursor({
+            'after': ['a', 1], 'offset': 50, 'sort_by': 'title'})
+        with self.assertRaises(RuntimeError):
+            SearchBuilder(self.category, {'sort_by': '-title'}, cursor=cursor)
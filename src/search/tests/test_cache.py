@@ -0,0 +1,53 @@
+from django.conf import settings
+from django.core.cache import cache
+from django.test import TestCase
+
+from mock import patch
+
+from categories.factories import CategoryFactory
+from search.cache import (
+    get_index_generation, get_search_cache_key, normalize_filters)
+from search.utils import bulk_actions
+
+
+class SearchCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.category = CategoryFactory()
+        self.doc_type = self.category.document_type()
+
+    def test_equivalent_filters_share_a_key(self):
+        key1 = get_search_cache_key(
+            self.category, {'status': 'STD', 'leader': None})
+        key2 = get_search_cache_key(
+            self.category, {'status': 'STD', 'search_terms': ''})
+        key3 = get_search_cache_key(self.category, {'status': 'IDC'})
+        self.assertEqual(key1, key2)
+        self.assertNotEqual(key1, key3)
+
+    def test_model_instances_are_normalized(self):
+        filters = normalize_filters({'category': self.category})
+        self.assertEqual(filters, {'category': self.category.pk})
+
+    @patch('search.utils.bulk')
+    def test_indexing_bumps_the_generation(self, bulk_mock):
+        generation = get_index_generation(self.doc_type)
+        key = get_search_cache_key(self.category, {})
+
+        bulk_actions([{'_type': 'other.type', '_id': 1}])
+        self.assertEqual(get_index_generation(self.doc_type), generation)
+
+        bulk_actions([{'_type': self.doc_type, '_id': 1}], refresh='wait_for')
+        self.assertNotEqual(get_index_generation(self.doc_type), generation)
+        self.assertNotEqual(get_search_cache_key(self.category, {}), key)
+
+    @patch('search.utils.delayed_bump_index_generation.apply_async')
+    @patch('search.utils.bulk')
+    def test_unrefreshed_writes_bump_the_generation_later(
+            self, bulk_mock, bump_mock):
+        generation = get_index_generation(self.doc_type)
+
+        bulk_actions([{'_type': self.doc_type, '_id': 1}])
+        self.assertEqual(get_index_generation(self.doc_type), generation)
+        bump_mock.assert_called_once_with(
+            args=[[self.doc_type]], countdown=settings.ELASTIC_REFRESH_DELAY)
@@ -0,0 +1,228 @@
+import json
+import os
+
+from django.conf import settings
+from django.core.management import call_command
+from django.test import TestCase
+
+from mock import patch
+
+from documents.factories import DocumentFactory
+from default_documents.models import DemoMetadataRevision
+from search.utils import create_index, switch_alias, delete_unused_indexes
+
+
+COMMAND = 'search.management.commands.reindex_all.{}'
+
+
+class Interrupted(Exception):
+    pass
+
+
+class ReindexTests(TestCase):
+    def setUp(self):
+        self.docs = [DocumentFactory() for i in range(3)]
+        self.revision_pks = sorted(
+            DemoMetadataRevision.objects.values_list('pk', flat=True))
+        self.clear_checkpoints()
+
+        # Actions and options of every `parallel_bulk` call
+        self.bulk_calls = []
+        self.bulk_results = lambda actions: [
+            (True, action) for action in actions]
+
+        patchers = [
+            patch(COMMAND.format('create_versioned_index'),
+                  return_value='test_documents_v1'),
+            patch(COMMAND.format('call_command')),
+            patch(COMMAND.format('switch_alias')),
+            patch(COMMAND.format('delete_unused_indexes')),
+            patch(COMMAND.format('index_updated_documents')),
+            patch(COMMAND.format('parallel_bulk'),
+                  side_effect=self.fake_parallel_bulk),
+        ]
+        mocks = [patcher.start() for patcher in patchers]
+        for patcher in patchers:
+            self.addCleanup(patcher.stop)
+        self.create_mock = mocks[0]
+        self.switch_mock = mocks[2]
+        self.delete_mock = mocks[3]
+
+    def tearDown(self):
+        self.clear_checkpoints()
+
+    def fake_parallel_bulk(self, client, actions, **kwargs):
+        actions = list(actions)
+        self.bulk_calls.append((actions, kwargs))
+        return self.bulk_results(actions)
+
+    def clear_checkpoints(self):
+        if os.path.exists(settings.ELASTIC_REINDEX_CHECKPOINT):
+            os.remove(settings.ELASTIC_REINDEX_CHECKPOINT)
+
+    def load_checkpoints(self):
+        with open(settings.ELASTIC_REINDEX_CHECKPOINT) as f:
+            return json.load(f)
+
+    def reindex(self, *args):
+        call_command('reindex_all', '--noinput', '--chunk-size=2', *args)
+
+    def test_revisions_are_sent_by_chunks(self):
+        self.reindex()
+
+        self.assertEqual(
+            [len(actions) for actions, kwargs in self.bulk_calls], [2, 1])
+        for actions, kwargs in self.bulk_calls:
+            self.assertFalse(kwargs['raise_on_error'])
+            self.assertFalse(kwargs['raise_on_exception'])
+            for action in actions:
+                self.assertEqual(action['_index'], 'test_documents_v1')
+
+        self.switch_mock.assert_called_once_with('test_documents_v1')
+        # The reindex is complete, there is nothing to resume
+        self.assertFalse(os.path.exists(settings.ELASTIC_REINDEX_CHECKPOINT))
+
+    def test_indexing_errors_are_logged(self):
+        self.bulk_results = lambda actions: [
+            (False, {'index': {'error': 'boom'}}) for action in actions]
+
+        with patch(COMMAND.format('logger')) as logger_mock:
+            self.reindex()
+        self.assertEqual(logger_mock.error.call_count, 3)
+        self.switch_mock.assert_called_once_with('test_documents_v1')
+
+    def test_checkpoint_is_saved_after_each_chunk(self):
+        def interrupted(actions):
+            if len(self.bulk_calls) > 1:
+                raise Interrupted()
+            return [(True, action) for action in actions]
+
+        self.bulk_results = interrupted
+        with self.assertRaises(Interrupted):
+            self.reindex()
+
+        checkpoints = self.load_checkpoints()
+        self.assertEqual(checkpoints['index'], 'test_documents_v1')
+        self.assertEqual(
+            checkpoints['classes']['DemoMetadataRevision'],
+            self.revision_pks[1])
+        self.assertFalse(self.switch_mock.called)
+
+    def test_resume_from_checkpoint(self):
+        with open(settings.ELASTIC_REINDEX_CHECKPOINT, 'w') as f:
+            json.dump({
+                'index': 'test_documents_v0',
+                'started_on': '2016-01-01T00:00:00+00:00',
+                'classes': {'DemoMetadataRevision': self.revision_pks[1]},
+            }, f)
+
+        self.reindex('--resume')
+
+        self.assertFalse(self.create_mock.called)
+        self.assertEqual(len(self.bulk_calls), 1)
+        actions, kwargs = self.bulk_calls[0]
+        self.assertEqual(len(actions), 1)
+        self.assertEqual(actions[0]['_index'], 'test_documents_v0')
+        self.switch_mock.assert_called_once_with('test_documents_v0')
+
+    def test_failed_build_keeps_the_current_index(self):
+        def failure(actions):
+            raise Interrupted()
+
+        self.bulk_results = failure
+        with self.assertRaises(Interrupted):
+            self.reindex()
+
+        self.assertFalse(self.switch_mock.called)
+        self.assertFalse(self.delete_mock.called)
+        # The build can be resumed in the same index
+        self.assertEqual(self.load_checkpoints()['index'], 'test_documents_v1')
+
+
+@patch('search.utils.elastic')
+class AliasTests(TestCase):
+    def test_alias_is_created(self, elastic_mock):
+        elastic_mock.indices.exists_alias.return_value = False
+        elastic_mock.indices.exists.return_value = False
+
+        create_index()
+
+        index = elastic_mock.indices.create.call_args[1]['index']
+        self.assertTrue(index.startswith('{}_v'.format(settings.ELASTIC_INDEX)))
+        elastic_mock.indices.update_aliases.assert_called_once_with(body={
+            'actions': [
+                {'add': {'index': index, 'alias': settings.ELASTIC_INDEX}},
+            ]})
+
+    def test_existing_alias_is_kept(self, elastic_mock):
+        elastic_mock.indices.exists_alias.return_value = True
+        elastic_mock.indices.get_alias.return_value = {
+            'test_documents_v0': {}}
+
+        create_index()
+
+        self.assertFalse(elastic_mock.indices.create.called)
+        self.assertFalse(elastic_mock.indices.update_aliases.called)
+
+    def test_alias_is_switched_atomically(self, elastic_mock):
+        alias = settings.ELASTIC_INDEX
+        elastic_mock.indices.exists.return_value = True
+        elastic_mock.indices.exists_alias.return_value = True
+        elastic_mock.indices.get_alias.return_value = {
+            'test_documents_v0': {}}
+
+        switch_alias('test_documents_v1')
+
+        self.assertFalse(elastic_mock.indices.delete.called)
+        # Both operations are sent in a single request
+        elastic_mock.indices.update_aliases.assert_called_once_with(body={
+            'actions': [
+                {'remove': {'index': 'test_documents_v0', 'alias': alias}},
+                {'add': {'index': 'test_documents_v1', 'alias': alias}},
+            ]})
+
+    def test_unversioned_index_is_replaced(self, elastic_mock):
+        alias = settings.ELASTIC_INDEX
+        elastic_mock.indices.exists.return_value = True
+        elastic_mock.indices.exists_alias.return_value = False
+
+        switch_alias('test_documents_v1')
+
+        elastic_mock.indices.delete.assert_called_once_with(index=alias)
+        elastic_mock.indices.update_aliases.assert_called_once_with(body={
+            'actions': [
+                {'add': {'index': 'test_documents_v1', 'alias': alias}},
+            ]})
+
+    def test_only_older_indexes_are_deleted(self, elastic_mock):
+        elastic_mock.indices.exists_alias.return_value = True
+        elastic_mock.indices.get_alias.return_value = {
+            'test_documents_v1': {}}
+        elastic_mock.indices.get.return_value = {
+            'test_documents_v0': {},
+            'test_documents_v1': {},
+            'test_documents_v2': {},
+        }
+
+        delete_unused_indexes()
+
+        elastic_mock.indices.delete.assert_called_once_with(
+            index='test_documents_v0', ignore=404)
+
+    def test_pending_reindex_is_kept(self, elastic_mock):
+        elastic_mock.indices.exists_alias.return_value = True
+        elastic_mock.indices.get_alias.return_value = {
+            'test_documents_v2': {}}
+        elastic_mock.indices.get.return_value = {
+            'test_documents_v0': {},
+            'test_documents_v1': {},
+            'test_documents_v2': {},
+        }
+        with open(settings.ELASTIC_REINDEX_CHECKPOINT, 'w') as f:
+            json.dump({'index': 'test_documents_v1', 'classes': {}}, f)
+        self.addCleanup(os.remove, settings.ELASTIC_REINDEX_CHECKPOINT)
+
+        delete_unused_indexes()
+
+        elastic_mock.indices.delete.assert_called_once_with(
+            index='test_documents_v0', ignore=404)
@@ -1,13 +1,18 @@
 from django.test import TestCase
 from django.core.management import call_command
 from django.test.utils import override_settings
+from django.core.cache import cache
 
 from mock import patch
 
 from accounts.factories import UserFactory
 from categories.factories import CategoryFactory
 from documents.utils import save_document_forms
+from search.models import QueuedDocument
 from search.signals import connect_signals
+from search.utils import (
+    INDEX_QUEUE_FLUSH_KEY, enqueue_document, flush_index_queue,
+    queue_document, synchronous_indexing)
 from default_documents.forms import DemoMetadataForm, DemoMetadataRevisionForm
 
 
@@ -35,7 +40,7 @@ class SignalTests(TestCase):
         CategoryFactory()
         self.assertEqual(index_mock.call_count, 1)
 
-    @patch('search.signals.index_document')
+    @patch('search.signals.queue_document')
     def test_created_document_is_indexed(self, index_mock):
         form = DemoMetadataForm({
             'title': 'Title',
@@ -48,7 +53,7 @@ class SignalTests(TestCase):
         save_document_forms(form, rev_form, self.category)
         self.assertEqual(index_mock.call_count, 1)
 
-    @patch('search.signals.index_document')
+    @patch('search.signals.queue_document')
     @patch('search.signals.unindex_document')
     def test_deleted_document_is_unindexed(self, index_mock, unindex_mock):
         form = DemoMetadataForm({
@@ -63,7 +68,7 @@ class SignalTests(TestCase):
         doc.delete()
         self.assertEqual(unindex_mock.call_count, 1)
 
-    @patch('search.signals.index_document')
+    @patch('search.signals.queue_document')
     def test_updated_document_is_indexed(self, index_mock):
         form = DemoMetadataForm({
             'title': 'Title',
@@ -78,7 +83,7 @@ class SignalTests(TestCase):
         doc.save()
         self.assertEqual(index_mock.call_count, 2)
 
-    @patch('search.signals.index_document')
+    @patch('search.signals.queue_document')
     def test_revised_document_is_indexed(self, index_mock):
         form = DemoMetadataForm({
             'title': 'Title',
@@ -94,3 +99,37 @@ class SignalTests(TestCase):
         revision.save()
         doc.save()
         self.assertEqual(index_mock.call_count, 2)
+
+
+class IndexQueueTests(TestCase):
+    def setUp(self):
+        cache.delete(INDEX_QUEUE_FLUSH_KEY)
+
+    @patch('search.utils.flush_index_queue.apply_async')
+    def test_queued_documents_are_deduplicated(self, flush_mock):
+        enqueue_document(1)
+        enqueue_document(1)
+        enqueue_document(2)
+        self.assertEqual(QueuedDocument.objects.count(), 2)
+        self.assertEqual(flush_mock.call_count, 1)
+
+    @patch('search.utils.index_documents')
+    def test_flush_index_queue(self, index_mock):
+        QueuedDocument.objects.create(document_id=1)
+        QueuedDocument.objects.create(document_id=2)
+        flush_index_queue()
+        self.assertEqual(QueuedDocument.objects.count(), 0)
+        self.assertEqual(sorted(index_mock.call_args[0][0]), [1, 2])
+
+    @patch('search.utils.index_documents')
+    def test_synchronous_indexing(self, index_mock):
+        with synchronous_indexing():
+            queue_document(1)
+            queue_document(1)
+            queue_document(2)
+            self.assertEqual(index_mock.call_count, 0)
+
+        self.assertEqual(index_mock.call_count, 1)
+        self.assertEqual(index_mock.call_args[0][0], set([1, 2]))
+        self.assertEqual(index_mock.call_args[1], {'refresh': 'wait_for'})
+        self.assertEqual(QueuedDocument.objects.count(), 0)
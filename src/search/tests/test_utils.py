@@ -0,0 +1,121 @@
+from django.test import SimpleTestCase, TestCase
+from django.test.utils import override_settings
+
+from mock import patch
+
+from search.models import IndexedRevision
+from search.utils import (
+    get_refresh_param, get_changed_actions, save_tracking, bulk_actions,
+    bulk_index)
+
+
+class RefreshPolicyTests(SimpleTestCase):
+    def test_boolean_policies(self):
+        self.assertEqual(get_refresh_param(False), 'false')
+        self.assertEqual(get_refresh_param(True), 'true')
+
+    @override_settings(ELASTIC_SUPPORTS_WAIT_FOR=True)
+    def test_wait_for_policy(self):
+        self.assertEqual(get_refresh_param('wait_for'), 'wait_for')
+
+    @override_settings(ELASTIC_SUPPORTS_WAIT_FOR=False)
+    def test_wait_for_fallback(self):
+        self.assertEqual(get_refresh_param('wait_for'), 'true')
+
+    def test_unknown_policy(self):
+        with self.assertRaises(ValueError):
+            get_refresh_param('sometimes')
+
+    @override_settings(ELASTIC_SUPPORTS_WAIT_FOR=False)
+    @patch('search.utils.bulk')
+    def test_bulk_requests_fall_back_to_refresh(self, bulk_mock):
+        bulk_actions([{'_type': 'doctype', '_id': 1}], refresh='wait_for')
+        self.assertEqual(bulk_mock.call_args[1]['refresh'], 'true')
+
+    @patch('search.utils.bulk')
+    def test_bulk_requests_dont_refresh_by_default(self, bulk_mock):
+        bulk_actions([{'_type': 'doctype', '_id': 1}])
+        self.assertEqual(bulk_mock.call_args[1]['refresh'], 'false')
+
+
+class ChangeTrackingTests(TestCase):
+    def build_action(self, title, is_latest_revision=True):
+        return {
+            '_index': 'documents',
+            '_type': 'doctype',
+            '_id': 1,
+            '_source': {
+                'title': title,
+                'is_latest_revision': is_latest_revision,
+            },
+        }
+
+    def test_unknown_revisions_are_indexed(self):
+        actions, tracking = get_changed_actions([self.build_action('Title')])
+        self.assertEqual(len(actions), 1)
+        self.assertTrue('_source' in actions[0])
+
+    def test_unchanged_revisions_are_skipped(self):
+        actions, tracking = get_changed_actions([self.build_action('Title')])
+        save_tracking(tracking)
+        self.assertEqual(IndexedRevision.objects.count(), 1)
+
+        actions, tracking = get_changed_actions([self.build_action('Title')])
+        self.assertEqual(actions, [])
+
+    def test_changed_revisions_are_indexed(self):
+        actions, tracking = get_changed_actions([self.build_action('Title')])
+        save_tracking(tracking)
+
+        actions, tracking = get_changed_actions([self.build_action('Other')])
+        self.assertEqual(len(actions), 1)
+        self.assertTrue('_source' in actions[0])
+
+    def test_flag_changes_are_partial_updates(self):
+        actions, tracking = get_changed_actions([self.build_action('Title')])
+        save_tracking(tracking)
+
+        actions, tracking = get_changed_actions([
+            self.build_action('Title', is_latest_revision=False)])
+        self.assertEqual(len(actions), 1)
+        self.assertEqual(actions[0]['_op_type'], 'update')
+        self.assertEqual(actions[0]['doc'], {'is_latest_revision': False})
+
+    def test_tracking_is_saved_in_bulk(self):
+        actions = [self.build_action('Title') for i in range(10)]
+        for revision_id, action in enumerate(actions):
+            action['_id'] = revision_id
+        actions, tracking = get_changed_actions(actions)
+        with self.assertNumQueries(4):
+            save_tracking(tracking)
+
+        for action in actions:
+            action['_source']['title'] = 'Other'
+        actions, tracking = get_changed_actions(actions)
+        with self.assertNumQueries(4):
+            save_tracking(tracking)
+
+        self.assertEqual(IndexedRevision.objects.count(), 10)
+        actions, tracking = get_changed_actions(actions)
+        self.assertEqual(actions, [])
+
+    @patch('search.utils.bulk_actions')
+    def test_altered_data_is_tracked(self, bulk_mock):
+        actions, tracking = get_changed_actions([self.build_action('Title')])
+        save_tracking(tracking)
+
+        # e.g transmitted revisions are indexed with overridden values
+        bulk_index([self.build_action('Altered')])
+        self.assertEqual(bulk_mock.call_count, 1)
+
+        # Restoring the actual data must reach the index
+        actions, tracking = get_changed_actions([self.build_action('Title')])
+        self.assertEqual(len(actions), 1)
+
+    def test_force_indexing(self):
+        actions, tracking = get_changed_actions([self.build_action('Title')])
+        save_tracking(tracking)
+
+        actions, tracking = get_changed_actions(
+            [self.build_action('Title')], force=True)
+        self.assertEqual(len(actions), 1)
@@ -0,0 +1,72 @@
+import json
+
+from django.core.cache import cache
+from django.core.urlresolvers import reverse
+from django.test import TestCase
+from django.test.client import Client
+
+from mock import patch
+
+from accounts.factories import UserFactory
+from categories.factories import CategoryFactory
+
+
+def fake_results(builder, with_hits=True, with_facets=True):
+    results = {'total': 1}
+    if with_hits:
+        results['data'] = [{'document_key': 'FAC09001-FWF-000-HSE-REP-0004'}]
+        results['next'] = None
+    if with_facets:
+        results['aggregations'] = {'status': {'STD': 1}}
+    return results
+
+
+@patch('search.views.SearchDocuments.get_search_results',
+       side_effect=fake_results)
+class SearchDocumentsTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.category = CategoryFactory()
+        user = UserFactory(email='testadmin@phase.fr', password='pass',
+                           is_superuser=True,
+                           category=self.category)
+        self.client = Client()
+        self.client.login(email=user.email, password='pass')
+        self.url = reverse('search_documents', args=[
+            self.category.organisation.slug,
+            self.category.slug])
+
+    def search(self, **params):
+        res = self.client.get(self.url, params)
+        return json.loads(res.content.decode())
+
+    def test_facets_on_first_page_only(self, results_mock):
+        data = self.search(start=0)
+        self.assertTrue('aggregations' in data)
+        builder, with_hits, with_facets = results_mock.call_args[0]
+        self.assertTrue(with_hits)
+        self.assertTrue(with_facets)
+
+        data = self.search(start=50)
+        self.assertFalse('aggregations' in data)
+        self.assertEqual(len(data['data']), 1)
+
+    def test_facets_only(self, results_mock):
+        data = self.search(facets='only')
+        self.assertTrue('aggregations' in data)
+        self.assertEqual(data['data'], [])
+        self.assertEqual(data['total'], 1)
+
+    def test_results_are_cached(self, results_mock):
+        self.search(start=0)
+        self.search(start=0)
+        self.assertEqual(results_mock.call_count, 1)
+
+    def test_facets_are_cached_across_pages(self, results_mock):
+        self.search(start=0)
+        self.search(start=50, facets='true')
+        self.assertEqual(results_mock.call_count, 2)
+        # Hits were not cached for the second page, but facets were
+        builder, with_hits, with_facets = results_mock.call_args[0]
+        self.assertTrue(with_hits)
+        self.assertFalse(with_facets)
@@ -1,7 +1,15 @@
+import hashlib
+import json
 import logging
+import threading
+from collections import defaultdict
+from contextlib import contextmanager
 
 from django.db.models.fields import FieldDoesNotExist
-from django.db import models
+from django.db import models, transaction
+from django.utils import timezone
+from django.core.cache import cache
+from django.core.serializers.json import DjangoJSONEncoder
 
 from elasticsearch.helpers import bulk
 from elasticsearch.exceptions import ConnectionError
@@ -9,7 +17,10 @@ from elasticsearch.exceptions import ConnectionError
 from core.celery import app
 from categories.models import Category
 from search import elastic, INDEX_SETTINGS
+from search.models import QueuedDocument, IndexedRevision
+from search.cache import bump_index_generation
 from documents.models import Document
+from documents.loaders import RevisionLoader
 from django.conf import settings
 
 
@@ -22,17 +33,108 @@ def refresh_index():
     elastic.indices.refresh(index=index)
 
 
+# `settings.ELASTIC_INDEX` is not an actual index, but an alias pointing
+# to a versioned index (e.g "documents_v20160101120000"). Thus, a new
+# index can be built in the background while the current one is
+# still used for searching, and both can be swapped atomically.
+
+def get_index_versions():
+    """List all existing versioned indexes."""
+    pattern = '{}_v*'.format(settings.ELASTIC_INDEX)
+    indexes = elastic.indices.get(index=pattern)
+    return sorted(indexes.keys())
+
+
+def get_aliased_indexes():
+    """Return the list of indexes currently targeted by the alias."""
+    alias = settings.ELASTIC_INDEX
+    if not elastic.indices.exists_alias(name=alias):
+        return []
+    return list(elastic.indices.get_alias(name=alias).keys())
+
+
+def create_versioned_index():
+    """Create a brand new, empty versioned index and return its name."""
+    index = '{}_v{}'.format(
+        settings.ELASTIC_INDEX,
+        timezone.now().strftime('%Y%m%d%H%M%S'))
+    elastic.indices.create(index=index, body=INDEX_SETTINGS)
+    return index
+
+
+def switch_alias(index):
+    """Atomically make the alias target the given index."""
+    alias = settings.ELASTIC_INDEX
+
+    # Before we started using aliases, the index was created directly with
+    # the alias name. We need to get rid of it since both cannot coexist.
+    if elastic.indices.exists(index=alias) and \
+            not elastic.indices.exists_alias(name=alias):
+        elastic.indices.delete(index=alias)
+
+    actions = [{'remove': {'index': old_index, 'alias': alias}}
+               for old_index in get_aliased_indexes()]
+    actions.append({'add': {'index': index, 'alias': alias}})
+    elastic.indices.update_aliases(body={'actions': actions})
+
+    categories = Category.objects.select_related(
+        'organisation', 'category_template')
+    bump_index_generation(
+        category.document_type() for category in categories)
+
+
+def get_pending_reindex():
+    """Return the index of an interrupted reindex that can be resumed."""
+    try:
+        with open(settings.ELASTIC_REINDEX_CHECKPOINT) as f:
+            return json.load(f).get('index')
+    except (IOError, ValueError):
+        return None
+
+
+def delete_unused_indexes():
+    """Garbage collect versioned indexes that are not in use anymore.
+
+    Only versions older than the one targeted by the alias are deleted,
+    newer ones could still be being built. The index of a pending reindex
+    is kept too, so it can be resumed.
+
+    """
+    in_use = get_aliased_indexes()
+    if not in_use:
+        return
+
+    current = max(in_use)
+    pending = get_pending_reindex()
+    for index in get_index_versions():
+        if index < current and index != pending:
+            logger.info('Deleting unused index {}'.format(index))
+            elastic.indices.delete(index=index, ignore=404)
+
+
 def create_index():
-    """Create all needed indexes."""
-    index = settings.ELASTIC_INDEX
-    elastic.indices.create(index=index, ignore=400, body=INDEX_SETTINGS)
+    """Create all needed indexes.
+
+    Does nothing if the alias already points to an existing index.
+
+    """
+    if not get_aliased_indexes():
+        index = create_versioned_index()
+        switch_alias(index)
 
 
 def delete_index():
     """Delete existing ES indexes."""
     index = settings.ELASTIC_INDEX
+    for version in get_index_versions():
+        elastic.indices.delete(index=version, ignore=404)
+
+    # Remove the unversioned index from a pre-alias installation
     elastic.indices.delete(index=index, ignore=404)
 
+    # Indexed data is gone, so we must forget about it
+    IndexedRevision.objects.all().delete()
+
 
 def index_revision(revision):
     """Saves a document's revision into ES's index."""
@@ -50,44 +152,328 @@ def index_revision(revision):
                      es_key)
 
 
+# Writes accept a `refresh` policy, depending on the caller's needs:
+#
+#  * False: don't wait, the data will be visible after the next periodic
+#    refresh. This is what bulk jobs use.
+#  * 'wait_for': only return once the written documents are visible. This is
+#    what interactive edits use.
+#  * True: force an immediate refresh of the written shards.
+#
+# Elasticsearch < 5 does not know about 'wait_for', so we fall back to
+# refreshing the shards affected by the request, which is still much cheaper
+# than refreshing the entire index.
+
+REFRESH_POLICIES = (False, 'wait_for', True)
+
+
+def get_refresh_param(refresh):
+    """Convert a refresh policy to the `refresh` request parameter."""
+    if refresh not in REFRESH_POLICIES:
+        raise ValueError('Unknown refresh policy {}'.format(refresh))
+
+    if refresh == 'wait_for' and not settings.ELASTIC_SUPPORTS_WAIT_FOR:
+        refresh = True
+
+    if isinstance(refresh, bool):
+        refresh = 'true' if refresh else 'false'
+    return refresh
+
+
 @app.task
-def index_document(document_id):
+def index_document(document_id, refresh=False):
     """Index all revisions for a document"""
     document = Document.objects \
-        .select_related() \
+        .select_related('category__category_template__metadata_model') \
         .get(pk=document_id)
-    revisions = document.get_all_revisions()
-    actions = list(map(build_index_data, revisions))
+    loader = RevisionLoader(document.get_revision_class())
+    revisions = loader.load_documents([document_id])
+    index_revisions(revisions, refresh=refresh, force=True)
+
+
+def index_documents(document_ids, refresh=False, force=False):
+    """Index all revisions of several documents at once.
+
+    See `index_revisions` for the `force` parameter.
 
-    bulk(
-        elastic,
-        actions,
-        chunk_size=settings.ELASTIC_BULK_SIZE,
-        request_timeout=60)
+    """
+    documents = Document.objects \
+        .select_related('category__category_template__metadata_model') \
+        .filter(is_indexable=True) \
+        .filter(pk__in=document_ids)
+
+    # Load revisions in bulk, one query per revision class
+    ids_by_class = defaultdict(list)
+    for document in documents:
+        ids_by_class[document.get_revision_class()].append(document.pk)
+
+    for revision_class, ids in ids_by_class.items():
+        revisions = RevisionLoader(revision_class).load_documents(ids)
+        index_revisions(revisions, refresh=refresh, force=force)
+
+
+# Documents are not indexed synchronously when they are edited. Instead,
+# they are pushed to an indexing queue once the transaction is committed,
+# and a background task indexes all queued documents at once after a
+# small delay (`settings.ELASTIC_INDEX_QUEUE_DELAY`), so subsequent edits
+# of the same document are coalesced.
+#
+# Some batch actions need the index to be up to date right after they
+# complete. They can use the `synchronous_indexing` context manager.
+
+INDEX_QUEUE_FLUSH_KEY = 'search_index_queue_flush_scheduled'
+
+_indexing = threading.local()
 
 
-def index_revisions(revisions):
-    """Index a bunch of revisions."""
+def queue_document(document_id):
+    """Mark the document as needing to be reindexed."""
+    dirty_ids = getattr(_indexing, 'dirty_ids', None)
+    if dirty_ids is not None:
+        dirty_ids.add(document_id)
+    else:
+        transaction.on_commit(lambda: enqueue_document(document_id))
+
+
+def enqueue_document(document_id):
+    QueuedDocument.objects.get_or_create(document_id=document_id)
+
+    # Only schedule a single flush for all the documents queued
+    # during the delay
+    delay = settings.ELASTIC_INDEX_QUEUE_DELAY
+    if cache.add(INDEX_QUEUE_FLUSH_KEY, True, delay * 10):
+        flush_index_queue.apply_async(countdown=delay)
+
+
+@app.task
+def flush_index_queue():
+    """Index all the documents waiting in the queue."""
+    # Documents queued from now on will require a new flush
+    cache.delete(INDEX_QUEUE_FLUSH_KEY)
+
+    document_ids = list(QueuedDocument.objects.values_list(
+        'document_id', flat=True))
+    if not document_ids:
+        return
+
+    QueuedDocument.objects.filter(document_id__in=document_ids).delete()
+    logger.info('Indexing {} queued documents'.format(len(document_ids)))
+    index_documents(document_ids)
+
+
+@contextmanager
+def collect_dirty_documents():
+    """Collect the documents edited within the block instead of queuing them.
+
+    Yields the set of collected ids, or None if an outer block is already
+    collecting them.
+
+    """
+    if getattr(_indexing, 'dirty_ids', None) is not None:
+        yield None
+        return
+
+    _indexing.dirty_ids = set()
+    try:
+        yield _indexing.dirty_ids
+    finally:
+        _indexing.dirty_ids = None
+
+
+@contextmanager
+def synchronous_indexing():
+    """Index documents edited within the block before leaving it.
+
+    Documents are collected while the block is executed, then indexed all at
+    once, and we wait for them to be visible in search results.
+
+    """
+    with collect_dirty_documents() as dirty_ids:
+        try:
+            yield
+        finally:
+            if dirty_ids:
+                index_documents(dirty_ids, refresh='wait_for')
+
+
+@contextmanager
+def deferred_indexing():
+    """Index documents edited within the block in bulk, when leaving it.
+
+    This is meant for bulk jobs editing many documents: they are indexed by
+    chunks, and we don't wait for them to be visible in search results.
+
+    """
+    with collect_dirty_documents() as dirty_ids:
+        try:
+            yield
+        finally:
+            if dirty_ids:
+                dirty_ids = list(dirty_ids)
+                chunk_size = settings.ELASTIC_BULK_SIZE
+                for i in range(0, len(dirty_ids), chunk_size):
+                    index_documents(dirty_ids[i:i + chunk_size])
+
+
+def index_revisions(revisions, refresh='wait_for', force=False):
+    """Index a bunch of revisions.
+
+    Unless `force` is set, revisions which indexed data did not change since
+    they were last indexed are not sent again, and revisions for which only
+    the `is_latest_revision` flag changed are partially updated.
+
+    """
     actions = list(map(build_index_data, revisions))
-    bulk(
-        elastic,
-        actions,
-        chunk_size=settings.ELASTIC_BULK_SIZE,
-        request_timeout=60)
-    refresh_index()
+    bulk_index(actions, refresh=refresh, force=force)
 
 
-def bulk_actions(actions):
-    bulk(
-        elastic,
-        actions,
-        chunk_size=settings.ELASTIC_BULK_SIZE,
-        request_timeout=60)
+def bulk_index(index_data, refresh=False, force=False):
+    """Send data built by `build_index_data` and keep track of it.
 
+    Use this instead of `bulk_actions` when the indexed data is altered,
+    so the change tracking stays in sync with the index.
 
-def build_index_data(revision):
+    """
+    actions, tracking = get_changed_actions(index_data, force=force)
+    if actions:
+        bulk_actions(actions, refresh=refresh)
+        save_tracking(tracking)
+
+
+def get_checksum(source):
+    """Compute a checksum of indexed data, ignoring the latest revision flag."""
+    data = dict(source)
+    data.pop('is_latest_revision', None)
+    dump = json.dumps(data, sort_keys=True, cls=DjangoJSONEncoder)
+    return hashlib.sha1(dump.encode('utf-8')).hexdigest()
+
+
+def get_changed_actions(actions, force=False):
+    """Filter out index actions that would not change indexed data.
+
+    Returns the list of actions to perform, and the list of
+    `IndexedRevision` to save once they are performed.
+
+    """
+    revision_ids = [action['_id'] for action in actions]
+    indexed = IndexedRevision.objects.filter(revision_id__in=revision_ids)
+    known = dict(((i.doc_type, i.revision_id), i) for i in indexed)
+
+    changed_actions = []
+    tracking = []
+    for action in actions:
+        source = action['_source']
+        checksum = get_checksum(source)
+        is_latest_revision = source['is_latest_revision']
+        indexed = known.get((action['_type'], action['_id']))
+
+        if indexed is None:
+            indexed = IndexedRevision(
+                doc_type=action['_type'],
+                revision_id=action['_id'])
+        elif indexed.checksum == checksum and not force:
+            if indexed.is_latest_revision == is_latest_revision:
+                continue
+
+            # Only the flag changed, no need to send the whole document
+            action = {
+                '_op_type': 'update',
+                '_index': action['_index'],
+                '_type': action['_type'],
+                '_id': action['_id'],
+                'doc': {'is_latest_revision': is_latest_revision},
+            }
+
+        indexed.checksum = checksum
+        indexed.is_latest_revision = is_latest_revision
+        changed_actions.append(action)
+        tracking.append(indexed)
+
+    return changed_actions, tracking
+
+
+def save_tracking(tracking):
+    """Save the given `IndexedRevision` in bulk.
+
+    Existing rows are replaced, so it only takes a couple of queries
+    whatever the number of revisions.
+
+    """
+    revision_ids = defaultdict(list)
+    for indexed in tracking:
+        revision_ids[indexed.doc_type].append(indexed.revision_id)
+
+    with transaction.atomic():
+        for doc_type, ids in revision_ids.items():
+            IndexedRevision.objects \
+                .filter(doc_type=doc_type) \
+                .filter(revision_id__in=ids) \
+                .delete()
+        IndexedRevision.objects.bulk_create([
+            IndexedRevision(
+                doc_type=indexed.doc_type,
+                revision_id=indexed.revision_id,
+                checksum=indexed.checksum,
+                is_latest_revision=indexed.is_latest_revision)
+            for indexed in tracking])
+
+
+@app.task
+def delayed_bump_index_generation(doc_types):
+    bump_index_generation(doc_types)
+
+
+def bulk_actions(actions, refresh=False, **kwargs):
+    """Send actions to the index, and invalidate cached search results.
+
+    Without refresh, written documents only become searchable after the
+    next periodic index refresh. Invalidating cached results before that
+    would let stale results be cached again, so it is delayed.
+
+    """
+    actions = list(actions)
+    try:
+        bulk(
+            elastic,
+            actions,
+            chunk_size=settings.ELASTIC_BULK_SIZE,
+            request_timeout=60,
+            refresh=get_refresh_param(refresh),
+            **kwargs)
+    finally:
+        doc_types = list(set(action['_type'] for action in actions))
+        if refresh:
+            bump_index_generation(doc_types)
+        else:
+            delayed_bump_index_generation.apply_async(
+                args=[doc_types],
+                countdown=settings.ELASTIC_REFRESH_DELAY)
+
+
+def index_updated_documents(since):
+    """Index all documents that were updated since the given date."""
+    qs = Document.objects \
+        .filter(is_indexable=True) \
+        .filter(updated_on__gte=since) \
+        .values_list('pk', flat=True)
+    document_ids = list(qs)
+    chunk_size = settings.ELASTIC_BULK_SIZE
+    for i in range(0, len(document_ids), chunk_size):
+        index_documents(document_ids[i:i + chunk_size], force=True)
+
+
+def iter_revision_chunks(revision_class, from_pk=0, chunk_size=None):
+    """Iterate over all indexable revisions of a class, chunk by chunk."""
+    chunk_size = chunk_size or settings.ELASTIC_REINDEX_CHUNK_SIZE
+    loader = RevisionLoader(revision_class)
+    qs = loader.get_queryset() \
+        .filter(metadata__document__is_indexable=True)
+    return loader.iter_chunks(chunk_size, from_pk=from_pk, queryset=qs)
+
+
+def build_index_data(revision, index=None):
     return {
-        '_index': settings.ELASTIC_INDEX,
+        '_index': index or settings.ELASTIC_INDEX,
         '_type': revision.metadata.document.document_type(),
         '_id': revision.unique_id,
         '_source': revision.to_json(),
@@ -95,7 +481,7 @@ def build_index_data(revision):
 
 
 @app.task
-def unindex_document(document_id):
+def unindex_document(document_id, refresh=False):
     """Removes all revisions of a document from the index."""
     document = Document.objects \
         .select_related() \
@@ -107,13 +493,12 @@ def unindex_document(document_id):
         '_type': document.document_type(),
         '_id': revision.unique_id,
     } for revision in revisions]
+    bulk_actions(actions, refresh=refresh, raise_on_error=False)
 
-    bulk(
-        elastic,
-        actions,
-        raise_on_error=False,
-        chunk_size=settings.ELASTIC_BULK_SIZE,
-        request_timeout=60)
+    IndexedRevision.objects \
+        .filter(doc_type=document.document_type()) \
+        .filter(revision_id__in=[revision.unique_id for revision in revisions]) \
+        .delete()
 
 
 TYPE_MAPPING = [
@@ -126,7 +511,7 @@ TYPE_MAPPING = [
 
 
 @app.task
-def put_category_mapping(category_id):
+def put_category_mapping(category_id, index=None):
     category = Category.objects \
         .select_related('organisation', 'category_template__metadata_model') \
         .get(pk=category_id)
@@ -135,7 +520,7 @@ def put_category_mapping(category_id):
     doc_type = category.document_type()
     mapping = get_mapping(doc_class)
     elastic.indices.put_mapping(
-        index=settings.ELASTIC_INDEX,
+        index=index or settings.ELASTIC_INDEX,
         doc_type=doc_type,
         body=mapping,
     )
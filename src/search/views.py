@@ -1,50 +1,143 @@
+from django.conf import settings
+from django.core.cache import cache
 from braces.views import JSONResponseMixin
 
 from search.builder import SearchBuilder
+from search.cache import get_search_cache_key
 from documents.views import BaseDocumentList
-from django.conf import settings
+
+
+# Filters that do not change the aggregations
+PAGING_FILTERS = ('start', 'size', 'sort_by')
 
 
 class SearchDocuments(JSONResponseMixin, BaseDocumentList):
+    """Search documents and compute facets.
+
+    Facets (aggregations) don't change when the user scrolls down the document
+    list, so by default, they are only computed for the first page of
+    results. The optional `facets` parameter overrides this behaviour:
+
+     - "true": return both hits and facets;
+     - "false": only return hits;
+     - "only": only return facets (and the total number of hits).
+
+    Results are paginated with an opaque `cursor`, that is returned with every
+    page of hits (as `next`) and must be sent to fetch the following page.
+    The `start` parameter can still be used, but deep pagination is slower.
+
+    """
     http_method_names = ['get']
 
+    def get_facets_mode(self, builder):
+        """Return a (with_hits, with_facets) tuple."""
+        facets = self.request.GET.get('facets', None)
+        if facets == 'only':
+            return False, True
+        if facets in ('true', 'false'):
+            return True, facets == 'true'
+        return True, not builder.offset
+
     def get_queryset(self):
-        """Given DataTables' GET parameters, filter the initial queryset."""
+        """Given DataTables' GET parameters, filter the initial queryset.
+
+        The same searches are performed over and over by users browsing the
+        same category, so results are cached until the category is
+        indexed again.
+
+        """
         super(SearchDocuments, self).get_queryset()
         if self.request.user.is_external:
-            entities = self.get_external_filtering()
+            entities = sorted(self.get_external_filtering())
         else:
             entities = None
         try:
             builder = SearchBuilder(self.category,
                                     self.request.GET,
-                                    filter_on_entities=entities)
-            query = builder.build_query()
-            query = builder.add_aggregations(query)
-            results = query.execute()
+                                    filter_on_entities=entities,
+                                    cursor=self.request.GET.get('cursor'))
         except RuntimeError:
-            results = []
+            return None
+        self.offset = builder.offset
+
+        with_hits, with_facets = self.get_facets_mode(builder)
+        keys = {}
+        if with_hits:
+            keys['hits'] = get_search_cache_key(
+                self.category, builder.filters, entities=entities,
+                cursor=builder.cursor)
+        if with_facets:
+            keys['facets'] = get_search_cache_key(
+                self.category, builder.filters, prefix='facets',
+                exclude=PAGING_FILTERS, entities=entities)
 
+        cached = cache.get_many(list(keys.values()))
+        results = {}
+        for name, key in keys.items():
+            if key in cached:
+                results.update(cached[key])
+
+        missing = [name for name, key in keys.items() if key not in cached]
+        if missing:
+            fetched = self.get_search_results(
+                builder, 'hits' in missing, 'facets' in missing)
+            results.update(fetched)
+            to_cache = {}
+            if 'hits' in missing:
+                to_cache[keys['hits']] = {
+                    'total': fetched['total'],
+                    'data': fetched['data'],
+                    'next': fetched['next'],
+                }
+            if 'facets' in missing:
+                to_cache[keys['facets']] = {
+                    'total': fetched['total'],
+                    'aggregations': fetched['aggregations'],
+                }
+            cache.set_many(to_cache, settings.SEARCH_CACHE_TIMEOUT)
+        return results
+
+    def get_search_results(self, builder, with_hits=True, with_facets=True):
+        query = builder.build_query()
+        if not with_hits:
+            query = query.extra(from_=0, size=0)
+        if with_facets:
+            query = builder.add_aggregations(query)
+        response = query.execute()
+
+        # Hits before the cursor are filtered out from the total
+        total = response.hits.total
+        if builder.cursor:
+            total += builder.offset
+
+        results = {'total': total}
+        if with_hits:
+            results['data'] = [hit._d_ for hit in response.hits]
+            results['next'] = builder.get_next_cursor(response)
+        if with_facets:
+            results['aggregations'] = self.format_aggregations(
+                response.aggregations)
         return results
 
     def render_to_response(self, context, **response_kwargs):
         return self.render_json_response(context, **response_kwargs)
 
     def get_context_data(self, **kwargs):
-        response = self.get_queryset()
-        start = int(self.request.GET.get('start', 0))
+        results = self.object_list or {'total': 0}
+        start = getattr(self, 'offset', 0)
         end = start + int(self.request.GET.get('length', settings.PAGINATE_BY))
-        total = response.hits.total
+        total = results['total']
         display = min(end, total)
-        search_data = [hit._d_ for hit in response.hits]
-        aggregations = self.format_aggregations(response.aggregations)
 
-        return {
+        context = {
             'total': total,
             'display': display,
-            'data': search_data,
-            'aggregations': aggregations,
+            'data': results.get('data', []),
+            'next': results.get('next', None),
         }
+        if 'aggregations' in results:
+            context['aggregations'] = results['aggregations']
+        return context
 
     def format_aggregations(self, aggregations):
         """Transfroms the ES "aggregations" response into something we can use.
@@ -10,6 +10,9 @@ var Phase = Phase || {};
         url: Phase.Config.searchUrl,
         parse: function(response) {
             this.total = response.total;
+            // Opaque cursor to fetch the next page of results
+            this.next = response.next;
+            // Facets are only returned with the first page of results
             this.aggregations = response.aggregations;
             return response.data;
         }
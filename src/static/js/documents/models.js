@@ -37,14 +37,20 @@ var Phase = Phase || {};
         /**
          * Set the pagination params to fetch next batch of results.
          *
+         * The cursor returned with the previous batch of results is used
+         * by the server to fetch the following results efficiently.
+         *
          * Since we don't want to replace the currently displayed results,
          * we don't trigger the "change" event, and let the calling object
          * be responsible of triggering the actual search query.
          */
-        nextPage: function() {
+        nextPage: function(cursor) {
             var start = this.get('start');
             var size = this.get('size');
-            this.set('start', start + size, {silent: true});
+            this.set({
+                'start': start + size,
+                'cursor': cursor
+            }, {silent: true});
         },
         /**
          * Set the pagination params to fetch the first results.
@@ -58,6 +64,7 @@ var Phase = Phase || {};
                 'start': defaults.start,
                 'size': defaults.size
             }, {silent: true});
+            this.unset('cursor', {silent: true});
         }
     });
 
@@ -83,6 +83,7 @@ var Phase = Phase || {};
             // because it breaks… stuff.
             delete searchParams.size;
             delete searchParams.start;
+            delete searchParams.cursor;
 
             return searchParams;
         },
@@ -117,14 +118,16 @@ var Phase = Phase || {};
                 displayed: displayedDocuments,
                 total: totalDocuments
             });
-            dispatcher.trigger('onAggregationsFetched', aggregations);
+            if (aggregations !== undefined) {
+                dispatcher.trigger('onAggregationsFetched', aggregations);
+            }
         },
         /**
          * User scrolled all the way to the bottom of the page, let's
          * download more search results.
          */
         onMoreDocumentsRequested: function() {
-            this.search.nextPage();
+            this.search.nextPage(this.documentsCollection.next);
             this.fetchDocuments(false);
         },
         /**
@@ -172,6 +175,7 @@ var Phase = Phase || {};
             // Pagination params should not make it to the url
             delete attributes.start;
             delete attributes.size;
+            delete attributes.cursor;
 
             // Let's remove attributes with empty values, so the search
             // url only contains meaningful parameters
@@ -0,0 +1,7 @@
+var Phase = Phase || {};
+
+jQuery(function($) {
+    $('.task-progress').each(function(index, el) {
+        new Phase.Views.TaskProgressView({el: el});
+    });
+});
@@ -0,0 +1,43 @@
+var Phase = Phase || {};
+
+(function(exports, Phase, Backbone, _) {
+    "use strict";
+
+    Phase.Views = Phase.Views || {};
+
+    /**
+     * Display the progress of a background task.
+     *
+     * The page is reloaded when the task is over, so its result is
+     * displayed. If the task failed, the error is displayed instead.
+     */
+    Phase.Views.TaskProgressView = Backbone.View.extend({
+        initialize: function() {
+            _.bindAll(this, 'poll', 'pollSuccess');
+            this.pollUrl = this.$el.data('poll-url');
+            this.progressBar = this.$el.find('.progress-bar');
+            this.pollId = setInterval(this.poll, 2000);
+        },
+        poll: function() {
+            $.get(this.pollUrl, this.pollSuccess);
+        },
+        pollSuccess: function(data) {
+            this.progressBar.attr('aria-valuenow', data.progress);
+            this.progressBar.css('width', data.progress + '%');
+            if (data.done) {
+                clearInterval(this.pollId);
+                if (data.success) {
+                    location.reload(true);
+                } else {
+                    this.showError(data.error_msg);
+                }
+            }
+        },
+        showError: function(message) {
+            this.progressBar.addClass('progress-bar-danger');
+            this.progressBar.css('width', '100%');
+            this.$el.after($('<p class="text-danger"></p>').text(message));
+        }
+    });
+
+})(this, Phase, Backbone, _);
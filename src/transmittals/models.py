@@ -5,8 +5,6 @@ import os
 import logging
 import shutil
 import uuid
-import zipfile
-import tempfile
 from collections import OrderedDict
 
 from django import forms
@@ -22,8 +20,9 @@ from elasticsearch_dsl import Q
 from documents.utils import save_document_forms
 from documents.models import Document, Metadata, MetadataRevision, MetadataRevisionBase
 from documents.templatetags.documents import MenuItem
+from documents.zipstream import stream_zip
 from reviews.models import CLASSES, ReviewMixin
-from search.utils import build_index_data, bulk_actions
+from search.utils import build_index_data, bulk_index
 from metadata.fields import ConfigurableChoiceField
 from default_documents.validators import StringNumberValidator
 from privatemedia.fields import ProtectedFileField, PrivateFileField
@@ -633,63 +632,57 @@ class OutgoingTransmittal(Metadata):
         return TransmittalDownloadForm(data, queryset=queryset)
 
     @classmethod
-    def compress_documents(cls, documents, **kwargs):
-        """See `documents.models.Metadata.compress_documents`"""
+    def get_archived_files(cls, documents, **kwargs):
+        """See `documents.models.Metadata.get_archived_files`"""
         content = kwargs.get('content', 'transmittal')
         revisions = kwargs.get('revisions', 'latest')
 
-        temp_file = tempfile.TemporaryFile()
-
-        with zipfile.ZipFile(temp_file, mode='w') as zip_file:
-            for document in documents:
-                dirname = document.document_key
-                revision = document.get_latest_revision()
-
-                # Should we embed the transmittal pdf?
-                if content in ('transmittal', 'both'):
-
-                    # All revisions or just the latest?
-                    if revisions == 'latest':
-                        revs = [revision]
-                    elif revisions == 'all':
-                        revs = document.get_all_revisions()
-
-                    # Embed the file in the zip archive
-                    for rev in revs:
-                        pdf_file = rev.pdf_file
-                        pdf_basename = os.path.basename(pdf_file.name)
-
-                        # Avoiding to break export process
-                        if not pdf_file:
-                            continue
-
-                        # If file is gone, don't break export process
-                        try:
-                            zip_file.write(
-                                pdf_file.path,
-                                '{}/{}'.format(dirname, pdf_basename),
-                                compress_type=zipfile.ZIP_DEFLATED)
-                        except OSError:
-                            logger.warning(
-                                'File: {} missing in export process'.format(pdf_file))
-
-                # Should we embed review comments?
-                if content in ('revisions', 'both'):
-                    meta = document.get_metadata()
-                    exported_revs = meta.get_revisions()
-                    for rev in exported_revs:
-                        if rev.file_transmitted:
-                            comments_file = rev.file_transmitted
-                            comments_basename = os.path.basename(comments_file.path)
-                            zip_file.write(
-                                comments_file.path,
-                                '{}/{}/{}'.format(
-                                    dirname,
-                                    rev.document.document_key,
-                                    comments_basename),
-                                compress_type=zipfile.ZIP_DEFLATED)
-
-        return temp_file
+        for document in documents:
+            dirname = document.document_key
+            revision = document.get_latest_revision()
+
+            # Should we embed the transmittal pdf?
+            if content in ('transmittal', 'both'):
+
+                # All revisions or just the latest?
+                if revisions == 'latest':
+                    revs = [revision]
+                elif revisions == 'all':
+                    revs = document.get_all_revisions()
+
+                # Embed the file in the zip archive
+                for rev in revs:
+                    pdf_file = rev.pdf_file
+
+                    # Avoiding to break export process
+                    if not pdf_file:
+                        continue
+
+                    # Missing files are skipped by the archive
+                    pdf_basename = os.path.basename(pdf_file.name)
+                    yield (
+                        pdf_file.path,
+                        '{}/{}'.format(dirname, pdf_basename))
+
+            # Should we embed review comments?
+            if content in ('revisions', 'both'):
+                meta = document.get_metadata()
+                exported_revs = meta.get_revisions()
+                for rev in exported_revs:
+                    if rev.file_transmitted:
+                        comments_file = rev.file_transmitted
+                        comments_basename = os.path.basename(comments_file.path)
+                        yield (
+                            comments_file.path,
+                            '{}/{}/{}'.format(
+                                dirname,
+                                rev.document.document_key,
+                                comments_basename))
+
+    @classmethod
+    def compress_documents(cls, documents, **kwargs):
+        """See `documents.models.Metadata.compress_documents`"""
+        return stream_zip(cls.get_archived_files(documents, **kwargs))
 
     def link_to_revisions(self, revisions):
         """Set the given revisions as related documents.
@@ -714,7 +707,7 @@ class OutgoingTransmittal(Metadata):
             Revision = type(revisions[0])
             for rev in Revision.objects.filter(id__in=ids):
                 rev.transmittals.add(self)
-            bulk_actions(index_data)
+            bulk_index(index_data, refresh='wait_for')
 
     @classmethod
     def get_batch_actions(cls, category, user):
@@ -17,6 +17,7 @@ from transmittals.models import (
 from transmittals.utils import (
     create_transmittal, send_transmittal_creation_notifications)
 from transmittals.errors import TransmittalError
+from search.utils import synchronous_indexing
 
 
 logger = logging.getLogger(__name__)
@@ -38,6 +39,7 @@ def do_notify_transmittal_recipients(metadata_id, revision_id):
 
 
 @app.task
+@synchronous_indexing()
 def do_create_transmittal(
         user_id, from_category_id, to_category_id, document_ids,
         contract_number, purpose_of_issue, recipients_ids):
@@ -13,11 +13,12 @@ from annoying.functions import get_object_or_None
 
 from categories.models import Category
 from notifications.models import notify
-from documents.views import BaseDocumentBatchActionView
+from documents.views import BaseDocumentBatchActionView, ZipViewArchiveMixin
 from transmittals.models import Transmittal, TrsRevision
 from transmittals.utils import FieldWrapper
 from transmittals.tasks import do_create_transmittal
 from search.utils import index_revisions
+from documents.loaders import RevisionLoader
 from documents.views import DocumentListMixin
 from accounts.models import get_entities
 from privatemedia.views import serve_model_file_field
@@ -233,7 +234,8 @@ class TransmittalRevisionDiff(LoginRequiredMixin, PermissionRequiredMixin, Detai
                   self.object.transmittal.document_key]))
 
 
-class TransmittalDownload(LoginRequiredMixin, PermissionRequiredMixin, BaseZipView):
+class TransmittalDownload(LoginRequiredMixin, PermissionRequiredMixin,
+                          ZipViewArchiveMixin, BaseZipView):
     zipfile_name = 'transmittal_documents.zip'
     permission_required = 'documents.can_control_document'
 
@@ -274,7 +276,7 @@ class PrepareTransmittal(BaseDocumentBatchActionView):
         revisions = _class.objects.filter(id__in=rev_ids)
         revisions.update(under_preparation_by=self.request.user)
 
-        index_revisions(revisions)
+        index_revisions(RevisionLoader(_class).load(rev_ids))
         return HttpResponseRedirect(self.get_redirect_url())
 
 
@@ -301,7 +303,7 @@ class BatchAckOfTransmittalReceipt(BaseDocumentBatchActionView):
 
         # Update ES index
         _revision_class = self.category.revision_class()
-        revisions = _revision_class.objects.filter(id__in=revision_ids)
+        revisions = RevisionLoader(_revision_class).load(revision_ids)
         index_revisions(revisions)
 
         update_count = len(revision_ids)